@@ -54,5 +54,4 @@ for vid, text in transcripts.items():
 
 index, vectors = create_faiss_index(all_chunks, model)
 
-# Optionally save index to disk
-# faiss.write_index(index, "youtube_transcripts.index")
\ No newline at end of file
+# To build and save an index over the whole corpus, use utils/embedding_index.py
\ No newline at end of file
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import json
+import time
+import sys
+import random
+import argparse
+import threading
+import http.client
+from queue import Empty, LifoQueue
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(REPO_ROOT, "utils"))
+from metrics import METRICS, add_metrics_arguments, configure_metrics, finish_metrics
+
+TWEETS_DIR = os.path.join(REPO_ROOT, "data", "tweets")
+CANDIDATES_DIR = os.path.join(TWEETS_DIR, "candidates")
+
+DEFAULT_BASE_URL = os.getenv("TWITTER_API_BASE_URL", "https://api.twitterapi.io")
+LAST_TWEETS_PATH = "/twitter/user/last_tweets"
+
+STATE_FILENAME = "scrape_state.json"
+
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT = 30
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_BASE = 1.0
+DEFAULT_BACKOFF_MAX = 60.0
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+PAGE_FILENAME_PATTERN = re.compile(r"^(\d+)\.json$")
+
+
+class ScrapeError(Exception):
+    """A page could not be fetched, or the API answered with an error body"""
+
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP(S) connections to one host, shared between threads.
+    A connection is checked out for one request and returned afterwards, so
+    consecutive pages reuse the same TCP/TLS session instead of reconnecting.
+    """
+    
+    def __init__(self, base_url, size=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.idle = LifoQueue(maxsize=size)
+    
+    def _connect(self):
+        connection_class = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return connection_class(self.host, self.port, timeout=self.timeout)
+    
+    def request(self, path, params, headers):
+        """
+        Send a GET request
+        Returns: (status code, response headers, body bytes)
+        """
+        try:
+            connection = self.idle.get_nowait()
+        except Empty:
+            connection = self._connect()
+        
+        url = f"{self.prefix}{path}?{urlencode(params)}"
+        try:
+            connection.request("GET", url, headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            raise
+        
+        if response.will_close:
+            connection.close()
+        else:
+            try:
+                self.idle.put_nowait(connection)
+            except Exception:
+                connection.close()
+        return response.status, response.headers, body
+    
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except Empty:
+                return
+
+
+class TwitterClient:
+    """Fetches timeline pages, retrying rate limits, server errors and dropped connections with backoff"""
+    
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, pool_size=DEFAULT_WORKERS, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_base=DEFAULT_BACKOFF_BASE, backoff_max=DEFAULT_BACKOFF_MAX):
+        self.headers = {"X-API-Key": api_key, "Accept": "application/json"}
+        self.pool = ConnectionPool(base_url, pool_size)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+    
+    def backoff_delay(self, attempt, retry_after=None):
+        """Seconds to wait before retry number attempt (0-based), honouring Retry-After"""
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        delay = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+        return delay * random.uniform(0.5, 1.0)
+    
+    def last_tweets(self, user_id, cursor=None):
+        """
+        Fetch one page of a user's timeline, newest tweets first
+        Returns: the decoded page, which always has status "success"
+        """
+        try:
+            with METRICS.timer("fetch"):
+                page = self._fetch_page(user_id, cursor)
+        except ScrapeError:
+            METRICS.count("items_total", stage="fetch", outcome="failed")
+            raise
+        METRICS.count("items_total", stage="fetch", outcome="fetched")
+        return page
+    
+    def _fetch_page(self, user_id, cursor):
+        params = {"userId": user_id}
+        if cursor:
+            params["cursor"] = cursor
+        
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                status, headers, body = self.pool.request(LAST_TWEETS_PATH, params, self.headers)
+            except (http.client.HTTPException, OSError) as e:
+                error = f"connection error: {e}"
+            else:
+                if status == 200:
+                    try:
+                        page = json.loads(body)
+                    except ValueError as e:
+                        raise ScrapeError(f"invalid JSON for user {user_id}: {e}")
+                    if page.get("status") != "success":
+                        raise ScrapeError(f"API error for user {user_id}: {page.get('msg') or page.get('message')}")
+                    return page
+                if status not in RETRYABLE_STATUS_CODES:
+                    raise ScrapeError(f"HTTP {status} for user {user_id}: {body[:200]!r}")
+                error = f"HTTP {status}"
+                if headers.get("Retry-After", "").isdigit():
+                    retry_after = int(headers["Retry-After"])
+            
+            if attempt == self.max_retries:
+                raise ScrapeError(f"giving up on user {user_id} after {attempt + 1} attempts ({error})")
+            delay = self.backoff_delay(attempt, retry_after)
+            METRICS.count("retries_total", stage="fetch")
+            print(f"  {error} for user {user_id}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+    
+    def close(self):
+        self.pool.close()
+
+
+def page_tweets(page):
+    """Regular timeline tweets of a page (the pinned tweet is not in date order and is ignored)"""
+    return (page.get("data") or {}).get("tweets") or []
+
+
+def page_tweet_ids(page):
+    """Numeric IDs of a page's tweets; the API occasionally returns placeholder tweets without one"""
+    return [int(tweet["id"]) for tweet in page_tweets(page) if str(tweet.get("id") or "").isdigit()]
+
+
+def existing_pages(json_dir):
+    """Sorted page numbers already saved for a user"""
+    if not os.path.isdir(json_dir):
+        return []
+    numbers = []
+    for name in os.listdir(json_dir):
+        match = PAGE_FILENAME_PATTERN.match(name)
+        if match:
+            numbers.append(int(match.group(1)))
+    return sorted(numbers)
+
+
+def newest_saved_tweet_id(json_dir):
+    """Highest tweet ID in the pages saved by an earlier scrape, or 0"""
+    newest = 0
+    for number in existing_pages(json_dir):
+        try:
+            with open(os.path.join(json_dir, f"{number}.json"), 'r', encoding='utf-8') as f:
+                page = json.load(f)
+        except ValueError:
+            # Error bodies and concatenated pages from the shell scraper are skipped
+            continue
+        if isinstance(page, dict):
+            newest = max([newest] + page_tweet_ids(page))
+    return newest
+
+
+class UserScraper:
+    """
+    Scrapes one user's timeline into <tweets_dir>/<username>/json/<page>.json
+    Progress is checkpointed in scrape_state.json after every page:
+      newest_id       - newest tweet ID saved so far
+      refresh_cursor  - where an interrupted fetch of new tweets stopped
+      refresh_stop_id - newest tweet ID saved before that fetch started
+      backfill_cursor - where an interrupted walk into older tweets stopped
+      next_page       - number for the next saved page
+    A run first finishes an interrupted fetch of new tweets, then fetches the
+    pages newer than newest_id, stopping at the first tweet already seen, and
+    finally continues any unfinished backfill.
+    """
+    
+    def __init__(self, client, tweets_dir, username, user_id, max_pages=None):
+        self.client = client
+        self.username = username
+        self.user_id = user_id
+        self.max_pages = max_pages
+        self.json_dir = os.path.join(tweets_dir, username, "json")
+        self.state_path = os.path.join(tweets_dir, username, STATE_FILENAME)
+        self.fetched = 0
+        self.state = self.load_state()
+    
+    def load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        # Pages from the shell scraper count as a finished walk up to their newest tweet
+        pages = existing_pages(self.json_dir)
+        return {
+            "newest_id": newest_saved_tweet_id(self.json_dir),
+            "refresh_cursor": None,
+            "refresh_stop_id": None,
+            "backfill_cursor": None,
+            "next_page": (pages[-1] + 1) if pages else 1,
+        }
+    
+    def save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+    
+    def save_page(self, page):
+        """Write a page and advance the page counter"""
+        path = os.path.join(self.json_dir, f"{self.state['next_page']}.json")
+        tmp_path = path + ".tmp"
+        with METRICS.timer("write"):
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(page, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        self.state["next_page"] += 1
+        self.fetched += 1
+    
+    def page_budget_left(self):
+        return self.max_pages is None or self.fetched < self.max_pages
+    
+    def fetch_new(self):
+        """
+        Fetch pages from the top of the timeline until reaching a tweet seen before
+        Returns: number of new tweets
+        """
+        if self.state.get("refresh_cursor"):
+            new_tweets = self.fetch_until_known(self.state["refresh_cursor"], self.state["refresh_stop_id"])
+            if self.state["refresh_cursor"]:
+                # The page budget ran out again before the gap was closed
+                return new_tweets
+        else:
+            new_tweets = 0
+        
+        if not self.page_budget_left():
+            return new_tweets
+        
+        if not self.state["newest_id"] and not self.state["backfill_cursor"]:
+            # A first scrape is a full backfill; checkpoint it page by page
+            METRICS.progress(f"Fetching page {self.state['next_page']} for user {self.username}...")
+            page = self.client.last_tweets(self.user_id)
+            self.save_page(page)
+            has_next = page.get("has_next_page") and page.get("next_cursor")
+            self.state["newest_id"] = max([0] + page_tweet_ids(page))
+            self.state["backfill_cursor"] = page["next_cursor"] if has_next else None
+            self.save_state()
+            return new_tweets + len(page_tweet_ids(page))
+        
+        return new_tweets + self.fetch_until_known(None, self.state["newest_id"])
+    
+    def fetch_until_known(self, cursor, known_id):
+        """
+        Save pages from cursor (None for the top of the timeline) until reaching a tweet no newer than known_id
+        newest_id is raised after every saved page; if the page budget runs out first,
+        the cursor is checkpointed as refresh_cursor so the next run closes the gap
+        instead of saving the same pages again.
+        Returns: number of new tweets
+        """
+        new_tweets = 0
+        while self.page_budget_left():
+            METRICS.progress(f"Fetching page {self.state['next_page']} for user {self.username}...")
+            page = self.client.last_tweets(self.user_id, cursor)
+            tweet_ids = page_tweet_ids(page)
+            fresh = [tweet_id for tweet_id in tweet_ids if tweet_id > known_id]
+            if fresh:
+                self.save_page(page)
+            new_tweets += len(fresh)
+            self.state["newest_id"] = max([self.state["newest_id"]] + tweet_ids)
+            
+            has_next = page.get("has_next_page") and page.get("next_cursor")
+            if len(fresh) < len(tweet_ids) or not has_next:
+                self.state["refresh_cursor"] = None
+                self.state["refresh_stop_id"] = None
+                self.save_state()
+                return new_tweets
+            cursor = page["next_cursor"]
+            self.state["refresh_cursor"] = cursor
+            self.state["refresh_stop_id"] = known_id
+            self.save_state()
+        return new_tweets
+    
+    def backfill(self):
+        """
+        Continue an unfinished walk towards older tweets
+        Returns: number of tweets fetched
+        """
+        tweets = 0
+        while self.state["backfill_cursor"] and self.page_budget_left():
+            METRICS.progress(f"Fetching page {self.state['next_page']} for user {self.username}...")
+            page = self.client.last_tweets(self.user_id, self.state["backfill_cursor"])
+            self.save_page(page)
+            tweets += len(page_tweets(page))
+            has_next = page.get("has_next_page") and page.get("next_cursor")
+            self.state["backfill_cursor"] = page["next_cursor"] if has_next else None
+            self.save_state()
+        return tweets
+    
+    def run(self):
+        """
+        Bring the user's saved pages up to date
+        Returns: (pages fetched, tweets fetched, error message or None)
+        """
+        os.makedirs(self.json_dir, exist_ok=True)
+        tweets = 0
+        try:
+            tweets += self.fetch_new()
+            tweets += self.backfill()
+        except ScrapeError as e:
+            return self.fetched, tweets, str(e)
+        return self.fetched, tweets, None
+
+
+def load_candidates(candidates_dir=CANDIDATES_DIR):
+    """
+    Read the (username, user ID) pairs from the saved profile lookups
+    Returns: list of (username, user_id)
+    """
+    users = []
+    for name in sorted(os.listdir(candidates_dir)):
+        if name.endswith(".json"):
+            with open(os.path.join(candidates_dir, name), 'r', encoding='utf-8') as f:
+                profile = json.load(f)["data"]
+            users.append((profile["userName"], profile["id"]))
+    return users
+
+
+def scrape_users(client, tweets_dir, users, workers=DEFAULT_WORKERS, max_pages=None):
+    """
+    Scrape several users concurrently
+    Returns: dict of username -> (pages fetched, tweets fetched, error message or None)
+    """
+    results = {}
+    lock = threading.Lock()
+    
+    def scrape(user):
+        username, user_id = user
+        result = UserScraper(client, tweets_dir, username, user_id, max_pages).run()
+        with lock:
+            results[username] = result
+    
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        list(executor.map(scrape, users))
+    return results
+
+
+def parse_user(value):
+    username, separator, user_id = value.partition(":")
+    if not separator or not username or not user_id:
+        raise argparse.ArgumentTypeError(f"expected <username>:<user_id>, got {value!r}")
+    return username, user_id
+
+
+def main():
+    """Fetch new tweets for the candidates"""
+    parser = argparse.ArgumentParser(description='Scrape candidate timelines into per-page JSON files')
+    parser.add_argument('users', nargs='*', type=parse_user,
+                        help='Users as <username>:<user_id> (default: every profile in data/tweets/candidates)')
+    parser.add_argument('--tweets-dir', type=str, help='Output directory', default=TWEETS_DIR)
+    parser.add_argument('--base-url', type=str, help='API base URL (e.g. a local fake server)',
+                        default=DEFAULT_BASE_URL)
+    parser.add_argument('--workers', type=int, help='Users fetched concurrently', default=DEFAULT_WORKERS)
+    parser.add_argument('--max-pages', type=int, help='Maximum pages per user in this run')
+    parser.add_argument('--max-retries', type=int, help='Retries per page on rate limits and server errors',
+                        default=DEFAULT_MAX_RETRIES)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    configure_metrics(args)
+    
+    api_key = os.getenv("TWITTER_API_KEY")
+    if not api_key:
+        print("TWITTER_API_KEY is not set")
+        exit(1)
+    
+    users = args.users or load_candidates(os.path.join(args.tweets_dir, "candidates"))
+    client = TwitterClient(api_key, args.base_url, pool_size=args.workers, max_retries=args.max_retries)
+    try:
+        results = scrape_users(client, args.tweets_dir, users, args.workers, args.max_pages)
+    finally:
+        client.close()
+    
+    print("\nScrape summary:")
+    failed = 0
+    for username, (pages, tweets, error) in sorted(results.items()):
+        status = f"error: {error}" if error else "ok"
+        print(f"  - {username}: {pages} pages, {tweets} tweets ({status})")
+        failed += bool(error)
+    finish_metrics(args)
+    if failed:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The scripts import each other by bare module name, as when run from their own directory
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ("utils", "scrapers"):
+    sys.path.insert(0, os.path.join(REPO_ROOT, directory))
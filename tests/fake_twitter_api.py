@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+import json
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+# Tweets per timeline page, like the real API
+PAGE_SIZE = 20
+
+
+class FakeTwitterAPI:
+    """
+    In-memory stand-in for the last_tweets endpoint, served on a local port.
+    timelines maps user IDs to tweet IDs, newest first. The cursor is the ID of
+    the last tweet of the previous page, so it stays valid when new tweets are
+    posted. Request numbers listed in rate_limited are answered with a 429.
+    """
+    
+    def __init__(self, timelines=None, rate_limited=()):
+        self.timelines = timelines or {}
+        self.rate_limited = set(rate_limited)
+        self.requests = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.thread = None
+    
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+    
+    def post(self, user_id, count):
+        """Add count tweets on top of a user's timeline"""
+        timeline = self.timelines[user_id]
+        newest = timeline[0] if timeline else 1000
+        self.timelines[user_id] = list(range(newest + count, newest, -1)) + timeline
+    
+    def page(self, user_id, cursor):
+        timeline = self.timelines[user_id]
+        start = timeline.index(int(cursor)) + 1 if cursor else 0
+        tweet_ids = timeline[start:start + PAGE_SIZE]
+        has_next = start + PAGE_SIZE < len(timeline)
+        return {
+            "status": "success",
+            "data": {"tweets": [{"id": str(tweet_id), "text": f"Tweet {tweet_id}"} for tweet_id in tweet_ids]},
+            "has_next_page": has_next,
+            "next_cursor": str(tweet_ids[-1]) if has_next else "",
+        }
+    
+    def handler(self):
+        api = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def do_GET(self):
+                query = parse_qs(urlsplit(self.path).query)
+                with api.lock:
+                    api.requests.append(query)
+                    number = len(api.requests)
+                    if number in api.rate_limited:
+                        self.respond(429, {"error": "Too Many Requests"}, {"Retry-After": "0"})
+                        return
+                    page = api.page(query["userId"][0], query.get("cursor", [None])[0])
+                self.respond(200, page)
+            
+            def respond(self, status, body, headers=None):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+    
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    """Serve fake timelines for manual runs of scrape_tweets.py --base-url"""
+    parser = argparse.ArgumentParser(description='Serve a fake last_tweets endpoint')
+    parser.add_argument('users', nargs='+', help='Users as <user_id>:<number of tweets>')
+    args = parser.parse_args()
+    
+    api = FakeTwitterAPI()
+    for user in args.users:
+        user_id, _, count = user.partition(":")
+        api.timelines[user_id] = []
+        api.post(user_id, int(count))
+    print(f"Serving on {api.base_url}")
+    api.server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
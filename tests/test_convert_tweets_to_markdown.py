@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from benchmark import generate_tweet_pages
+from convert_tweets_to_markdown import find_json_files, process_json_files
+
+
+def markdown_files(tweets_dir):
+    return sorted(
+        os.path.join(user, name)
+        for user in os.listdir(tweets_dir)
+        if os.path.isdir(os.path.join(tweets_dir, user, "markdown"))
+        for name in os.listdir(os.path.join(tweets_dir, user, "markdown"))
+    )
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_pinned_tweet_is_written_and_counted_once(tmp_path, workers):
+    tweets_dir = str(tmp_path / "tweets")
+    pages, unique_tweets = generate_tweet_pages(tweets_dir, 120, users=2, page_size=10)
+    assert pages > 2
+    
+    summary = process_json_files(find_json_files(tweets_dir), tweets_dir, workers, manifest={})
+    
+    assert summary["tweets"] == unique_tweets
+    assert summary["written"] == unique_tweets
+    assert summary["rewritten"] == summary["unchanged"] == summary["errors"] == 0
+    assert len(markdown_files(tweets_dir)) == unique_tweets
+
+
+def test_force_rewrites_everything_and_still_removes_stale_markdown(tmp_path):
+    tweets_dir = str(tmp_path / "tweets")
+    _, unique_tweets = generate_tweet_pages(tweets_dir, 30, users=1, page_size=10)
+    manifest = {}
+    process_json_files(find_json_files(tweets_dir), tweets_dir, manifest=manifest)
+    
+    user = next(iter(manifest)).split("/")[0]
+    stale_file = os.path.join(tweets_dir, user, "markdown", "1.md")
+    with open(stale_file, 'w', encoding='utf-8') as f:
+        f.write("A tweet that is no longer in any page")
+    manifest[f"{user}/1"] = {"source": "gone.json", "hash": "0"}
+    
+    summary = process_json_files(find_json_files(tweets_dir), tweets_dir, manifest=manifest, force=True)
+    
+    assert summary["rewritten"] == unique_tweets
+    assert summary["unchanged"] == 0
+    assert summary["removed"] == 1
+    assert not os.path.exists(stale_file)
+    assert f"{user}/1" not in manifest
@@ -0,0 +1,118 @@
+import os
+import sys
+import stat
+import threading
+import textwrap
+
+import pytest
+
+pytest.importorskip("langdetect")
+pytest.importorskip("youtube_transcript_api")
+
+import convert_youtube_to_markdown as youtube
+from language_detection import LanguageDetector
+from metrics import METRICS
+
+
+CHANNELS = {
+    "https://www.youtube.com/@alpha/videos": "Mark Carney",
+    "https://www.youtube.com/@beta": "Jagmeet Singh",
+}
+
+# Lists five videos per channel (one before the cutoff) and dumps metadata for a video URL
+FAKE_YT_DLP = textwrap.dedent('''
+    import sys, json
+    args = sys.argv[1:]
+    if "--print" in args:
+        channel = args[args.index("--no-playlist") + 1].split("@")[1].split("/")[0]
+        for i in range(5):
+            date = "20240101" if i == 4 else f"2025030{i + 1}"
+            print(f"{channel}{i}|Campaign speech number {i} about the economy and housing|{date}")
+    else:
+        url = args[-1]
+        video_id = url.split("v=")[1]
+        if video_id == "beta2":
+            sys.exit("ERROR: video unavailable")
+        print(json.dumps({"id": video_id, "title": f"Speech {video_id}", "upload_date": "20250301",
+                          "webpage_url": url, "description": "A speech"}))
+''')
+
+
+class FakeTranscriptApi:
+    @staticmethod
+    def get_transcript(video_id, languages=None):
+        if video_id.endswith("1"):
+            raise Exception("Subtitles are disabled for this video")
+        return [{"text": f"Hello from {video_id}."}, {"text": "Thank you."}]
+
+
+@pytest.fixture
+def fake_youtube(tmp_path, monkeypatch):
+    script = tmp_path / "yt-dlp"
+    script.write_text(f"#!{sys.executable}\n{FAKE_YT_DLP}")
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(youtube, "YT_DLP", str(script))
+    monkeypatch.setattr(youtube, "YouTubeTranscriptApi", FakeTranscriptApi)
+    monkeypatch.setattr(youtube, "LANGUAGE_DETECTOR", LanguageDetector(str(tmp_path / "language_cache.json")))
+    monkeypatch.setattr(METRICS, "quiet", True)
+    return tmp_path
+
+
+def run(output_dir, concurrency):
+    METRICS.reset()
+    processed = youtube.process_videos("2025-01-01", 10, str(output_dir), concurrency, 0, CHANNELS)
+    counts = {outcome: METRICS.value("items_total", stage="fetch", outcome=outcome)
+              for outcome in ("processed", "skipped", "before_cutoff", "error")}
+    files = {}
+    for root, _, names in os.walk(output_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            with open(path, encoding="utf-8") as f:
+                files[os.path.relpath(path, output_dir)] = f.read()
+    return [os.path.relpath(path, output_dir) for path in processed], counts, files
+
+
+def test_concurrency_gives_same_results(fake_youtube):
+    serial = run(fake_youtube / "serial", 1)
+    concurrent = run(fake_youtube / "concurrent", 4)
+    
+    assert serial == concurrent
+    processed, counts, files = serial
+    assert counts == {"processed": 7, "skipped": 0, "before_cutoff": 0, "error": 1}
+    assert len(files) == 7
+    assert "Hello from alpha0." in files[os.path.join("Mark_Carney", "alpha0.md")]
+    assert "*Transcript not available" in files[os.path.join("Jagmeet_Singh", "beta1.md")]
+
+
+def test_second_run_skips_known_videos(fake_youtube):
+    run(fake_youtube / "out", 4)
+    processed, counts, _ = run(fake_youtube / "out", 4)
+    
+    assert processed == []
+    assert counts == {"processed": 0, "skipped": 7, "before_cutoff": 0, "error": 1}
+
+
+def test_transcript_calls_have_their_own_rate_limit(fake_youtube, monkeypatch):
+    waits = []
+    monkeypatch.setattr(youtube.HostRateLimiter, "wait", lambda self, url: waits.append((id(self), url)))
+    channels = {"https://www.youtube.com/@alpha": "Mark Carney"}
+    youtube.process_videos("2025-01-01", 2, str(fake_youtube / "out"), 1, 1, channels)
+    
+    metadata_limiters = {limiter for limiter, url in waits if "watch?v=" in url}
+    transcript_limiters = {limiter for limiter, url in waits if url == youtube.TRANSCRIPT_API_URL}
+    assert len(metadata_limiters) == len(transcript_limiters) == 1
+    assert metadata_limiters != transcript_limiters
+
+
+def test_channels_are_listed_in_parallel_by_default(fake_youtube, monkeypatch):
+    barrier = threading.Barrier(len(CHANNELS), timeout=5)
+    
+    def list_channel_videos(channel_url, candidate, cutoff_date, per_channel_limit):
+        # Every channel must be in flight at once for the barrier to open
+        barrier.wait()
+        return [{"id": candidate, "url": channel_url, "candidate": candidate}]
+    
+    monkeypatch.setattr(youtube, "list_channel_videos", list_channel_videos)
+    videos = youtube.get_videos_to_process("2025-01-01", 10, CHANNELS)
+    
+    assert [video["candidate"] for video in videos] == list(CHANNELS.values())
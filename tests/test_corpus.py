@@ -0,0 +1,29 @@
+import os
+
+from corpus import load_documents
+
+
+def write_tweet(data_dir, name, text):
+    markdown_dir = data_dir / "tweets" / "user" / "markdown"
+    markdown_dir.mkdir(parents=True, exist_ok=True)
+    path = markdown_dir / name
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def test_cache_is_refreshed_when_a_file_is_rewritten_in_place(tmp_path):
+    data_dir = tmp_path / "data"
+    cache_path = str(tmp_path / "corpus.columns.json.gz")
+    path = write_tweet(data_dir, "1.md", "# Tweet by User (@user)\n\nFirst version")
+    write_tweet(data_dir, "2.md", "# Tweet by User (@user)\n\nUnrelated")
+    directory_mtime = os.stat(path.parent).st_mtime_ns
+    
+    assert [d.body for d in load_documents(str(data_dir), cache_path)][0].endswith("First version")
+    
+    path.write_text("# Tweet by User (@user)\n\nSecond version", encoding="utf-8")
+    # Rewriting in place leaves the directory untouched
+    os.utime(path.parent, ns=(directory_mtime, directory_mtime))
+    
+    bodies = [d.body for d in load_documents(str(data_dir), cache_path)]
+    assert bodies[0].endswith("Second version")
+    assert len(bodies) == 2
@@ -0,0 +1,54 @@
+from itertools import islice
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from embedding_cache import EmbeddingCache
+from embedding_index import embed_missing_chunks
+
+
+class FakeRunner:
+    """Encodes texts into small deterministic vectors, recording every text it was given"""
+    
+    def __init__(self, block_size=4):
+        self.block_size = block_size
+        self.texts = []
+    
+    def encode_stream(self, items):
+        items = iter(items)
+        while True:
+            block = list(islice(items, self.block_size))
+            if not block:
+                return
+            self.texts.extend(text for _, text in block)
+            yield [key for key, _ in block], np.array([[len(text), 1.0] for _, text in block], dtype=np.float32)
+    
+    def throughput(self):
+        return 0.0
+
+
+def write_tweet(data_dir, name, text):
+    markdown_dir = data_dir / "tweets" / "user" / "markdown"
+    markdown_dir.mkdir(parents=True, exist_ok=True)
+    (markdown_dir / name).write_text(text, encoding="utf-8")
+
+
+def test_identical_chunks_are_encoded_once(tmp_path):
+    data_dir = tmp_path / "data"
+    for i in range(3):
+        write_tweet(data_dir, f"{i}a.md", "A retweeted announcement")
+        write_tweet(data_dir, f"{i}b.md", f"Original tweet number {i}")
+    cache = EmbeddingCache(str(tmp_path / "cache"), "fake-model")
+    runner = FakeRunner()
+    
+    rows, encoded = embed_missing_chunks(str(data_dir), "fake-model", cache, runner=runner)
+    
+    assert len(rows) == 6
+    assert encoded == 4
+    assert sorted(runner.texts) == sorted(set(runner.texts))
+    
+    rows_again, encoded_again = embed_missing_chunks(str(data_dir), "fake-model", cache, runner=FakeRunner())
+    assert rows_again == rows
+    assert encoded_again == 0
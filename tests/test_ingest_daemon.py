@@ -0,0 +1,75 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import ingest_daemon
+from ingest_daemon import MAX_ATTACH_ATTEMPTS, IngestPipeline, IngestState, VectorStoreAttacher
+
+
+class FakeVectorStores:
+    """File batches that complete as a whole while the listing reports some files as failed"""
+    
+    def __init__(self, failing):
+        self.failing = failing
+        self.file_batches = self
+        self.files_by_batch = {}
+    
+    def list(self):
+        return SimpleNamespace(data=[SimpleNamespace(id="vs-1", name="Store")])
+    
+    def create_and_poll(self, vector_store_id, file_ids):
+        batch_id = f"batch-{len(self.files_by_batch)}"
+        self.files_by_batch[batch_id] = file_ids
+        return SimpleNamespace(id=batch_id, status="completed")
+    
+    def list_files(self, batch_id, vector_store_id, limit):
+        return [SimpleNamespace(id=file_id, status="failed" if file_id in self.failing else "completed")
+                for file_id in self.files_by_batch[batch_id]]
+
+
+class FakeAttacher:
+    """Attaches every file except those in failing, recording each batch it was given"""
+    
+    def __init__(self, failing):
+        self.failing = failing
+        self.batches = []
+    
+    def attach(self, file_ids):
+        self.batches.append(list(file_ids))
+        return {file_id for file_id in file_ids if file_id not in self.failing}
+
+
+def test_attach_reports_only_completed_files():
+    client = SimpleNamespace(vector_stores=FakeVectorStores(failing={"file-2"}))
+    attacher = VectorStoreAttacher(client, "Store")
+    
+    assert attacher.attach(["file-1", "file-2", "file-3"]) == {"file-1", "file-3"}
+
+
+def test_failing_file_does_not_block_the_attach_queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest_daemon, "ATTACH_RETRY_DELAY", 0)
+    data_dir = tmp_path / "data"
+    state = IngestState(str(tmp_path / "state.sqlite3"), str(data_dir))
+    file_ids = ["file-bad", "file-1", "file-2", "file-3"]
+    for file_id in file_ids:
+        state.add_pending_attachment(file_id, str(data_dir / f"{file_id}.md"))
+    attacher = FakeAttacher(failing={"file-bad"})
+    pipeline = IngestPipeline(str(data_dir), state, None, None, attacher, attach_batch=2, attach_interval=0)
+    
+    thread = threading.Thread(target=pipeline.attach_stage)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while sum(batch.count("file-bad") for batch in attacher.batches) < MAX_ATTACH_ATTEMPTS:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    # Give the stage time to retry the parked file, which it must not do
+    time.sleep(0.2)
+    pipeline.stop_event.set()
+    thread.join()
+    
+    attempted = [file_id for batch in attacher.batches for file_id in batch]
+    assert pipeline.stats["attached"] == 3
+    assert attempted.count("file-bad") == MAX_ATTACH_ATTEMPTS
+    # The parked file stays in the state, so the next start tries it again
+    assert state.pending_attachments() == ["file-bad"]
+    state.close()
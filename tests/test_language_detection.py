@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+
+pytest.importorskip("langdetect")
+
+from langdetect import detector_factory
+
+from language_detection import LanguageDetector
+
+
+TITLES = [
+    "Our plan to build more homes and lower the cost of living for families",
+    "Standing up for workers and protecting good jobs across the country",
+    "Live from the campaign trail with an announcement about health care",
+    "Why we need a stronger economy that works for everyone in Canada",
+]
+
+
+def test_detector_is_deterministic_when_shared_between_threads(monkeypatch, tmp_path):
+    for trial in range(5):
+        # Start from an unloaded langdetect, as a fresh process would
+        monkeypatch.setattr(detector_factory, "_factory", None)
+        detector = LanguageDetector(str(tmp_path / f"cache{trial}.json"))
+        barrier = threading.Barrier(len(TITLES))
+        results = [None] * len(TITLES)
+        
+        def detect(number):
+            barrier.wait()
+            results[number] = detector.detect_batch([TITLES[number]])[0]
+        
+        threads = [threading.Thread(target=detect, args=(number,)) for number in range(len(TITLES))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert results == ["en"] * len(TITLES)
+
+
+def test_cache_survives_a_round_trip(tmp_path):
+    cache_path = str(tmp_path / "language_cache.json")
+    detector = LanguageDetector(cache_path)
+    assert detector.detect_batch(TITLES + ["Le gouvernement annonce un nouveau plan pour le logement"]) == \
+        ["en"] * len(TITLES) + ["fr"]
+    detector.save()
+    
+    reloaded = LanguageDetector(cache_path)
+    assert reloaded.cache == detector.cache
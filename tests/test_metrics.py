@@ -0,0 +1,32 @@
+import json
+
+from metrics import Metrics
+
+
+def test_report_shows_quantiles_past_the_last_bucket(capsys):
+    metrics = Metrics(buckets=(0.001, 0.01))
+    metrics.observe("stage_seconds", 0.0005, stage="parse")
+    metrics.observe("stage_seconds", 5.0, stage="upload")
+    
+    metrics.report()
+    
+    output = capsys.readouterr().out
+    assert "parse: 1 operations" in output and "p99 <= 1ms" in output
+    assert "upload: 1 operations" in output and "p99 > 10ms" in output
+    assert "inf" not in output
+
+
+def test_export_writes_prometheus_text_and_json_lines(tmp_path):
+    metrics = Metrics(buckets=(0.001, 0.01))
+    metrics.count("items_total", 3, stage="write", outcome="written")
+    metrics.observe("stage_seconds", 5.0, stage="write")
+    
+    metrics.export(str(tmp_path / "metrics.prom"))
+    metrics.export(str(tmp_path / "metrics.jsonl"))
+    
+    text = (tmp_path / "metrics.prom").read_text()
+    assert 'pipeline_items_total{outcome="written",stage="write"} 3' in text
+    assert 'pipeline_stage_seconds_bucket{stage="write",le="+Inf"} 1' in text
+    records = [json.loads(line) for line in (tmp_path / "metrics.jsonl").read_text().splitlines()]
+    assert [record["type"] for record in records] == ["counter", "histogram"]
+    assert records[1]["p99"] is None
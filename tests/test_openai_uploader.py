@@ -0,0 +1,38 @@
+import pytest
+
+from openai_uploader import OpenAIUploadClient, UploadClient, UploadError, Uploader
+
+
+class FakeClient(UploadClient):
+    """Fails the first upload of each file with a 429, then returns an ID derived from the path"""
+    
+    def __init__(self):
+        self.attempts = {}
+    
+    def upload(self, file_path, purpose):
+        self.attempts[file_path] = self.attempts.get(file_path, 0) + 1
+        if self.attempts[file_path] == 1:
+            raise UploadError("rate limited", status_code=429, retry_after=0)
+        return f"file-{file_path}"
+
+
+def test_upload_client_is_abstract():
+    with pytest.raises(TypeError):
+        UploadClient()
+
+
+def test_upload_files_accepts_a_generator():
+    uploader = Uploader(FakeClient(), workers=3, requests_per_second=0, backoff_base=0)
+    paths = [f"doc{i}.md" for i in range(5)]
+    
+    file_ids = uploader.upload_files(path for path in paths)
+    
+    assert file_ids == {path: f"file-{path}" for path in paths}
+
+
+def test_openai_client_leaves_retries_to_the_uploader(monkeypatch):
+    openai = pytest.importorskip("openai")
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    
+    assert OpenAIUploadClient(base_url="http://127.0.0.1:9").client.max_retries == 0
+    assert OpenAIUploadClient(openai.OpenAI(max_retries=3)).client.max_retries == 0
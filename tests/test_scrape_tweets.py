@@ -0,0 +1,95 @@
+import json
+import os
+
+import pytest
+
+from fake_twitter_api import FakeTwitterAPI
+from scrape_tweets import STATE_FILENAME, TwitterClient, page_tweet_ids, scrape_users
+
+
+@pytest.fixture
+def api():
+    api = FakeTwitterAPI({"1": [], "2": []}).start()
+    api.post("1", 45)
+    api.post("2", 30)
+    yield api
+    api.stop()
+
+
+def scrape(api, tweets_dir, max_pages=None, users=(("alice", "1"), ("bob", "2"))):
+    client = TwitterClient("test-key", api.base_url, backoff_base=0)
+    try:
+        return scrape_users(client, str(tweets_dir), list(users), workers=2, max_pages=max_pages)
+    finally:
+        client.close()
+
+
+def saved_pages(tweets_dir, username):
+    json_dir = os.path.join(tweets_dir, username, "json")
+    pages = sorted(int(name[:-5]) for name in os.listdir(json_dir) if name.endswith(".json"))
+    assert pages == list(range(1, len(pages) + 1))
+    result = []
+    for number in pages:
+        with open(os.path.join(json_dir, f"{number}.json"), encoding="utf-8") as f:
+            result.append(page_tweet_ids(json.load(f)))
+    return result
+
+
+def saved_ids(tweets_dir, username):
+    return {tweet_id for page in saved_pages(tweets_dir, username) for tweet_id in page}
+
+
+def test_full_walk_with_rate_limits(api, tmp_path):
+    api.rate_limited = {2, 3}
+    
+    results = scrape(api, tmp_path)
+    
+    assert results == {"alice": (3, 45, None), "bob": (2, 30, None)}
+    assert saved_ids(tmp_path, "alice") == set(api.timelines["1"])
+    assert saved_ids(tmp_path, "bob") == set(api.timelines["2"])
+    with open(tmp_path / "alice" / STATE_FILENAME, encoding="utf-8") as f:
+        state = json.load(f)
+    assert state["newest_id"] == max(api.timelines["1"])
+    assert state["backfill_cursor"] is None
+    assert state["next_page"] == 4
+
+
+def test_interrupted_walk_resumes_from_cursor(api, tmp_path):
+    users = (("alice", "1"),)
+    assert scrape(api, tmp_path, max_pages=1, users=users) == {"alice": (1, 20, None)}
+    assert scrape(api, tmp_path, max_pages=1, users=users) == {"alice": (1, 20, None)}
+    assert scrape(api, tmp_path, users=users) == {"alice": (1, 5, None)}
+    
+    pages = saved_pages(tmp_path, "alice")
+    assert [len(page) for page in pages] == [20, 20, 5]
+    assert sorted(tweet_id for page in pages for tweet_id in page) == sorted(api.timelines["1"])
+    # The walk is finished; nothing new to fetch
+    assert scrape(api, tmp_path, users=users) == {"alice": (0, 0, None)}
+
+
+def test_refresh_fetches_only_new_tweets(api, tmp_path):
+    users = (("alice", "1"),)
+    scrape(api, tmp_path, users=users)
+    api.post("1", 5)
+    
+    assert scrape(api, tmp_path, users=users) == {"alice": (1, 5, None)}
+    assert saved_ids(tmp_path, "alice") == set(api.timelines["1"])
+    assert len(saved_pages(tmp_path, "alice")) == 4
+
+
+def test_refresh_cut_short_by_max_pages_is_resumed(api, tmp_path):
+    users = (("alice", "1"),)
+    scrape(api, tmp_path, users=users)
+    api.post("1", 45)
+    
+    assert scrape(api, tmp_path, max_pages=1, users=users) == {"alice": (1, 20, None)}
+    api.post("1", 3)
+    # Closes the gap below the first refreshed page (2 pages), then fetches the 3 newest tweets
+    assert scrape(api, tmp_path, users=users) == {"alice": (3, 28, None)}
+    
+    pages = saved_pages(tmp_path, "alice")
+    assert len(pages) == 7
+    assert saved_ids(tmp_path, "alice") == set(api.timelines["1"])
+    # The pages closing the gap continue below the interrupted refresh instead of repeating it
+    interrupted, gap = pages[3], pages[4] + pages[5]
+    assert max(gap) == min(interrupted) - 1
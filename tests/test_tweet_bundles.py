@@ -0,0 +1,43 @@
+import json
+import os
+
+from corpus import Document
+from tweet_bundles import BUNDLE_INDEX_FILENAME, BundleWriter, build_bundles
+
+
+def make_tweet(tweet_id, date, text="Some tweet text"):
+    return Document(tweet_id, "Candidate", "tweet", date, f"https://x.com/user/status/{tweet_id}", "",
+                    f"tweets/user/markdown/{tweet_id}.md", f"# Tweet by Candidate (@user)\n\n{text}\n")
+
+
+def test_interleaved_months_keep_every_tweet(tmp_path):
+    writer = BundleWriter(str(tmp_path), max_bytes=300)
+    tweets = [make_tweet(str(i), "2025-03-01" if i % 3 else "") for i in range(1, 13)]
+    for tweet in tweets:
+        writer.add("user", tweet.date[:7] or "undated", tweet)
+    writer.flush()
+    
+    indexed = [tweet_id for info in writer.index.values() for tweet_id in info["tweet_ids"]]
+    assert sorted(indexed, key=int) == [tweet.id for tweet in tweets]
+    assert sorted(os.listdir(tmp_path)) == sorted(writer.index)
+    for filename, info in writer.index.items():
+        with open(tmp_path / filename, encoding="utf-8") as f:
+            content = f.read()
+        assert all(f'<a id="tweet-{tweet_id}"></a>' in content for tweet_id in info["tweet_ids"])
+
+
+def test_build_bundles_splits_months_into_parts(tmp_path):
+    markdown_dir = tmp_path / "tweets" / "user" / "markdown"
+    markdown_dir.mkdir(parents=True)
+    for i in range(1, 7):
+        day = "2025-03-01" if i <= 4 else "2025-04-01"
+        (markdown_dir / f"{i}.md").write_text(
+            f"# Tweet by Candidate (@user)\n\nTweet number {i} " + "x" * 100 + f"\n\nDate: {day}\n",
+            encoding="utf-8")
+    
+    index = build_bundles(str(tmp_path / "tweets"), str(tmp_path / "bundles"), max_bytes=400)
+    
+    assert [(info["month"], info["part"]) for _, info in sorted(index.items())] == [
+        ("2025-03", 1), ("2025-03", 2), ("2025-04", 1)]
+    with open(tmp_path / "bundles" / BUNDLE_INDEX_FILENAME, encoding="utf-8") as f:
+        assert json.load(f) == index
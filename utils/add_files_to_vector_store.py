@@ -3,9 +3,18 @@ import os
 import time
 import json
 import argparse
+from itertools import islice
+
+from metrics import METRICS, add_metrics_arguments, configure_metrics, finish_metrics
 
 client = OpenAI()
 
+# Maximum number of file IDs the API accepts in one file batch
+DEFAULT_BATCH_SIZE = 500
+
+# Number of files requested per page when listing files
+LIST_PAGE_SIZE = 100
+
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Add files to an OpenAI vector store')
     parser.add_argument('--store', default='Policy Explorer',
@@ -14,83 +23,219 @@ def parse_arguments():
                       help='Limit the number of files to process (for testing)')
     parser.add_argument('--purpose', default='assistants',
                       help='Filter files by purpose (e.g., "vector_store", "assistants")')
+    parser.add_argument('--batch', action='store_true',
+                      help='Attach files with file-batch requests instead of one request per file')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                      help='Number of files per file-batch request (at most 500)')
+    add_metrics_arguments(parser)
     return parser.parse_args()
 
-def main():
-    args = parse_arguments()
-    
-    # Get all existing files from OpenAI
-    print("Fetching list of existing files from OpenAI...")
-    try:
-        existing_files = client.files.list(purpose=args.purpose)
-        if args.limit:
-            existing_files.data = existing_files.data[:args.limit]
-        
-        print(f"Found {len(existing_files.data)} existing files in OpenAI")
-    except Exception as e:
-        print(f"Error fetching files from OpenAI: {e}")
-        exit(1)
+def iter_files(purpose, limit=None, page_size=LIST_PAGE_SIZE):
+    """
+    Lazily iterate over the account's files, fetching one page at a time.
+    Stops requesting pages once `limit` files have been yielded.
+    """
+    def pages():
+        with METRICS.timer("fetch"):
+            page = client.files.list(purpose=purpose, limit=page_size)
+        while True:
+            yield page
+            if not page.has_next_page():
+                return
+            with METRICS.timer("fetch"):
+                page = page.get_next_page()
     
-    if not existing_files.data:
-        print("No files found in your OpenAI account. Exiting.")
-        exit(0)
+    files = (file for page in pages() for file in page.data)
+    return islice(files, limit) if limit else files
+
+def list_vector_store_file_ids(vector_store_id):
+    """Return the IDs of every file already attached to a vector store (vector store file IDs are file IDs)."""
+    attached = set()
+    # Iterating the page follows the pagination cursor through the whole listing
+    for vector_store_file in client.vector_stores.files.list(vector_store_id=vector_store_id, limit=100):
+        attached.add(vector_store_file.id)
+    return attached
+
+def list_batch_file_statuses(vector_store_id, batch_id):
+    """Return a dict mapping the file IDs of a file batch to their status ("completed", "failed", ...)."""
+    statuses = {}
+    # Iterating the page follows the pagination cursor through the whole listing
+    for vector_store_file in client.vector_stores.file_batches.list_files(
+            batch_id=batch_id, vector_store_id=vector_store_id, limit=100):
+        statuses[vector_store_file.id] = vector_store_file.status
+    return statuses
+
+def attach_file_batches(vector_store_id, files, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Attach files to a vector store in file batches, waiting for each batch to finish.
+    files may be any iterable; a batch is submitted as soon as it is full.
+    Only the files the batch listing reports as completed are recorded as attached,
+    whatever the status of the batch as a whole.
+    Returns: list of file association records for the output JSON
+    """
+    vector_store_files = []
+    batch_size = max(1, min(batch_size, DEFAULT_BATCH_SIZE))
+    files = iter(files)
+    submitted = 0
     
-    # Find the existing vector store
-    try:
-        vector_stores = client.vector_stores.list()
-        vector_store = next((vs for vs in vector_stores.data if vs.name == args.store), None)
+    while True:
+        batch_files = list(islice(files, batch_size))
+        if not batch_files:
+            break
+        submitted += len(batch_files)
+        print(f"Submitting batch of {len(batch_files)} files ({submitted} submitted so far)...")
         
-        if vector_store:
-            print(f"Using vector store: {vector_store.name} (ID: {vector_store.id})")
-        else:
-            print(f"Error: Vector store '{args.store}' not found. Would you like to create it? (y/n)")
-            choice = input().lower()
-            if choice == 'y':
-                vector_store = client.vector_stores.create(name=args.store)
-                print(f"Created new vector store: {vector_store.id}")
-            else:
-                print("Exiting...")
-                exit(1)
-    except Exception as e:
-        print(f"Error accessing vector stores: {e}")
-        exit(1)
+        try:
+            with METRICS.timer("attach"):
+                batch = client.vector_stores.file_batches.create_and_poll(
+                    vector_store_id=vector_store_id,
+                    file_ids=[file.id for file in batch_files]
+                )
+        except Exception as e:
+            print(f"Error submitting file batch: {e}")
+            METRICS.count("items_total", len(batch_files), stage="attach", outcome="failed")
+            continue
+        
+        counts = batch.file_counts
+        print(f"Batch {batch.id} {batch.status}: {counts.completed} completed, "
+              f"{counts.failed} failed, {counts.cancelled} cancelled")
+        
+        try:
+            with METRICS.timer("fetch"):
+                statuses = list_batch_file_statuses(vector_store_id, batch.id)
+        except Exception as e:
+            print(f"Error listing files of batch {batch.id}: {e}")
+            METRICS.count("items_total", len(batch_files), stage="attach", outcome="failed")
+            continue
+        
+        for file in batch_files:
+            status = statuses.get(file.id, "missing")
+            if status != "completed":
+                print(f"  > File {file.filename} (ID: {file.id}) was not attached: {status}")
+                METRICS.count("items_total", stage="attach", outcome="failed")
+                continue
+            METRICS.count("items_total", stage="attach", outcome="attached")
+            vector_store_files.append({
+                "file_name": file.filename,
+                "file_id": file.id,
+                "batch_id": batch.id
+            })
     
+    return vector_store_files
+
+def attach_files(vector_store_id, files):
+    """
+    Attach files to a vector store one request at a time, as they are read from files.
+    Returns: list of file association records for the output JSON
+    """
     # Create a list to store vector store file associations
     vector_store_files = []
     
     # Associate each file with the vector store
-    for file in existing_files.data:
+    for file in files:
         file_id = file.id
         file_name = file.filename
         
-        print(f"Adding file {file_name} (ID: {file_id}) to vector store...")
+        METRICS.progress(f"Adding file {file_name} (ID: {file_id}) to vector store...")
         
         try:
             # Associate file with vector store
-            vector_store_file = client.vector_stores.files.create(
-                vector_store_id=vector_store.id,
-                file_id=file_id
-            )
+            with METRICS.timer("attach"):
+                vector_store_file = client.vector_stores.files.create(
+                    vector_store_id=vector_store_id,
+                    file_id=file_id
+                )
             vector_store_files.append({
                 "file_name": file_name,
                 "file_id": file_id,
                 "vector_store_file_id": vector_store_file.id
             })
-            print(f"Associated file {file_id} with vector store {vector_store.id}")
+            METRICS.progress(f"Associated file {file_id} with vector store {vector_store_id}")
+            METRICS.count("items_total", stage="attach", outcome="attached")
             
             # Small delay to avoid rate limiting
             time.sleep(0.1)
         
         except Exception as e:
             if "already exists" in str(e).lower():
-                print(f"File {file_id} is already associated with this vector store")
+                METRICS.progress(f"File {file_id} is already associated with this vector store")
+                METRICS.count("items_total", stage="attach", outcome="skipped")
             else:
                 print(f"Error associating file {file_id} with vector store: {e}")
+                METRICS.count("items_total", stage="attach", outcome="failed")
+    
+    return vector_store_files
+
+def main():
+    args = parse_arguments()
+    configure_metrics(args)
+    
+    # Find the existing vector store
+    try:
+        vector_stores = client.vector_stores.list()
+        vector_store = next((vs for vs in vector_stores.data if vs.name == args.store), None)
+        
+        if vector_store:
+            print(f"Using vector store: {vector_store.name} (ID: {vector_store.id})")
+        else:
+            print(f"Error: Vector store '{args.store}' not found. Would you like to create it? (y/n)")
+            choice = input().lower()
+            if choice == 'y':
+                vector_store = client.vector_stores.create(name=args.store)
+                print(f"Created new vector store: {vector_store.id}")
+            else:
+                print("Exiting...")
+                exit(1)
+    except Exception as e:
+        print(f"Error accessing vector stores: {e}")
+        exit(1)
+    
+    # Skip files that are already attached instead of resubmitting them
+    try:
+        attached_ids = list_vector_store_file_ids(vector_store.id)
+    except Exception as e:
+        print(f"Error listing files in vector store: {e}")
+        exit(1)
+    
+    # Stream the account's files page by page, so attaching starts with the first page
+    print("Fetching list of existing files from OpenAI...")
+    counts = {"found": 0, "attached": 0}
+    listing_errors = []
+    
+    def files_to_attach():
+        try:
+            for file in iter_files(args.purpose, args.limit):
+                counts["found"] += 1
+                if file.id in attached_ids:
+                    counts["attached"] += 1
+                    METRICS.count("items_total", stage="attach", outcome="skipped")
+                    continue
+                yield file
+        except Exception as e:
+            # Stop attaching, but fail the run below instead of passing the partial listing off as complete
+            print(f"Error fetching files from OpenAI: {e}")
+            listing_errors.append(e)
+    
+    if args.batch:
+        vector_store_files = attach_file_batches(vector_store.id, files_to_attach(), args.batch_size)
+    else:
+        vector_store_files = attach_files(vector_store.id, files_to_attach())
+    
+    print(f"Found {counts['found']} existing files in OpenAI, "
+          f"{counts['attached']} already associated with this vector store")
+    
+    if not counts["found"] and not listing_errors:
+        print("No files found in your OpenAI account.")
     
     print(f"Successfully associated {len(vector_store_files)} files with vector store '{vector_store.name}'")
     
-    # Save the vector store file IDs to a JSON file for reference
     output_file = "vector_store_files.json"
+    if listing_errors:
+        print(f"Listing the account's files failed part way; not updating {output_file}")
+        finish_metrics(args)
+        exit(1)
+    
+    # Save the vector store file IDs to a JSON file for reference
     with open(output_file, "w") as f:
         json.dump({
             "vector_store_id": vector_store.id,
@@ -99,6 +244,7 @@ def main():
         }, f, indent=2)
     
     print(f"Vector store file information saved to {output_file}")
+    finish_metrics(args)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+import time
+
+import numpy as np
+import faiss
+
+
+# Supported index types and the parameters that shape them
+INDEX_TYPES = ("flat", "ivf-flat", "hnsw", "ivf-pq")
+DEFAULT_INDEX_PARAMS = {
+    "type": "flat",
+    "nlist": 1024,
+    "hnsw_m": 32,
+    "pq_m": 16,
+    "pq_bits": 8,
+}
+
+# Vectors sampled to train IVF coarse quantizers and PQ codebooks
+DEFAULT_TRAIN_SAMPLE = 50000
+
+# FAISS wants roughly this many training points per IVF list
+MIN_POINTS_PER_LIST = 39
+
+# Search-time settings swept by the recall/latency report
+NPROBE_VALUES = (1, 2, 4, 8, 16, 32, 64, 128)
+EF_SEARCH_VALUES = (16, 32, 64, 128, 256, 512)
+
+
+def factory_string(params, train_size=None):
+    """
+    FAISS index_factory description for a set of index parameters
+    nlist is reduced when the training sample is too small for it
+    """
+    index_type = params["type"]
+    nlist = params["nlist"]
+    if train_size is not None:
+        nlist = max(1, min(nlist, train_size // MIN_POINTS_PER_LIST))
+    
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "ivf-flat":
+        return f"IVF{nlist},Flat"
+    if index_type == "hnsw":
+        return f"HNSW{params['hnsw_m']},Flat"
+    if index_type == "ivf-pq":
+        return f"IVF{nlist},PQ{params['pq_m']}x{params['pq_bits']}"
+    raise ValueError(f"Unknown index type '{index_type}', expected one of {', '.join(INDEX_TYPES)}")
+
+
+def create_index(params, dimension, train_vectors=None):
+    """
+    Create an empty index of the requested type, training it on train_vectors when needed
+    Raises ValueError if the parameters do not fit the data
+    """
+    if params["type"] == "ivf-pq":
+        if dimension % params["pq_m"]:
+            raise ValueError(f"pq_m={params['pq_m']} must divide the embedding dimension {dimension}")
+        min_train = 2 ** params["pq_bits"]
+        if train_vectors is None or len(train_vectors) < min_train:
+            raise ValueError(f"IVF-PQ with {params['pq_bits']}-bit codes needs at least {min_train} training vectors")
+    
+    train_size = len(train_vectors) if train_vectors is not None else None
+    index = faiss.index_factory(dimension, factory_string(params, train_size))
+    
+    if not index.is_trained:
+        if train_vectors is None or not len(train_vectors):
+            raise ValueError(f"Index type '{params['type']}' needs training vectors")
+        index.train(np.ascontiguousarray(train_vectors, dtype=np.float32))
+    
+    return index
+
+
+def sample_rows(rows, sample_size, seed=0):
+    """Pick up to sample_size distinct rows at random, reproducibly"""
+    if len(rows) <= sample_size:
+        return list(rows)
+    rng = np.random.default_rng(seed)
+    return [rows[i] for i in sorted(rng.choice(len(rows), sample_size, replace=False))]
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """Apply nprobe (IVF) and efSearch (HNSW) to an index where they are meaningful"""
+    parameter_space = faiss.ParameterSpace()
+    if nprobe is not None:
+        try:
+            parameter_space.set_index_parameter(index, "nprobe", nprobe)
+        except RuntimeError:
+            pass
+    if ef_search is not None:
+        try:
+            parameter_space.set_index_parameter(index, "efSearch", ef_search)
+        except RuntimeError:
+            pass
+
+
+def read_index(index_path):
+    """Read a saved index memory-mapped, falling back to a normal read for types that do not support it"""
+    try:
+        return faiss.read_index(index_path, faiss.IO_FLAG_MMAP)
+    except RuntimeError:
+        return faiss.read_index(index_path)
+
+
+def measure(index, queries, truth, k):
+    """
+    Search index for each query one at a time
+    Returns: (recall@k against truth, mean latency in ms, p99 latency in ms)
+    """
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        _, positions = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(positions[0]) & set(expected))
+    return hits / (len(queries) * k), float(np.mean(latencies)), float(np.percentile(latencies, 99))
+
+
+def recall_latency_report(vectors, index_types=("ivf-flat", "hnsw", "ivf-pq"), params=None,
+                          query_count=200, k=10, train_sample=DEFAULT_TRAIN_SAMPLE, seed=0):
+    """
+    Compare approximate index types against the exact flat baseline
+    Queries are a random sample of the indexed vectors; each index is swept over
+    its search-time setting (nprobe or efSearch)
+    Returns: list of result dicts, one per index type and setting
+    """
+    params = dict(DEFAULT_INDEX_PARAMS, **(params or {}))
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    dimension = vectors.shape[1]
+    build_threads = faiss.omp_get_max_threads()
+    
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), min(query_count, len(vectors)), replace=False)]
+    train_vectors = vectors[sample_rows(range(len(vectors)), train_sample, seed)]
+    
+    flat = faiss.IndexFlatL2(dimension)
+    flat.add(vectors)
+    _, truth = flat.search(queries, k)
+    
+    # Indexes are built with every core; latency is measured single-threaded
+    faiss.omp_set_num_threads(1)
+    recall, mean_ms, p99_ms = measure(flat, queries, truth, k)
+    results = [{"type": "flat", "setting": None, "recall": recall, "mean_ms": mean_ms, "p99_ms": p99_ms,
+                "build_s": 0.0}]
+    
+    for index_type in index_types:
+        type_params = dict(params, type=index_type)
+        faiss.omp_set_num_threads(build_threads)
+        start = time.perf_counter()
+        try:
+            index = create_index(type_params, dimension, train_vectors)
+        except ValueError as e:
+            print(f"Skipping {index_type}: {e}")
+            continue
+        index.add(vectors)
+        build_s = time.perf_counter() - start
+        faiss.omp_set_num_threads(1)
+        
+        if index_type == "hnsw":
+            settings = [("efSearch", value) for value in EF_SEARCH_VALUES]
+        else:
+            settings = [("nprobe", value) for value in NPROBE_VALUES if value <= index.nlist]
+        
+        for name, value in settings:
+            set_search_params(index, **({"nprobe": value} if name == "nprobe" else {"ef_search": value}))
+            recall, mean_ms, p99_ms = measure(index, queries, truth, k)
+            results.append({"type": index_type, "setting": f"{name}={value}", "recall": recall,
+                            "mean_ms": mean_ms, "p99_ms": p99_ms, "build_s": build_s})
+    
+    faiss.omp_set_num_threads(build_threads)
+    return results
+
+
+def print_report(results, k):
+    """Print recall/latency results as a table"""
+    print(f"{'index':<10} {'setting':<14} {'recall@' + str(k):>10} {'mean ms':>9} {'p99 ms':>9} {'build s':>9}")
+    for result in results:
+        print(f"{result['type']:<10} {result['setting'] or '-':<14} {result['recall']:>10.3f} "
+              f"{result['mean_ms']:>9.3f} {result['p99_ms']:>9.3f} {result['build_s']:>9.2f}")
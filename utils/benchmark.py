@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from chunking import chunk_markdown
+from corpus import find_corpus_files
+from openai_uploader import UploadClient, Uploader
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "data", "benchmarks")
+
+STAGES = ("convert", "render", "chunk", "embed", "index", "upload")
+
+DEFAULT_DOCUMENTS = 10000
+
+# Share of the documents generated as videos; the rest are tweets
+DEFAULT_VIDEO_SHARE = 0.02
+
+DEFAULT_USERS = 8
+DEFAULT_PAGE_SIZE = 20
+DEFAULT_TRANSCRIPT_WORDS = 1500
+DEFAULT_SEED = 42
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+
+# Simulated round trip of one upload to the fake client, in seconds
+DEFAULT_UPLOAD_LATENCY = 0.0
+
+# Largest throughput drop, as a fraction of the baseline, before --compare reports a regression
+DEFAULT_TOLERANCE = 0.2
+
+# Snowflake-style tweet IDs at the start of the synthetic timeline
+FIRST_TWEET_ID = 1900000000000000000
+START_DATE = datetime(2025, 3, 1, tzinfo=timezone.utc)
+
+WORDS = (
+    "canada tariffs housing carbon tax affordability jobs economy trade workers families plan "
+    "government election vote leader party minister budget deficit health care climate energy "
+    "pipeline immigration rent mortgage grocery prices wages union steel aluminum border security "
+    "defence sovereignty provinces cities rural communities seniors students childcare pharmacare "
+    "dental investment growth productivity innovation housing supply interest rates inflation"
+).split()
+CANDIDATES = ("Mark Carney", "Pierre Poilievre", "Jagmeet Singh")
+
+
+def sentence(rng, min_words=6, max_words=18):
+    words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+    return " ".join(words).capitalize() + rng.choice((".", ".", ".", "!", "?"))
+
+
+def synthetic_author(handle, number):
+    return {
+        "type": "user",
+        "userName": handle,
+        "url": f"https://x.com/{handle}",
+        "id": str(100000 + number),
+        "name": f"Bench User {number:02d}",
+        "isBlueVerified": True,
+        "followers": 1000 * (number + 1),
+    }
+
+
+def synthetic_tweet(rng, tweet_id, created, author, quoted_author):
+    handle = author["userName"]
+    tweet = {
+        "type": "tweet",
+        "id": str(tweet_id),
+        "url": f"https://x.com/{handle}/status/{tweet_id}",
+        "text": " ".join(sentence(rng) for _ in range(rng.randint(1, 3))),
+        "source": "Twitter for iPhone",
+        "retweetCount": rng.randint(0, 500),
+        "replyCount": rng.randint(0, 100),
+        "likeCount": rng.randint(0, 5000),
+        "createdAt": created.strftime("%a %b %d %H:%M:%S %z %Y"),
+        "lang": "en",
+        "author": author,
+    }
+    # Roughly the mix of quotes and retweets in the real timelines
+    kind = rng.random()
+    if kind < 0.1 or kind > 0.8:
+        nested = {
+            "type": "tweet",
+            "id": str(tweet_id - 1000),
+            "url": f"https://x.com/{quoted_author['userName']}/status/{tweet_id - 1000}",
+            "text": sentence(rng),
+            "author": quoted_author,
+        }
+        tweet["quoted_tweet" if kind < 0.1 else "retweeted_tweet"] = nested
+    return tweet
+
+
+def generate_tweet_pages(tweets_dir, count, users=DEFAULT_USERS, page_size=DEFAULT_PAGE_SIZE, seed=DEFAULT_SEED):
+    """
+    Write count synthetic tweets as API pages in the scraper's layout
+    Each page is {"data": {"pin_tweet": ..., "tweets": [...]}, ...} under
+    tweets/<handle>/json/<page>.json, and the user's pinned tweet counts towards count.
+    The pinned tweet is repeated on every page but only counted once.
+    Returns: (number of page files written, number of unique tweets written)
+    """
+    rng = random.Random(seed)
+    authors = [synthetic_author(f"BenchUser{number:02d}", number) for number in range(users)]
+    tweet_id = FIRST_TWEET_ID
+    pages = 0
+    unique_tweets = 0
+    
+    for number, author in enumerate(authors):
+        user_count = count // users + (1 if number < count % users else 0)
+        json_dir = os.path.join(tweets_dir, author["userName"], "json")
+        os.makedirs(json_dir, exist_ok=True)
+        pin_tweet = None
+        written = 0
+        page = 1
+        while written < user_count:
+            tweets = []
+            for _ in range(min(page_size, user_count - written - (pin_tweet is None))):
+                tweet_id += rng.randint(1, 10 ** 6)
+                created = START_DATE + timedelta(seconds=(tweet_id - FIRST_TWEET_ID) // 10 ** 5)
+                tweets.append(synthetic_tweet(rng, tweet_id, created, author, rng.choice(authors)))
+            if pin_tweet is None:
+                tweet_id += 1
+                pin_tweet = synthetic_tweet(rng, tweet_id, START_DATE, author, author)
+                written += 1
+            written += len(tweets)
+            content = {
+                "status": "success",
+                "code": 0,
+                "msg": "success",
+                "data": {"pin_tweet": pin_tweet, "tweets": tweets},
+                "has_next_page": written < user_count,
+                "next_cursor": f"cursor-{page}",
+            }
+            with open(os.path.join(json_dir, f"{page}.json"), 'w', encoding='utf-8') as f:
+                json.dump(content, f)
+            page += 1
+            pages += 1
+        unique_tweets += written
+    
+    return pages, unique_tweets
+
+
+def generate_videos(count, transcript_words=DEFAULT_TRANSCRIPT_WORDS, seed=DEFAULT_SEED):
+    """
+    Yield (metadata, candidate, transcript) for count synthetic videos, in the
+    shape convert_youtube_to_markdown passes to render_video_markdown
+    """
+    rng = random.Random(seed + 1)
+    for number in range(count):
+        candidate = CANDIDATES[number % len(CANDIDATES)]
+        video_id = f"bench{number:06d}"
+        paragraphs = []
+        words = 0
+        while words < transcript_words:
+            paragraph = " ".join(sentence(rng) for _ in range(rng.randint(3, 8)))
+            paragraphs.append(paragraph)
+            words += paragraph.count(" ") + 1
+        metadata = {
+            "id": video_id,
+            "title": f"{candidate} on {' '.join(rng.choices(WORDS, k=4))}",
+            "upload_date": (START_DATE + timedelta(hours=number)).strftime("%Y%m%d"),
+            "webpage_url": f"https://www.youtube.com/watch?v={video_id}",
+            "description": sentence(rng),
+        }
+        yield metadata, candidate, "\n\n".join(paragraphs)
+
+
+class FakeUploadClient(UploadClient):
+    """Upload client that reads each file and returns a made-up file ID after `latency` seconds"""
+    
+    def __init__(self, latency=DEFAULT_UPLOAD_LATENCY):
+        self.latency = latency
+    
+    def upload(self, file_path, purpose):
+        with open(file_path, 'rb') as f:
+            size = len(f.read())
+        if self.latency:
+            time.sleep(self.latency)
+        return f"file-bench-{size}-{os.path.basename(file_path)}"
+
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS counter, so the next reading covers one stage (Linux only)"""
+    try:
+        with open("/proc/self/clear_refs", 'w') as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Peak resident set size in MB, since the last reset where the platform supports it"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class StageTimer:
+    """Collects per-item latencies, total time and peak memory for one stage"""
+    
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.latencies = []
+        self.start = None
+        self.seconds = 0.0
+        self.rss_reset = False
+    
+    def __enter__(self):
+        self.rss_reset = reset_peak_rss()
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self.start
+    
+    @contextlib.contextmanager
+    def measure(self, items=1):
+        """Time one operation covering `items` items"""
+        start = time.perf_counter()
+        yield
+        self.latencies.append(time.perf_counter() - start)
+        self.items += items
+    
+    def result(self):
+        latencies = np.asarray(self.latencies) * 1000
+        return {
+            "unit": self.unit,
+            "items": self.items,
+            "operations": len(self.latencies),
+            "seconds": round(self.seconds, 4),
+            "throughput": round(self.items / self.seconds, 2) if self.seconds else 0.0,
+            "p50_ms": round(float(np.percentile(latencies, 50)), 4) if len(latencies) else None,
+            "p99_ms": round(float(np.percentile(latencies, 99)), 4) if len(latencies) else None,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "peak_rss_scope": "stage" if self.rss_reset else "process",
+        }
+
+
+def bench_convert(data_dir, tweets):
+    """
+    Convert every generated tweet page with process_json_file; latency is per page
+    Throughput counts the tweets generated, not the per-page conversion counts,
+    which include the pinned tweet once for every page it is repeated on.
+    """
+    from convert_tweets_to_markdown import find_json_files, process_json_file
+    tweets_dir = os.path.join(data_dir, "tweets")
+    with StageTimer("convert", "tweets") as timer:
+        for json_file in find_json_files(tweets_dir):
+            start = time.perf_counter()
+            process_json_file(json_file, tweets_dir)
+            timer.latencies.append(time.perf_counter() - start)
+        timer.items = tweets
+    return timer
+
+
+def bench_render(data_dir, videos, transcript_words, seed):
+    """Render and write each synthetic video with render_video_markdown; latency is per video"""
+    from convert_youtube_to_markdown import render_video_markdown, sanitize_filename
+    youtube_dir = os.path.join(data_dir, "youtube")
+    with StageTimer("render", "videos") as timer:
+        for metadata, candidate, transcript in generate_videos(videos, transcript_words, seed):
+            with timer.measure():
+                markdown = render_video_markdown(metadata, candidate, transcript)
+                channel_dir = os.path.join(youtube_dir, sanitize_filename(candidate))
+                os.makedirs(channel_dir, exist_ok=True)
+                with open(os.path.join(channel_dir, f"{metadata['id']}.md"), 'w', encoding='utf-8') as f:
+                    f.write(markdown)
+    return timer
+
+
+def bench_chunk(data_dir):
+    """Chunk every corpus document with chunk_markdown; latency is per document"""
+    with StageTimer("chunk", "documents") as timer:
+        for file_path in find_corpus_files(data_dir):
+            with timer.measure():
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    chunk_markdown(f.read())
+    return timer
+
+
+def bench_embed(data_dir, cache_dir, model_name, workers, batch_size):
+    """Embed every chunk into a fresh cache through the EmbeddingRunner; latency is per block"""
+    from embedding_cache import EmbeddingCache, chunk_key
+    from embedding_index import iter_chunks
+    from embedding_runner import EmbeddingRunner
+    cache = EmbeddingCache(cache_dir, model_name)
+    runner = EmbeddingRunner(model_name, workers=workers, batch_size=batch_size)
+    items = ((chunk_key(chunk.text, model_name), chunk.text) for _, _, chunk in iter_chunks(data_dir))
+    with StageTimer("embed", "chunks") as timer:
+        blocks = runner.encode_stream(items)
+        while True:
+            start = time.perf_counter()
+            block = next(blocks, None)
+            if block is None:
+                break
+            keys, vectors = block
+            cache.add(keys, vectors)
+            timer.latencies.append(time.perf_counter() - start)
+            timer.items += len(keys)
+    runner.close()
+    return timer
+
+
+def bench_index(data_dir, index_dir, cache_dir, model_name, index_type):
+    """Build the search index from the cache filled by the embed stage (a single operation)"""
+    from embedding_index import build_index
+    with StageTimer("index", "chunks") as timer:
+        start = time.perf_counter()
+        chunks = build_index(data_dir, index_dir, model_name, cache_dir, full_rebuild=True,
+                             index_params={"type": index_type})
+        timer.latencies.append(time.perf_counter() - start)
+        timer.items = chunks
+    return timer
+
+
+def bench_upload(data_dir, workers, latency):
+    """Upload every corpus document to a fake client through the Uploader; latency is per file"""
+    uploader = Uploader(FakeUploadClient(latency), workers=workers, requests_per_second=0)
+    file_paths = find_corpus_files(data_dir)
+    
+    def upload(file_path):
+        start = time.perf_counter()
+        file_id = uploader.upload_one(file_path, "assistants")
+        return time.perf_counter() - start, file_id
+    
+    with StageTimer("upload", "files") as timer:
+        with ThreadPoolExecutor(max_workers=uploader.workers) as executor:
+            for seconds, file_id in executor.map(upload, file_paths):
+                timer.latencies.append(seconds)
+                timer.items += 1 if file_id else 0
+    return timer
+
+
+def run_stage(name, function, *args, verbose=False):
+    """
+    Run one benchmark stage, keeping the per-file progress prints of the
+    code under test out of the output unless verbose
+    Returns: the stage result dict, or {"skipped": reason} if a dependency is missing
+    """
+    print(f"Running {name}...")
+    try:
+        with contextlib.ExitStack() as stack:
+            if not verbose:
+                stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+            timer = function(*args)
+    except ImportError as e:
+        print(f"  Skipped: {e}")
+        return {"skipped": str(e)}
+    result = timer.result()
+    print(f"  {result['items']} {result['unit']} in {result['seconds']:.2f}s "
+          f"({result['throughput']:.1f}/s, p50 {result['p50_ms']}ms, p99 {result['p99_ms']}ms, "
+          f"peak RSS {result['peak_rss_mb']}MB)")
+    return result
+
+
+def run_benchmark(args):
+    """
+    Generate the synthetic corpus in a scratch directory and run the selected stages over it
+    Stages run in pipeline order, so each one sees the output of the previous ones
+    Returns: the results dict written to the output file
+    """
+    videos = int(round(args.documents * args.video_share))
+    tweets = args.documents - videos
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="benchmark-")
+    data_dir = os.path.join(work_dir, "data")
+    cache_dir = os.path.join(work_dir, "embedding_cache")
+    index_dir = os.path.join(work_dir, "index")
+    stages = set(args.stages)
+    # Later stages read what earlier ones wrote, and the index is built from the vectors the embed stage caches
+    needed = stages | {"convert", "render"} | ({"embed"} if "index" in stages else set())
+    
+    print(f"Generating {tweets} tweets and {videos} videos in {work_dir}...")
+    start = time.perf_counter()
+    pages, unique_tweets = generate_tweet_pages(os.path.join(data_dir, "tweets"), tweets, args.users, args.page_size,
+                                                args.seed)
+    print(f"Generated {pages} tweet pages ({unique_tweets} tweets) in {time.perf_counter() - start:.1f}s")
+    
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "documents": args.documents,
+            "tweets": tweets,
+            "videos": videos,
+            "tweet_pages": pages,
+            "users": args.users,
+            "page_size": args.page_size,
+            "transcript_words": args.transcript_words,
+            "seed": args.seed,
+            "model": args.model,
+            "index_type": args.index_type,
+            "upload_workers": args.upload_workers,
+            "upload_latency": args.upload_latency,
+        },
+        "system": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "stages": {},
+    }
+    
+    plan = [
+        ("convert", bench_convert, (data_dir, unique_tweets)),
+        ("render", bench_render, (data_dir, videos, args.transcript_words, args.seed)),
+        ("chunk", bench_chunk, (data_dir,)),
+        ("embed", bench_embed, (data_dir, cache_dir, args.model, args.embed_workers, args.batch_size)),
+        ("index", bench_index, (data_dir, index_dir, cache_dir, args.model, args.index_type)),
+        ("upload", bench_upload, (data_dir, args.upload_workers, args.upload_latency)),
+    ]
+    try:
+        for name, function, stage_args in plan:
+            if name in needed:
+                result = run_stage(name, function, *stage_args, verbose=args.verbose)
+                if name in stages:
+                    results["stages"][name] = result
+    finally:
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    return results
+
+
+def compare_results(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare stage throughput against a baseline run
+    Returns: list of (stage, baseline throughput, new throughput) for stages that slowed down by more than tolerance
+    """
+    regressions = []
+    for name, result in results["stages"].items():
+        previous = baseline.get("stages", {}).get(name, {})
+        if "throughput" not in result or not previous.get("throughput"):
+            continue
+        if result["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append((name, previous["throughput"], result["throughput"]))
+    return regressions
+
+
+def parse_stages(value):
+    stages = [stage.strip() for stage in value.split(",") if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown stages: {', '.join(unknown)} (choose from {', '.join(STAGES)})")
+    return stages
+
+
+def main():
+    """Run the pipeline benchmark and save the results as JSON"""
+    parser = argparse.ArgumentParser(description='Benchmark the ingestion pipeline on a synthetic corpus')
+    parser.add_argument('--documents', type=int, help='Number of documents to generate', default=DEFAULT_DOCUMENTS)
+    parser.add_argument('--video-share', type=float, help='Fraction of documents that are videos',
+                        default=DEFAULT_VIDEO_SHARE)
+    parser.add_argument('--users', type=int, help='Number of synthetic Twitter users', default=DEFAULT_USERS)
+    parser.add_argument('--page-size', type=int, help='Tweets per JSON page', default=DEFAULT_PAGE_SIZE)
+    parser.add_argument('--transcript-words', type=int, help='Approximate words per video transcript',
+                        default=DEFAULT_TRANSCRIPT_WORDS)
+    parser.add_argument('--seed', type=int, help='Random seed for the generator', default=DEFAULT_SEED)
+    parser.add_argument('--stages', type=parse_stages, help=f'Comma-separated stages to run ({",".join(STAGES)})',
+                        default=list(STAGES))
+    parser.add_argument('--model', type=str, help='Sentence-transformers model to embed with', default=DEFAULT_MODEL)
+    parser.add_argument('--embed-workers', type=int, help='Embedding worker processes', default=1)
+    parser.add_argument('--batch-size', type=int, help='Chunks per embedding batch', default=64)
+    parser.add_argument('--index-type', type=str, help='Index type to build', default="flat")
+    parser.add_argument('--upload-workers', type=int, help='Concurrent uploads to the fake client', default=4)
+    parser.add_argument('--upload-latency', type=float, help='Simulated seconds per upload',
+                        default=DEFAULT_UPLOAD_LATENCY)
+    parser.add_argument('--work-dir', type=str, help='Directory for the generated corpus (kept afterwards)')
+    parser.add_argument('--keep', action='store_true', help='Keep the temporary corpus directory')
+    parser.add_argument('--output', type=str, help='Results file (default: data/benchmarks/<timestamp>.json)')
+    parser.add_argument('--compare', type=str, help='Baseline results file to check for regressions')
+    parser.add_argument('--tolerance', type=float, help='Allowed throughput drop against the baseline',
+                        default=DEFAULT_TOLERANCE)
+    parser.add_argument('--verbose', action='store_true', help='Show the output of the code under test')
+    args = parser.parse_args()
+    
+    results = run_benchmark(args)
+    
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"benchmark_{args.documents}_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved results to {output}")
+    
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("config", {}).get("documents") != args.documents:
+            print(f"Warning: {args.compare} was run with {baseline.get('config', {}).get('documents')} documents")
+        regressions = compare_results(results, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print(f"Regression in {name}: {after:.1f}/s vs {before:.1f}/s in {args.compare}")
+        if regressions:
+            sys.exit(1)
+        print(f"No stage slowed down by more than {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+import re
+from collections import namedtuple
+
+
+# Token budget per chunk when tokens are whitespace-separated words. all-MiniLM-L6-v2
+# truncates input at 256 word pieces and English text averages about 1.3-1.4 word pieces
+# per word, so 180 words leaves room for the model's [CLS]/[SEP] tokens and wordier text
+DEFAULT_MAX_TOKENS = 180
+DEFAULT_OVERLAP = 32
+
+# A window may end early at a sentence boundary found in its last quarter
+SENTENCE_SEARCH_FRACTION = 0.25
+
+TOKEN_PATTERN = re.compile(r"\S+")
+HEADING_PATTERN = re.compile(r"^#{1,6}[ \t]+(.*)$", re.MULTILINE)
+FRONT_MATTER_PATTERN = re.compile(r"\A---\n(.*?)\n---[ \t]*(?:\n|\Z)", re.DOTALL)
+SENTENCE_END_CHARS = ".!?"
+
+# A chunk is a slice of the source document, with the heading of the section it starts in
+Chunk = namedtuple("Chunk", ["text", "heading", "start", "end"])
+
+
+def parse_front_matter(text):
+    """
+    Parse simple `key: value` YAML front matter at the top of a markdown document
+    Returns: (dict of fields, offset where the body starts)
+    """
+    match = FRONT_MATTER_PATTERN.match(text)
+    if not match:
+        return {}, 0
+    
+    fields = {}
+    for line in match.group(1).splitlines():
+        key, separator, value = line.partition(":")
+        if not separator:
+            continue
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] == '"':
+            value = value[1:-1].replace('\\"', '"')
+        fields[key.strip()] = value
+    return fields, match.end()
+
+
+def whitespace_token_offsets(text, start=0, end=None):
+    """
+    Offsets of whitespace-separated tokens in text[start:end]
+    Returns: (list of token start offsets, list of token end offsets)
+    """
+    starts = []
+    ends = []
+    for match in TOKEN_PATTERN.finditer(text, start, len(text) if end is None else end):
+        starts.append(match.start())
+        ends.append(match.end())
+    return starts, ends
+
+
+def tokenizer_token_offsets(tokenizer):
+    """
+    Build a token_offsets function from a Hugging Face fast tokenizer (e.g.
+    SentenceTransformer(...).tokenizer), so chunk sizes are counted in the
+    embedding model's own tokens
+    """
+    def token_offsets(text, start=0, end=None):
+        end = len(text) if end is None else end
+        encoding = tokenizer(text[start:end], return_offsets_mapping=True, add_special_tokens=False)
+        starts = []
+        ends = []
+        for token_start, token_end in encoding["offset_mapping"]:
+            if token_end > token_start:
+                starts.append(start + token_start)
+                ends.append(start + token_end)
+        return starts, ends
+    
+    return token_offsets
+
+
+def split_sections(text, body_start=0):
+    """
+    Split a markdown body at its headings
+    Returns: list of (heading text, start offset, end offset); text before the first heading has heading ""
+    """
+    sections = []
+    heading = ""
+    section_start = body_start
+    for match in HEADING_PATTERN.finditer(text, body_start):
+        if match.start() > section_start:
+            sections.append((heading, section_start, match.start()))
+        heading = match.group(1).strip()
+        section_start = match.start()
+    if section_start < len(text):
+        sections.append((heading, section_start, len(text)))
+    return sections
+
+
+def window_end(text, ends, first, last):
+    """
+    Pick where a window starting at token `first` should end, at most at token `last` (exclusive)
+    Prefers the last sentence end in the final quarter of the window
+    """
+    earliest = first + max(1, int((last - first) * (1 - SENTENCE_SEARCH_FRACTION)))
+    for position in range(last - 1, earliest - 1, -1):
+        if text[ends[position] - 1] in SENTENCE_END_CHARS:
+            return position + 1
+    return last
+
+
+def chunk_markdown(text, max_tokens=DEFAULT_MAX_TOKENS, overlap=DEFAULT_OVERLAP,
+                   token_offsets=whitespace_token_offsets):
+    """
+    Split a markdown document into chunks of at most max_tokens tokens
+    Front matter is left out of the chunks. Consecutive sections are packed
+    together while they fit; larger sections are split into windows that overlap
+    by `overlap` tokens and end at sentence boundaries where possible. Chunk
+    text is a single slice of the document, so no text is rebuilt by joining.
+    Returns: (front matter dict, list of Chunk)
+    """
+    front_matter, body_start = parse_front_matter(text)
+    step_back = max(0, min(overlap, max_tokens - 1))
+    chunks = []
+    
+    # Sections not yet emitted, packed while their token counts fit in one chunk
+    packed_heading = None
+    packed_start = packed_end = 0
+    packed_tokens = 0
+    
+    def emit_packed():
+        if packed_tokens:
+            chunks.append(Chunk(text[packed_start:packed_end], packed_heading, packed_start, packed_end))
+    
+    for heading, start, end in split_sections(text, body_start):
+        starts, ends = token_offsets(text, start, end)
+        count = len(starts)
+        if not count:
+            continue
+        
+        if packed_tokens and packed_tokens + count <= max_tokens:
+            packed_end = ends[-1]
+            packed_tokens += count
+            continue
+        
+        emit_packed()
+        packed_tokens = 0
+        
+        if count <= max_tokens:
+            packed_heading, packed_start, packed_end, packed_tokens = heading, starts[0], ends[-1], count
+            continue
+        
+        # Section is too large for one chunk: slide a window over its tokens
+        first = 0
+        while True:
+            last = window_end(text, ends, first, min(first + max_tokens, count)) if first + max_tokens < count else count
+            chunks.append(Chunk(text[starts[first]:ends[last - 1]], heading, starts[first], ends[last - 1]))
+            if last >= count:
+                break
+            first = max(first + 1, last - step_back)
+    
+    emit_packed()
+    return front_matter, chunks
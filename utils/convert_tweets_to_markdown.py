@@ -2,12 +2,24 @@
 import json
 import os
 import glob
+import argparse
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 import re
 import sys
+import time
 
-print("Script starting...")
-print(f"Python version: {sys.version}")
+from metrics import METRICS, add_metrics_arguments, configure_metrics, finish_metrics
+
+# Manifest of rendered markdown hashes, stored at the root of the tweets directory
+MANIFEST_FILENAME = "conversion_manifest.json"
+
+# Characters read per chunk when streaming a JSON page
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Rendered tweets held in memory before they are written out
+WRITE_BATCH_SIZE = 200
 
 def sanitize_filename(filename):
     """Remove characters that are invalid in filenames."""
@@ -90,85 +102,526 @@ def convert_tweet_to_markdown(tweet, username):
     
     return markdown, tweet_id
 
-def process_json_file(json_file_path, output_dir):
-    """Process a single JSON file containing tweets."""
-    try:
-        # Get username from directory path (two levels up from json file)
-        username = os.path.basename(os.path.dirname(os.path.dirname(json_file_path)))
-        
-        # Create output directory for this user's markdown
-        user_output_dir = os.path.join(output_dir, username, "markdown")
-        os.makedirs(user_output_dir, exist_ok=True)
-        
-        # Read and parse JSON
-        with open(json_file_path, 'r', encoding='utf-8') as f:
+class JSONStream:
+    """
+    Incremental reader over a JSON text file.
+    Only the value currently being decoded is held in memory, so arbitrarily
+    large files can be walked with a constant-size buffer.
+    """
+    
+    _whitespace = re.compile(r'[ \t\n\r]*')
+    _decoder = json.JSONDecoder()
+    
+    def __init__(self, f, chunk_size=STREAM_CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+    
+    def _fill(self, size=None):
+        """Drop the consumed part of the buffer and read another chunk (of `size` characters if given)."""
+        if self.pos:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        chunk = self.f.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer += chunk
+        return True
+    
+    def error(self, message):
+        return json.JSONDecodeError(message, self.buffer, self.pos)
+    
+    def peek(self):
+        """Skip whitespace and return the next character, or "" at end of file."""
+        while True:
+            self.pos = self._whitespace.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+    
+    def expect(self, char):
+        if self.peek() != char:
+            raise self.error(f"Expecting '{char}'")
+        self.pos += 1
+    
+    def next_item(self, close_char):
+        """After a container element: consume the ',' separator, or the closing bracket."""
+        if self.peek() == ",":
+            self.pos += 1
+            return True
+        self.expect(close_char)
+        return False
+    
+    def value(self):
+        """
+        Decode the next complete JSON value.
+        Each retry reads at least as much as is already buffered, so a value
+        spanning many chunks is re-decoded a logarithmic number of times and
+        the total work stays linear in its size.
+        """
+        self.peek()
+        while True:
             try:
-                tweet_data = json.load(f)
+                obj, end = self._decoder.raw_decode(self.buffer, self.pos)
             except json.JSONDecodeError:
-                print(f"Error parsing JSON in {json_file_path}")
-                return 0
-        
-        # Check if the expected structure is present
-        if not isinstance(tweet_data, dict):
-            print(f"Unexpected format in {json_file_path}")
-            return 0
-        
-        # Get the tweets list
-        tweets = []
-        data = tweet_data.get('data', {})
-        
-        # Add pin_tweet if it exists and is not None
-        pin_tweet = data.get('pin_tweet')
-        if pin_tweet and isinstance(pin_tweet, dict):
-            tweets.append(pin_tweet)
-        
-        # Add regular tweets
-        tweets_list = data.get('tweets', [])
-        if isinstance(tweets_list, list):
-            tweets.extend(tweets_list)
+                # Most likely the value continues in the next chunk
+                if self._fill(max(self.chunk_size, len(self.buffer) - self.pos)):
+                    continue
+                raise
+            # A number ending exactly at the buffer edge may be truncated
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return obj
+    
+    def members(self):
+        """Iterate over the keys of an object, leaving each value to be read by the caller."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if not self.next_item("}"):
+                return
+    
+    def elements(self):
+        """Iterate over an array, leaving each element to be read by the caller."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            if not self.next_item("]"):
+                return
+
+def _iter_page_tweets(stream, include_pin=True):
+    """Yield the pinned tweet (unless include_pin is false) and regular tweets of one API page object."""
+    for key in stream.members():
+        if key != "data" or stream.peek() != "{":
+            stream.value()
+            continue
+        for data_key in stream.members():
+            if data_key == "pin_tweet":
+                pin_tweet = stream.value()
+                if include_pin and pin_tweet and isinstance(pin_tweet, dict):
+                    yield pin_tweet
+            elif data_key == "tweets" and stream.peek() == "[":
+                for _ in stream.elements():
+                    yield stream.value()
+            else:
+                stream.value()
+
+def iter_tweets(json_file_path, chunk_size=STREAM_CHUNK_SIZE, include_pin=True):
+    """
+    Stream tweets out of a JSON page file one at a time.
+    Accepts a single API page, an array of pages, or several pages concatenated
+    into one archive. With include_pin false, pinned tweets are skipped.
+    Raises json.JSONDecodeError on malformed JSON and
+    ValueError if the file does not contain page objects.
+    """
+    with open(json_file_path, 'r', encoding='utf-8') as f:
+        stream = JSONStream(f, chunk_size)
+        char = stream.peek()
+        if char not in ("{", "["):
+            raise ValueError("expected a page object or an array of pages")
         
-        tweets_processed = 0
+        while char:
+            if char == "{":
+                yield from _iter_page_tweets(stream, include_pin)
+            elif char == "[":
+                for _ in stream.elements():
+                    if stream.peek() == "{":
+                        yield from _iter_page_tweets(stream, include_pin)
+                    else:
+                        stream.value()
+            else:
+                raise stream.error("Expecting a page object")
+            char = stream.peek()
+
+def hash_markdown(markdown_content):
+    """Return the content hash recorded in the conversion manifest."""
+    return hashlib.sha256(markdown_content.encode('utf-8')).hexdigest()
+
+def load_manifest(manifest_path):
+    """
+    Load the conversion manifest
+    Returns: dict keyed by "<username>/<tweet_id>" with the source page and markdown hash
+    """
+    if not os.path.exists(manifest_path):
+        return {}
+    
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error reading manifest {manifest_path}, converting everything: {e}")
+        return {}
+    
+    return manifest if isinstance(manifest, dict) else {}
+
+def save_manifest(manifest_path, manifest):
+    """Write the conversion manifest atomically."""
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def write_markdown_batch(user_output_dir, rendered, known_hashes=None, force=False):
+    """
+    Write a batch of (tweet_id, markdown, hash) entries into a user's markdown directory.
+    Files whose hash matches known_hashes (or the existing file) are left untouched,
+    unless force is set. Each file is written to a temporary name and renamed into
+    place, so workers converting pages that share a tweet (e.g. the pinned tweet)
+    never interleave their writes.
+    Returns: (written, rewritten, unchanged) counts
+    """
+    known_hashes = known_hashes or {}
+    written = rewritten = unchanged = 0
+    
+    os.makedirs(user_output_dir, exist_ok=True)
+    for tweet_id, markdown_content, content_hash in rendered:
+        output_file = os.path.join(user_output_dir, f"{tweet_id}.md")
+        previous_hash = known_hashes.get(tweet_id)
+        exists = os.path.exists(output_file)
         
-        # Process each tweet
-        for tweet in tweets:
-            if not isinstance(tweet, dict):
-                continue
-            
-            # Convert to markdown
-            markdown_content, tweet_id = convert_tweet_to_markdown(tweet, username)
+        if not force:
+            if previous_hash is None and exists:
+                # Not in the manifest yet (first run): compare against the file on disk
+                with open(output_file, 'r', encoding='utf-8') as f:
+                    previous_hash = hash_markdown(f.read())
             
-            # Write to file
-            output_file = os.path.join(user_output_dir, f"{tweet_id}.md")
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(markdown_content)
-            
-            tweets_processed += 1
+            if previous_hash == content_hash and exists:
+                unchanged += 1
+                continue
+        
+        tmp_path = f"{output_file}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(markdown_content)
+        os.replace(tmp_path, output_file)
         
-        return tweets_processed
+        if exists:
+            rewritten += 1
+        else:
+            written += 1
+    
+    return written, rewritten, unchanged
+
+def convert_json_file(json_file_path, output_dir, known_hashes=None, force=False, include_pin=True):
+    """
+    Convert a single JSON page (or merged archive of pages), streaming its tweets
+    and skipping those whose rendered markdown is unchanged (unless force is set).
+    known_hashes maps tweet IDs of this page's user to their previous markdown hash.
+    include_pin=False skips the pinned tweet, which every page of a user repeats.
+    Returns: dict with the username, manifest entries, write counts and seconds
+    spent parsing, rendering and writing the page
+    """
+    # Get username from directory path (two levels up from json file)
+    username = os.path.basename(os.path.dirname(os.path.dirname(json_file_path)))
+    result = {
+        "username": username,
+        "entries": {},
+        "written": 0,
+        "rewritten": 0,
+        "unchanged": 0,
+        "error": False,
+        "seconds": {"parse": 0.0, "render": 0.0, "write": 0.0}
+    }
+    seconds = result["seconds"]
     
+    user_output_dir = os.path.join(output_dir, username, "markdown")
+    rendered = []
+    
+    def flush():
+        start = time.perf_counter()
+        written, rewritten, unchanged = write_markdown_batch(user_output_dir, rendered, known_hashes, force)
+        seconds["write"] += time.perf_counter() - start
+        result["written"] += written
+        result["rewritten"] += rewritten
+        result["unchanged"] += unchanged
+        rendered.clear()
+    
+    try:
+        # Render tweets as they are read and write them out in batches;
+        # time spent inside the tweet iterator counts as parsing
+        clock = time.perf_counter()
+        for tweet in iter_tweets(json_file_path, include_pin=include_pin):
+            start = time.perf_counter()
+            seconds["parse"] += start - clock
+            if isinstance(tweet, dict):
+                markdown_content, tweet_id = convert_tweet_to_markdown(tweet, username)
+                content_hash = hash_markdown(markdown_content)
+                rendered.append((tweet_id, markdown_content, content_hash))
+                result["entries"][tweet_id] = content_hash
+                seconds["render"] += time.perf_counter() - start
+                if len(rendered) >= WRITE_BATCH_SIZE:
+                    flush()
+            clock = time.perf_counter()
+        flush()
+    
+    except json.JSONDecodeError:
+        print(f"Error parsing JSON in {json_file_path}")
+        result["error"] = True
+    except ValueError:
+        print(f"Unexpected format in {json_file_path}")
+        result["error"] = True
     except Exception as e:
         print(f"Error processing {json_file_path}: {e}")
-        return 0
+        result["error"] = True
+    
+    if result["error"] and rendered:
+        # Keep the tweets that were read before the error
+        try:
+            flush()
+        except Exception as e:
+            print(f"Error writing markdown for {json_file_path}: {e}")
+    
+    return result
+
+def process_json_file(json_file_path, output_dir):
+    """Process a single JSON file containing tweets."""
+    result = convert_json_file(json_file_path, output_dir)
+    return len(result["entries"])
+
+def find_json_files(tweets_dir):
+    """Find all JSON page files in the tweets/*/json subdirectories."""
+    json_files = []
+    for user_dir in sorted(os.listdir(tweets_dir)):
+        user_json_dir = os.path.join(tweets_dir, user_dir, "json")
+        if os.path.isdir(user_json_dir):
+            for file in sorted(os.listdir(user_json_dir)):
+                if file.endswith('.json'):
+                    json_files.append(os.path.join(user_json_dir, file))
+    return json_files
+
+def page_order(json_file):
+    """Sort key of a page file: its page number, then its name for files that are not numbered"""
+    stem = os.path.splitext(os.path.basename(json_file))[0]
+    return (int(stem), stem) if stem.isdigit() else (-1, stem)
+
+def remove_stale_markdown(output_dir, stale_keys):
+    """Delete markdown files for manifest entries that no page produces anymore."""
+    removed = 0
+    for key in stale_keys:
+        username, tweet_id = key.split("/", 1)
+        output_file = os.path.join(output_dir, username, "markdown", f"{tweet_id}.md")
+        if os.path.exists(output_file):
+            os.remove(output_file)
+            removed += 1
+    return removed
+
+def record_page_metrics(result):
+    """Record a converted page's stage timings and tweet counts"""
+    for stage, seconds in result["seconds"].items():
+        METRICS.observe("stage_seconds", seconds, stage=stage)
+    METRICS.count("items_total", len(result["entries"]), stage="render", outcome="rendered")
+    for outcome in ("written", "rewritten", "unchanged"):
+        METRICS.count("items_total", result[outcome], stage="write", outcome=outcome)
+    if result["error"]:
+        METRICS.count("items_total", stage="parse", outcome="error")
+
+def process_json_files(json_files, output_dir, workers=1, manifest=None, force=False):
+    """
+    Convert a list of JSON page files, one page per task.
+    With workers > 1 the pages are spread over a process pool.
+    When a manifest is given, only new or changed markdown is written, tweets
+    that disappeared from every page are removed, and the manifest is updated in place.
+    With force, every markdown file is rewritten.
+    The pinned tweet is only converted from each user's most recently scraped
+    page, so it is written and counted once however many pages repeat it.
+    Returns: dict with tweets, written, rewritten, unchanged, removed and errors counts
+    """
+    total_files = len(json_files)
+    summary = {"tweets": 0, "written": 0, "rewritten": 0, "unchanged": 0, "removed": 0, "errors": 0}
+    new_manifest = {}
+    
+    # Previous hashes grouped per user, so each page only receives its own user's entries
+    known_by_user = {}
+    for key, entry in (manifest or {}).items():
+        username, tweet_id = key.split("/", 1)
+        known_by_user.setdefault(username, {})[tweet_id] = entry.get("hash")
+    
+    def merge(json_file, result):
+        record_page_metrics(result)
+        summary["written"] += result["written"]
+        summary["rewritten"] += result["rewritten"]
+        summary["unchanged"] += result["unchanged"]
+        if result["error"]:
+            summary["errors"] += 1
+        source = os.path.relpath(json_file, output_dir)
+        for tweet_id, content_hash in result["entries"].items():
+            new_manifest[f"{result['username']}/{tweet_id}"] = {"source": source, "hash": content_hash}
+    
+    def username_of(json_file):
+        return os.path.basename(os.path.dirname(os.path.dirname(json_file)))
+    
+    # Pages are numbered in scrape order, so the highest number holds the current pin
+    pin_pages = {}
+    for json_file in json_files:
+        username = username_of(json_file)
+        if username not in pin_pages or page_order(json_file) > page_order(pin_pages[username]):
+            pin_pages[username] = json_file
+    
+    def convert_args(json_file):
+        username = username_of(json_file)
+        return json_file, output_dir, known_by_user.get(username), force, pin_pages[username] == json_file
+    
+    if workers <= 1:
+        for i, json_file in enumerate(json_files):
+            METRICS.progress(f"Processing file {i+1}/{total_files}: {json_file}")
+            result = convert_json_file(*convert_args(json_file))
+            merge(json_file, result)
+            METRICS.progress(f"  Converted {len(result['entries'])} tweets to markdown "
+                             f"({result['written'] + result['rewritten']} written, {result['unchanged']} unchanged)")
+    else:
+        print(f"Converting with {workers} worker processes...")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(convert_json_file, *convert_args(json_file)): json_file
+                for json_file in json_files
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                json_file = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Error processing {json_file}: {e}")
+                    summary["errors"] += 1
+                    continue
+                merge(json_file, result)
+                METRICS.progress(f"[{done}/{total_files}] {json_file}: {len(result['entries'])} tweets")
+    
+    # Tweets repeated on several pages (e.g. where a refresh overlaps known tweets) count once
+    summary["tweets"] = len(new_manifest)
+    
+    if manifest is not None:
+        update_manifest(manifest, new_manifest, summary, output_dir)
+    
+    return summary
+
+def update_manifest(manifest, new_manifest, summary, output_dir):
+    """Replace the manifest's entries, removing markdown for tweets that are no longer in any source"""
+    stale_keys = set(manifest) - set(new_manifest)
+    if summary["errors"]:
+        # A page that failed to parse would make all of its tweets look stale
+        print(f"Skipping removal of {len(stale_keys)} stale files because some pages failed")
+        for key in stale_keys:
+            new_manifest[key] = manifest[key]
+    else:
+        summary["removed"] = remove_stale_markdown(output_dir, stale_keys)
+    manifest.clear()
+    manifest.update(new_manifest)
+
+def write_archive_batch(user_output_dir, rendered, known_hashes, summary, force=False):
+    """Write a batch of rendered archive tweets, adding the write counts to summary"""
+    with METRICS.timer("write"):
+        counts = write_markdown_batch(user_output_dir, rendered, known_hashes, force)
+    for name, count in zip(("written", "rewritten", "unchanged"), counts):
+        summary[name] += count
+        METRICS.count("items_total", count, stage="write", outcome=name)
+    METRICS.count("items_total", len(rendered), stage="render", outcome="rendered")
+    rendered.clear()
+
+def process_archive(archive_dir, output_dir, manifest=None, force=False):
+    """
+    Convert the tweets of a compacted archive (see tweet_archive.py) instead of the JSON pages.
+    Manifest handling is the same as for process_json_files.
+    Returns: dict with tweets, written, rewritten, unchanged, removed and errors counts
+    """
+    # numpy is only needed for the archive, so it is imported here
+    from tweet_archive import TweetArchive
+    
+    archive = TweetArchive(archive_dir)
+    summary = {"tweets": 0, "written": 0, "rewritten": 0, "unchanged": 0, "removed": 0, "errors": 0}
+    new_manifest = {}
+    source = os.path.relpath(archive_dir, output_dir)
+    
+    known_by_user = {}
+    for key, entry in (manifest or {}).items():
+        username, tweet_id = key.split("/", 1)
+        known_by_user.setdefault(username, {})[tweet_id] = entry.get("hash")
+    
+    for username in archive.users:
+        user_output_dir = os.path.join(output_dir, username, "markdown")
+        known_hashes = known_by_user.get(username)
+        rendered = []
+        for _, tweet in archive.iter_tweets(username):
+            markdown_content, tweet_id = convert_tweet_to_markdown(tweet, username)
+            content_hash = hash_markdown(markdown_content)
+            rendered.append((tweet_id, markdown_content, content_hash))
+            new_manifest[f"{username}/{tweet_id}"] = {"source": source, "hash": content_hash}
+            summary["tweets"] += 1
+            if len(rendered) >= WRITE_BATCH_SIZE:
+                write_archive_batch(user_output_dir, rendered, known_hashes, summary, force)
+        write_archive_batch(user_output_dir, rendered, known_hashes, summary, force)
+        METRICS.progress(f"Converted {archive.users[username]['end'] - archive.users[username]['start']} archived tweets "
+                         f"for {username}")
+    
+    if manifest is not None:
+        update_manifest(manifest, new_manifest, summary, output_dir)
+    
+    return summary
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Convert tweet JSON pages to markdown')
+    parser.add_argument('--tweets-dir', default='tweets',
+                      help='Directory containing the <username>/json page folders')
+    parser.add_argument('--workers', type=int, default=1,
+                      help='Number of worker processes (0 uses every CPU core)')
+    parser.add_argument('--force', action='store_true',
+                      help='Rewrite every markdown file and rebuild the conversion manifest')
+    parser.add_argument('--archive', nargs='?', const='', default=None,
+                      help='Read tweets from the compacted archive (default: <tweets-dir>/archive) '
+                           'instead of the JSON pages')
+    add_metrics_arguments(parser)
+    return parser.parse_args()
+
+def print_summary(summary):
+    print(f"\nConversion complete. {summary['tweets']} tweets converted to markdown.")
+    print(f"  - New files: {summary['written']}")
+    print(f"  - Rewritten (content changed): {summary['rewritten']}")
+    print(f"  - Unchanged: {summary['unchanged']}")
+    print(f"  - Removed (no longer in any page): {summary['removed']}")
+    print(f"  - Pages with errors: {summary['errors']}")
 
 def main():
+    args = parse_arguments()
+    configure_metrics(args)
+    
+    print("Script starting...")
+    print(f"Python version: {sys.version}")
+    
     # Define directories
-    tweets_dir = "tweets"
+    tweets_dir = args.tweets_dir
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
     
     print(f"Working directory: {os.getcwd()}")
     print(f"Tweets directory exists: {os.path.exists(tweets_dir)}")
     
+    manifest_path = os.path.join(tweets_dir, MANIFEST_FILENAME)
+    
+    if args.archive is not None:
+        archive_dir = args.archive or os.path.join(tweets_dir, "archive")
+        print(f"Reading tweets from archive {archive_dir}")
+        manifest = load_manifest(manifest_path)
+        summary = process_archive(archive_dir, tweets_dir, manifest, args.force)
+        save_manifest(manifest_path, manifest)
+        print_summary(summary)
+        finish_metrics(args)
+        return
+    
     # Find all JSON files in the json subdirectories
     print("Searching for JSON files...")
     
     try:
-        # Manual recursive search targeting the json subdirectories
-        json_files = []
-        for user_dir in os.listdir(tweets_dir):
-            user_json_dir = os.path.join(tweets_dir, user_dir, "json")
-            if os.path.isdir(user_json_dir):
-                for file in os.listdir(user_json_dir):
-                    if file.endswith('.json'):
-                        json_files.append(os.path.join(user_json_dir, file))
+        json_files = find_json_files(tweets_dir)
     except Exception as e:
         print(f"Error walking directory: {e}")
         return
@@ -180,16 +633,12 @@ def main():
         print("No JSON files found. Check the tweets directory path.")
         return
     
-    total_tweets = 0
-    
-    # Process each file
-    for i, json_file in enumerate(json_files):
-        print(f"Processing file {i+1}/{total_files}: {json_file}")
-        tweets_processed = process_json_file(json_file, tweets_dir)
-        total_tweets += tweets_processed
-        print(f"  Converted {tweets_processed} tweets to markdown")
+    manifest = load_manifest(manifest_path)
     
-    print(f"\nConversion complete. {total_tweets} tweets converted to markdown.")
+    summary = process_json_files(json_files, tweets_dir, workers, manifest, args.force)
+    save_manifest(manifest_path, manifest)
+    print_summary(summary)
+    finish_metrics(args)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
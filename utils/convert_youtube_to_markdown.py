@@ -5,10 +5,16 @@ import json
 import argparse
 import re
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-import langdetect
+from urllib.parse import urlparse
 from youtube_transcript_api import YouTubeTranscriptApi
 
+from language_detection import DEFAULT_CACHE_PATH, LanguageDetector
+from metrics import METRICS, add_metrics_arguments, configure_metrics, finish_metrics
+
 
 # Define supported candidates
 CANDIDATES = ["Mark Carney", "Pierre Poilievre", "Jagmeet Singh"]
@@ -16,23 +22,59 @@ CANDIDATES = ["Mark Carney", "Pierre Poilievre", "Jagmeet Singh"]
 # Set default output directory
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "youtube")
 
+# Shared, seeded language detector backed by the on-disk cache
+LANGUAGE_DETECTOR = LanguageDetector(DEFAULT_CACHE_PATH)
+
+# Channels to list, mapping channel URL to candidate (override with --channels)
+CHANNELS = {
+    "https://www.youtube.com/@PierrePoilievre/videos": "Pierre Poilievre",
+    "https://www.youtube.com/@MarkJCarney": "Mark Carney",
+    "https://www.youtube.com/@jagmeetsingh": "Jagmeet Singh"
+}
+
+# yt-dlp executable, overridable so runs can point at a local build or a fake
+YT_DLP = os.getenv("YT_DLP", "yt-dlp")
+
+# Default request rate per host when fetching metadata and transcripts
+DEFAULT_REQUESTS_PER_SECOND = 4.0
+
+# Endpoint youtube_transcript_api fetches captions from, used to rate limit transcript calls
+TRANSCRIPT_API_URL = "https://www.youtube.com/api/timedtext"
+
+
+class HostRateLimiter:
+    """
+    Spaces out requests to the same host so that at most
+    requests_per_second calls start per second, across all threads.
+    A rate of 0 or less disables limiting.
+    """
+    
+    def __init__(self, requests_per_second=DEFAULT_REQUESTS_PER_SECOND):
+        self.interval = 1.0 / requests_per_second if requests_per_second and requests_per_second > 0 else 0
+        self.next_slot = {}
+        self.lock = threading.Lock()
+    
+    def wait(self, url):
+        """Block until the next request slot for the URL's host."""
+        if not self.interval:
+            return
+        
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        
+        if slot > now:
+            time.sleep(slot - now)
+
 
 def detect_language(text):
     """
     Detect if text is in English or French
     Returns 'en' for English, 'fr' for French
     """
-    # Skip detection for very short texts (less than 5 words)
-    word_count = len(text.split())
-    if word_count < 5:
-        # For very short texts, rely on accents as a stronger signal
-        return 'fr' if re.search(r'[éèêëàâäôöûüçîï]', text, re.IGNORECASE) else 'en'
-    
-    try:
-        return langdetect.detect(text)
-    except:
-        # If language detection fails, check for French accents
-        return 'fr' if re.search(r'[éèêëàâäôöûüçîï]', text, re.IGNORECASE) else 'en'
+    return LANGUAGE_DETECTOR.detect(text)
 
 
 def format_date(date_str):
@@ -66,10 +108,10 @@ def get_video_metadata(youtube_url):
     Fetch metadata for a YouTube video using yt-dlp
     Returns: dict with video metadata or None if failed
     """
-    print(f"Fetching metadata for: {youtube_url}")
+    METRICS.progress(f"Fetching metadata for: {youtube_url}")
     
     try:
-        command = ["yt-dlp", "--dump-json", "--skip-download", youtube_url]
+        command = [YT_DLP, "--dump-json", "--skip-download", youtube_url]
         result = subprocess.run(command, capture_output=True, text=True, check=True)
         
         if result.stderr:
@@ -84,8 +126,8 @@ def get_video_metadata(youtube_url):
         
         # Set default language to English
         metadata['language'] = 'en'
-        print(f"  > Fetched Title: {metadata['title']}")
-        print(f"  > Upload Date: {format_date(metadata['upload_date'])}")
+        METRICS.progress(f"  > Fetched Title: {metadata['title']}")
+        METRICS.progress(f"  > Upload Date: {format_date(metadata['upload_date'])}")
         
         return metadata
     
@@ -105,119 +147,277 @@ def get_transcript(youtube_url):
     Fetch transcript for a YouTube video
     Returns: transcript text or None if unavailable
     """
-    print(f"Fetching transcript for: {youtube_url}")
+    METRICS.progress(f"Fetching transcript for: {youtube_url}")
     video_id = youtube_url.split("v=")[1] if "v=" in youtube_url else youtube_url.split("/")[-1]
     
     try:
         transcript_items = YouTubeTranscriptApi.get_transcript(video_id, languages=['en'])
         
         if not transcript_items:
-            print(f"  > No transcript found for {youtube_url}")
+            METRICS.progress(f"  > No transcript found for {youtube_url}")
             return None
         
         # Combine transcript parts into a single string
         full_transcript = " ".join(item['text'] for item in transcript_items)
-        print(f"  > Fetched transcript (length: {len(full_transcript)})")
+        METRICS.progress(f"  > Fetched transcript (length: {len(full_transcript)})")
         return full_transcript
     
     except Exception as e:
         # Handle common errors
         error_msg = str(e)
         if "disabled" in error_msg:
-            print(f"  > Transcripts are disabled for {youtube_url}")
+            METRICS.progress(f"  > Transcripts are disabled for {youtube_url}")
         elif "No transcript found" in error_msg:
-            print(f"  > No transcript found for {youtube_url} (may not exist or not be in English)")
+            METRICS.progress(f"  > No transcript found for {youtube_url} (may not exist or not be in English)")
         else:
             print(f"Error fetching transcript for {youtube_url}: {e}")
         return None
 
 
-def get_videos_to_process(cutoff_date, max_videos=50):
+def load_channels(channels_path):
     """
-    Dynamically retrieve recent videos from specified channels
-    Returns: list of dicts with video URL and candidate
+    Load a channel map from a JSON file of {"<channel url>": "<candidate>"}
+    Returns: dict mapping channel URL to candidate name
     """
-    print(f"Fetching videos published after {cutoff_date}")
+    with open(channels_path, 'r', encoding='utf-8') as f:
+        channels = json.load(f)
     
-    # Calculate per-channel limit
-    per_channel_limit = max_videos // 2
+    if not isinstance(channels, dict) or not all(isinstance(v, str) for v in channels.values()):
+        raise ValueError(f"Expected an object mapping channel URLs to candidates in {channels_path}")
     
-    all_videos = []
-    
-    # Channels to process
-    channels = {
-        "https://www.youtube.com/@PierrePoilievre/videos": "Pierre Poilievre",
-        "https://www.youtube.com/@MarkJCarney": "Mark Carney",
-        "https://www.youtube.com/@jagmeetsingh": "Jagmeet Singh"
-    }
-    
-    # Process each channel
-    for channel_url, candidate in channels.items():
-        print(f"Processing channel: {channel_url} for candidate: {candidate}")
-        try:
-            command = [
-                "yt-dlp", 
-                "--print", "%(id)s|%(title)s|%(upload_date)s", 
-                "--no-playlist", 
-                channel_url, 
-                "--max-downloads", str(per_channel_limit)
-            ]
-            
+    return channels
+
+
+def list_channel_videos(channel_url, candidate, cutoff_date, per_channel_limit):
+    """
+    List recent English videos for a single channel
+    Returns: list of dicts with video ID, URL and candidate
+    """
+    print(f"Processing channel: {channel_url} for candidate: {candidate}")
+    videos = []
+    
+    try:
+        command = [
+            YT_DLP, 
+            "--print", "%(id)s|%(title)s|%(upload_date)s", 
+            "--no-playlist", 
+            channel_url, 
+            "--max-downloads", str(per_channel_limit)
+        ]
+        
+        with METRICS.timer("fetch"):
             result = subprocess.run(command, capture_output=True, text=True)
+        
+        if result.returncode != 0 and not result.stdout:
+            print(f"Error fetching videos for {candidate}: {result.stderr}")
+            return videos
+        
+        # Process output
+        lines = result.stdout.strip().split('\n')
+        print(f"Got {len(lines)} videos from {candidate}")
+        
+        # Parse video information
+        listed = []
+        for line in lines:
+            if not line.strip():
+                continue
+            
+            parts = line.split('|')
+            if len(parts) < 3:
+                continue
+            
+            # Titles may themselves contain '|'
+            video_id, title, upload_date = parts[0], '|'.join(parts[1:-1]), parts[-1]
             
-            if result.returncode != 0 and not result.stdout:
-                print(f"Error fetching videos for {candidate}: {result.stderr}")
+            # Skip if before cutoff date
+            formatted_date = format_date(upload_date)
+            
+            if formatted_date < cutoff_date:
+                METRICS.progress(f"Skipping video {video_id} - published on {formatted_date}, before cutoff {cutoff_date}")
+                continue
+            
+            listed.append((video_id, title, formatted_date))
+        
+        # Classify every title of the listing in one call
+        languages = LANGUAGE_DETECTOR.detect_batch([title for _, title, _ in listed])
+        
+        for (video_id, title, formatted_date), language in zip(listed, languages):
+            # Check if video is in English
+            if language != 'en':
+                METRICS.progress(f"Skipping non-English video: {title}")
                 continue
             
-            # Process output
-            lines = result.stdout.strip().split('\n')
-            print(f"Got {len(lines)} videos from {candidate}")
+            videos.append({
+                "id": video_id,
+                "url": f"https://www.youtube.com/watch?v={video_id}",
+                "candidate": candidate
+            })
             
-            # Parse video information
-            for line in lines:
-                if not line.strip():
-                    continue
-                
-                parts = line.split('|')
-                if len(parts) < 3:
-                    continue
-                
-                video_id, title, upload_date = parts
-                
-                # Skip if before cutoff date
-                formatted_date = upload_date
-                if len(upload_date) == 8:  # YYYYMMDD format
-                    formatted_date = f"{upload_date[:4]}-{upload_date[4:6]}-{upload_date[6:8]}"
-                
-                if formatted_date < cutoff_date:
-                    print(f"Skipping video {video_id} - published on {formatted_date}, before cutoff {cutoff_date}")
-                    continue
-                
-                # Check if video is in English
-                is_english = detect_language(title) == 'en'
-                if not is_english:
-                    print(f"Skipping non-English video: {title}")
-                    continue
-                
-                all_videos.append({
-                    "url": f"https://www.youtube.com/watch?v={video_id}",
-                    "candidate": candidate
-                })
-                
-                print(f"Added video: {video_id} - {title} ({formatted_date})")
+            METRICS.progress(f"Added video: {video_id} - {title} ({formatted_date})")
             
-        except Exception as e:
-            print(f"Error processing channel {channel_url}: {e}")
+            if len(videos) >= per_channel_limit:
+                break
+        
+    except Exception as e:
+        print(f"Error processing channel {channel_url}: {e}")
+    
+    return videos
+
+
+def get_videos_to_process(cutoff_date, max_videos=50, channels=None, concurrency=None):
+    """
+    Dynamically retrieve recent videos from specified channels
+    Up to `concurrency` channels (all of them by default) are listed at a time
+    and merged in the order of the channel map
+    Returns: list of dicts with video URL and candidate
+    """
+    print(f"Fetching videos published after {cutoff_date}")
+    
+    if channels is None:
+        channels = CHANNELS
+    
+    if not channels:
+        print("No channels configured")
+        return []
+    
+    # Calculate per-channel limit
+    per_channel_limit = max_videos // 2
+    
+    # Listing in parallel takes as long as the slowest channel; map() keeps the results in channel order
+    workers = len(channels) if concurrency is None else max(1, min(len(channels), concurrency))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        channel_videos = list(executor.map(
+            lambda item: list_channel_videos(item[0], item[1], cutoff_date, per_channel_limit),
+            channels.items()
+        ))
+    
+    all_videos = [video for videos in channel_videos for video in videos]
+    
+    # Persist language results so the next scan can reuse them
+    LANGUAGE_DETECTOR.save()
     
     print(f"Total videos found from channels: {len(all_videos)}")
     return all_videos[:max_videos]
 
 
-def process_videos(cutoff_date=None, max_videos=50, output_dir=None):
+def index_existing_videos(output_dir, candidates):
+    """
+    Build an index of video IDs that already have a markdown file
+    Returns: dict mapping candidate name to a set of video IDs
+    """
+    index = {}
+    for candidate in candidates:
+        candidate_dir = os.path.join(output_dir, sanitize_filename(candidate))
+        video_ids = set()
+        if os.path.isdir(candidate_dir):
+            for filename in os.listdir(candidate_dir):
+                if filename.endswith('.md'):
+                    video_ids.add(filename[:-len('.md')])
+        index[candidate] = video_ids
+    return index
+
+
+def render_video_markdown(metadata, candidate, transcript):
+    """Render a video's metadata and transcript as markdown with YAML front matter"""
+    escaped_title = metadata['title'].replace('"', '\\"')
+    markdown_content = f"""---
+title: "{escaped_title}"
+candidate: "{candidate}"
+date: {format_date(metadata['upload_date'])}
+video_url: {metadata['webpage_url']}
+id: {metadata['id']}
+---
+
+# {metadata['title']}
+
+**Candidate:** {candidate}
+**Date:** {format_date(metadata['upload_date'])}
+**Source:** [YouTube Video]({metadata['webpage_url']})
+
+## Transcript
+
+"""
+    
+    if transcript:
+        markdown_content += transcript
+    else:
+        markdown_content += "*Transcript not available or could not be fetched.*"
+    
+    if 'description' in metadata and metadata['description']:
+        markdown_content += f"\n\n## Video Description\n\n{metadata['description']}"
+    
+    return markdown_content
+
+
+def process_video(video, cutoff_date, output_dir, rate_limiter=None, transcript_limiter=None):
+    """
+    Fetch, render and save a single video
+    rate_limiter spaces out the yt-dlp metadata calls and transcript_limiter
+    the transcript API calls, each keyed on the host it contacts
+    Returns: (status, file_path) where status is one of
+    'processed', 'skipped', 'before_cutoff' or 'error'
+    """
+    youtube_url = video["url"]
+    candidate = video["candidate"]
+    
+    METRICS.progress(f"\nProcessing URL: {youtube_url} for Candidate: {candidate}")
+    
+    try:
+        # Get video metadata
+        if rate_limiter:
+            rate_limiter.wait(youtube_url)
+        with METRICS.timer("fetch"):
+            metadata = get_video_metadata(youtube_url)
+        if not metadata:
+            print(f"Skipping video due to metadata fetch error: {youtube_url}")
+            return "error", None
+        
+        # Check if the video is after our cutoff date
+        if not is_after_cutoff_date(metadata["upload_date"], cutoff_date):
+            METRICS.progress(f"  > Video published on {format_date(metadata['upload_date'])} is before cutoff date {cutoff_date}, skipping")
+            return "before_cutoff", None
+        
+        # Check if markdown file already exists
+        candidate_dir = os.path.join(output_dir, sanitize_filename(candidate))
+        os.makedirs(candidate_dir, exist_ok=True)
+        
+        filename = f"{metadata['id']}.md"
+        file_path = os.path.join(candidate_dir, filename)
+        
+        if os.path.exists(file_path):
+            METRICS.progress(f"  > Markdown file already exists for video {metadata['id']}, skipping")
+            return "skipped", None
+        
+        # Get transcript
+        if transcript_limiter:
+            transcript_limiter.wait(TRANSCRIPT_API_URL)
+        with METRICS.timer("fetch"):
+            transcript = get_transcript(youtube_url)
+        
+        # Create markdown content
+        with METRICS.timer("render"):
+            markdown_content = render_video_markdown(metadata, candidate, transcript)
+        
+        # Write markdown file
+        with METRICS.timer("write"):
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(markdown_content)
+        
+        METRICS.progress(f"  > Successfully saved Markdown to: {file_path}")
+        return "processed", file_path
+        
+    except Exception as e:
+        print(f"Error processing video {youtube_url}: {e}")
+        return "error", None
+
+
+def process_videos(cutoff_date=None, max_videos=50, output_dir=None, concurrency=1,
+                   requests_per_second=DEFAULT_REQUESTS_PER_SECOND, channels=None, list_concurrency=None):
     """
     Main function to process videos
     - Fetches videos published after cutoff_date
-    - Downloads metadata and transcripts
+    - Lists up to `list_concurrency` channels at a time (all of them by default)
+    - Downloads metadata and transcripts, up to `concurrency` videos at a time
     - Converts to markdown
     
     Returns: list of processed markdown file paths
@@ -236,89 +436,43 @@ def process_videos(cutoff_date=None, max_videos=50, output_dir=None):
     os.makedirs(output_dir, exist_ok=True)
     
     # Get videos to process
-    videos = get_videos_to_process(cutoff_date, max_videos)
+    videos = get_videos_to_process(cutoff_date, max_videos, channels, list_concurrency)
+    
+    # Drop videos that were converted on a previous run before spawning yt-dlp for them
+    existing = index_existing_videos(output_dir, {video["candidate"] for video in videos})
+    new_videos = [
+        video for video in videos
+        if video.get("id") not in existing[video["candidate"]]
+    ]
+    known_count = len(videos) - len(new_videos)
+    if known_count:
+        print(f"Skipping {known_count} videos that already have markdown files")
+    
+    # Metadata and transcripts go through separate clients, so each gets its own budget
+    rate_limiter = HostRateLimiter(requests_per_second)
+    transcript_limiter = HostRateLimiter(requests_per_second)
+    
+    # Process each video; results come back in the same order as videos
+    if concurrency > 1:
+        print(f"Fetching with up to {concurrency} videos in flight")
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(
+                lambda video: process_video(video, cutoff_date, output_dir, rate_limiter, transcript_limiter),
+                new_videos
+            ))
+    else:
+        results = [process_video(video, cutoff_date, output_dir, rate_limiter, transcript_limiter)
+                   for video in new_videos]
     
     # Track processing stats
-    processed_files = []
-    processed_count = 0
-    skipped_count = 0
-    error_count = 0
-    before_cutoff_count = 0
-    
-    # Process each video
-    for video in videos:
-        youtube_url = video["url"]
-        candidate = video["candidate"]
-        
-        print(f"\nProcessing URL: {youtube_url} for Candidate: {candidate}")
-        
-        try:
-            # Get video metadata
-            metadata = get_video_metadata(youtube_url)
-            if not metadata:
-                print(f"Skipping video due to metadata fetch error: {youtube_url}")
-                error_count += 1
-                continue
-            
-            # Check if the video is after our cutoff date
-            if not is_after_cutoff_date(metadata["upload_date"], cutoff_date):
-                print(f"  > Video published on {format_date(metadata['upload_date'])} is before cutoff date {cutoff_date}, skipping")
-                before_cutoff_count += 1
-                continue
-            
-            # Check if markdown file already exists
-            candidate_dir = os.path.join(output_dir, sanitize_filename(candidate))
-            os.makedirs(candidate_dir, exist_ok=True)
-            
-            filename = f"{metadata['id']}.md"
-            file_path = os.path.join(candidate_dir, filename)
-            
-            if os.path.exists(file_path):
-                print(f"  > Markdown file already exists for video {metadata['id']}, skipping")
-                skipped_count += 1
-                continue
-            
-            # Get transcript
-            transcript = get_transcript(youtube_url)
-            
-            # Create markdown content
-            markdown_content = f"""---
-title: "{metadata['title'].replace('"', '\\"')}"
-candidate: "{candidate}"
-date: {format_date(metadata['upload_date'])}
-video_url: {metadata['webpage_url']}
-id: {metadata['id']}
----
-
-# {metadata['title']}
-
-**Candidate:** {candidate}
-**Date:** {format_date(metadata['upload_date'])}
-**Source:** [YouTube Video]({metadata['webpage_url']})
-
-## Transcript
-
-"""
-            
-            if transcript:
-                markdown_content += transcript
-            else:
-                markdown_content += "*Transcript not available or could not be fetched.*"
-            
-            if 'description' in metadata and metadata['description']:
-                markdown_content += f"\n\n## Video Description\n\n{metadata['description']}"
-            
-            # Write markdown file
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(markdown_content)
-            
-            print(f"  > Successfully saved Markdown to: {file_path}")
-            processed_count += 1
-            processed_files.append(file_path)
-            
-        except Exception as e:
-            print(f"Error processing video {youtube_url}: {e}")
-            error_count += 1
+    processed_files = [file_path for status, file_path in results if status == "processed"]
+    processed_count = len(processed_files)
+    skipped_count = sum(1 for status, _ in results if status == "skipped")
+    error_count = sum(1 for status, _ in results if status == "error")
+    before_cutoff_count = sum(1 for status, _ in results if status == "before_cutoff")
+    for status, count in (("processed", processed_count), ("skipped", skipped_count + known_count),
+                          ("before_cutoff", before_cutoff_count), ("error", error_count)):
+        METRICS.count("items_total", count, stage="fetch", outcome=status)
     
     # Print summary
     print('\nVideo processing summary:')
@@ -326,6 +480,7 @@ id: {metadata['id']}
     print(f"  - Videos before cutoff date ({cutoff_date}): {before_cutoff_count}")
     print(f"  - Successfully processed: {processed_count}")
     print(f"  - Skipped (already processed): {skipped_count}")
+    print(f"  - Skipped before fetching (known video IDs): {known_count}")
     print(f"  - Errors: {error_count}")
     
     return processed_files
@@ -333,6 +488,8 @@ id: {metadata['id']}
 
 def main():
     """Main entry point for the script"""
+    global YT_DLP, LANGUAGE_DETECTOR
+    
     parser = argparse.ArgumentParser(description='Convert YouTube videos to markdown')
     parser.add_argument('--cutoff', type=str, help='Cutoff date in YYYY-MM-DD format',
                        default=get_default_cutoff_date())
@@ -340,10 +497,30 @@ def main():
                        default=50)
     parser.add_argument('--output', type=str, help='Output directory',
                        default=OUTPUT_DIR)
+    parser.add_argument('--concurrency', type=int, help='Number of videos fetched at the same time',
+                       default=1)
+    parser.add_argument('--list-concurrency', type=int,
+                       help='Number of channels listed at the same time (default: every channel)')
+    parser.add_argument('--rate', type=float, help='Maximum requests per second per host (0 disables)',
+                       default=DEFAULT_REQUESTS_PER_SECOND)
+    parser.add_argument('--yt-dlp', type=str, help='Path to the yt-dlp executable',
+                       default=YT_DLP)
+    parser.add_argument('--language-cache', type=str, help='File used to persist language detection results',
+                       default=DEFAULT_CACHE_PATH)
+    parser.add_argument('--channels', type=str,
+                       help='JSON file mapping channel URLs to candidates (defaults to the built-in channels)')
+    add_metrics_arguments(parser)
     
     args = parser.parse_args()
+    configure_metrics(args)
+    
+    YT_DLP = args.yt_dlp
+    if args.language_cache != LANGUAGE_DETECTOR.cache_path:
+        LANGUAGE_DETECTOR = LanguageDetector(args.language_cache)
+    channels = load_channels(args.channels) if args.channels else None
     
-    process_videos(args.cutoff, args.max, args.output)
+    process_videos(args.cutoff, args.max, args.output, args.concurrency, args.rate, channels, args.list_concurrency)
+    finish_metrics(args)
 
 
 if __name__ == "__main__":
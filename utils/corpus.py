@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import gzip
+import json
+import argparse
+from collections import Counter
+
+from chunking import parse_front_matter
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(REPO_ROOT, "data")
+
+# Columnar cache of the parsed corpus; Parquet when pyarrow is installed,
+# otherwise gzipped JSON holding one array per column
+PARQUET_CACHE_PATH = os.path.join(DATA_DIR, "corpus.parquet")
+JSON_CACHE_PATH = os.path.join(DATA_DIR, "corpus.columns.json.gz")
+DEFAULT_CACHE_PATH = PARQUET_CACHE_PATH if PYARROW_AVAILABLE else JSON_CACHE_PATH
+
+# Key holding the corpus signature in the cache metadata
+SIGNATURE_KEY = "corpus_signature"
+
+TWEET_HEADER_PATTERN = re.compile(r"^# Tweet by (.+?) \(@(\w+)\)", re.MULTILINE)
+TWEET_DATE_PATTERN = re.compile(r"^Date: (.+)$", re.MULTILINE)
+TWEET_URL_PATTERN = re.compile(r"\[Original Tweet\]\((.+?)\)")
+
+
+class Document:
+    """
+    One tweet or video from the corpus.
+    path is relative to the data directory (the same key the vector index
+    uses), date is ISO formatted, and body is the text after any front matter.
+    """
+    
+    __slots__ = ("id", "candidate", "source", "date", "url", "title", "path", "body")
+    
+    def __init__(self, id, candidate, source, date, url, title, path, body):
+        self.id = id
+        self.candidate = candidate
+        self.source = source
+        self.date = date
+        self.url = url
+        self.title = title
+        self.path = path
+        self.body = body
+    
+    def __repr__(self):
+        return f"Document({self.source}:{self.id}, {self.candidate}, {self.date})"
+    
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+FIELDS = Document.__slots__
+
+
+def _sorted_entries(path):
+    with os.scandir(path) as entries:
+        return sorted(entries, key=lambda entry: entry.name)
+
+
+def iter_corpus_files(data_dir=DATA_DIR):
+    """
+    Walk the corpus once, in a stable order
+    Yields: (source, path) for data/youtube/*/*.md and data/tweets/*/markdown/*.md, skipping dotfiles like glob
+    """
+    youtube_dir = os.path.join(data_dir, "youtube")
+    if os.path.isdir(youtube_dir):
+        for channel in _sorted_entries(youtube_dir):
+            if not channel.is_dir():
+                continue
+            for entry in _sorted_entries(channel.path):
+                if entry.name.endswith(".md") and not entry.name.startswith(".") and entry.is_file():
+                    yield "youtube", entry.path
+    
+    tweets_dir = os.path.join(data_dir, "tweets")
+    if os.path.isdir(tweets_dir):
+        for user in _sorted_entries(tweets_dir):
+            markdown_dir = os.path.join(user.path, "markdown")
+            if not os.path.isdir(markdown_dir):
+                continue
+            for entry in _sorted_entries(markdown_dir):
+                if entry.name.endswith(".md") and not entry.name.startswith(".") and entry.is_file():
+                    yield "tweet", entry.path
+
+
+def find_corpus_files(data_dir=DATA_DIR):
+    """
+    Find every markdown document in the corpus
+    Returns: sorted list of paths under data/youtube/* and data/tweets/*/markdown
+    """
+    return sorted(path for _, path in iter_corpus_files(data_dir))
+
+
+def parse_document(text, rel_path, source):
+    """
+    Build a Document from a rendered markdown file
+    Videos carry front matter; tweets only have the header, date and link lines
+    written by convert_tweets_to_markdown.
+    """
+    fields, body_start = parse_front_matter(text)
+    stem = os.path.splitext(os.path.basename(rel_path))[0]
+    if fields:
+        return Document(
+            id=fields.get("id", stem),
+            candidate=fields.get("candidate", ""),
+            source=source,
+            date=fields.get("date", "")[:10],
+            url=fields.get("video_url", ""),
+            title=fields.get("title", ""),
+            path=rel_path,
+            body=text[body_start:],
+        )
+    
+    header = TWEET_HEADER_PATTERN.search(text)
+    date_match = TWEET_DATE_PATTERN.search(text)
+    url_match = TWEET_URL_PATTERN.search(text)
+    return Document(
+        id=stem,
+        candidate=header.group(1) if header else rel_path.split("/")[1],
+        source=source,
+        date=date_match.group(1).strip()[:10] if date_match else "",
+        url=url_match.group(1) if url_match else "",
+        title=header.group(0)[2:] if header else "",
+        path=rel_path,
+        body=text,
+    )
+
+
+def iter_documents(data_dir=DATA_DIR):
+    """Yield every Document in the corpus, reading one file at a time"""
+    for source, file_path in iter_corpus_files(data_dir):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        rel_path = os.path.relpath(file_path, data_dir).replace(os.sep, "/")
+        yield parse_document(text, rel_path, source)
+
+
+def corpus_signature(data_dir=DATA_DIR):
+    """
+    Modification time and size of every corpus file
+    Adding, removing or rewriting a document in place changes the signature, so
+    a stale cache is detected with one stat call per file and no file reads.
+    Returns: dict mapping each path relative to data_dir to [mtime_ns, size]
+    """
+    signature = {}
+    for _, file_path in iter_corpus_files(data_dir):
+        stat = os.stat(file_path)
+        # Lists rather than tuples so the signature compares equal after a JSON round trip
+        signature[os.path.relpath(file_path, data_dir).replace(os.sep, "/")] = [stat.st_mtime_ns, stat.st_size]
+    return signature
+
+
+def save_documents(documents, cache_path=DEFAULT_CACHE_PATH, signature=None):
+    """
+    Write documents to a columnar cache file
+    The format follows the extension: .parquet (needs pyarrow) or .json.gz
+    Returns: number of documents written
+    """
+    columns = {field: [] for field in FIELDS}
+    for document in documents:
+        for field in FIELDS:
+            columns[field].append(getattr(document, field))
+    
+    os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    if cache_path.endswith(".parquet"):
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("pyarrow is required for Parquet caches; install it or use a .json.gz path")
+        table = pa.table(columns, metadata={SIGNATURE_KEY: json.dumps(signature or {})})
+        pq.write_table(table, tmp_path, compression="zstd")
+    else:
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump({SIGNATURE_KEY: signature or {}, "columns": columns}, f, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
+    return len(columns["id"])
+
+
+def load_cached_documents(cache_path=DEFAULT_CACHE_PATH):
+    """
+    Read a columnar cache file written by save_documents
+    Returns: (list of Documents, corpus signature stored with them)
+    """
+    if cache_path.endswith(".parquet"):
+        table = pq.read_table(cache_path)
+        signature = json.loads((table.schema.metadata or {}).get(SIGNATURE_KEY.encode(), b"{}"))
+        columns = table.to_pydict()
+    else:
+        with gzip.open(cache_path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        signature = data[SIGNATURE_KEY]
+        columns = data["columns"]
+    
+    documents = [Document(*values) for values in zip(*(columns[field] for field in FIELDS))]
+    return documents, signature
+
+
+def load_documents(data_dir=DATA_DIR, cache_path=DEFAULT_CACHE_PATH, refresh=False):
+    """
+    Load the whole corpus, from the columnar cache when it is up to date
+    The cache is up to date when no corpus file was added, removed or rewritten
+    since it was saved (see corpus_signature). Otherwise the corpus is scanned
+    once and the cache rewritten. Pass cache_path=None to always scan without caching.
+    Returns: list of Documents
+    """
+    if cache_path is None:
+        return list(iter_documents(data_dir))
+    
+    signature = corpus_signature(data_dir)
+    if not refresh and os.path.exists(cache_path):
+        try:
+            documents, cached_signature = load_cached_documents(cache_path)
+            if cached_signature == signature:
+                return documents
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable corpus cache {cache_path}: {e}")
+    
+    documents = list(iter_documents(data_dir))
+    save_documents(documents, cache_path, signature)
+    return documents
+
+
+def main():
+    """Build the corpus cache or summarise the corpus"""
+    parser = argparse.ArgumentParser(description='Scan the corpus into a columnar document cache')
+    parser.add_argument('--data', type=str, help='Corpus directory', default=DATA_DIR)
+    parser.add_argument('--cache', type=str, help='Cache file (.parquet or .json.gz)', default=DEFAULT_CACHE_PATH)
+    parser.add_argument('--refresh', action='store_true', help='Rescan even if the cache looks up to date')
+    args = parser.parse_args()
+    
+    documents = load_documents(args.data, args.cache, args.refresh)
+    print(f"{len(documents)} documents in {args.cache}")
+    for (source, candidate), count in sorted(Counter((d.source, d.candidate) for d in documents).items()):
+        print(f"  {source:8} {candidate}: {count}")
+
+
+if __name__ == "__main__":
+    main()
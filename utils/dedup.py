@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import json
+import zlib
+import hashlib
+import argparse
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from corpus import DATA_DIR, iter_documents
+
+
+DEFAULT_OUTPUT_DIR = os.path.join(DATA_DIR, "dedup")
+CANONICAL_FILENAME = "canonical.jsonl"
+DUPLICATES_FILENAME = "duplicates.jsonl"
+REFERENCES_FILENAME = "references.json"
+
+# Documents whose estimated Jaccard similarity reaches this are near-duplicates
+DEFAULT_THRESHOLD = 0.8
+
+# MinHash signature length and its split into LSH bands; 16 bands of 8 rows
+# make pairs above ~0.7 similarity very likely to share a bucket
+DEFAULT_NUM_PERM = 128
+DEFAULT_BANDS = 16
+
+# Words per shingle
+SHINGLE_SIZE = 5
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+URL_PATTERN = re.compile(r"https?://\S+")
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Lines added by the renderers rather than written by the author
+METADATA_LINE_PATTERN = re.compile(
+    r"^(# Tweet by .*|Date: .*|\[Original [^\]]*\]\(.*\)|\*\*(Candidate|Date|Source):\*\*.*)$",
+    re.MULTILINE,
+)
+AUTHOR_PREFIX_PATTERN = re.compile(r"^\*\*[^*\n]+ \(@\w+\):\*\* ?", re.MULTILINE)
+RETWEET_SECTION = "## Retweeted Tweet"
+
+
+def content_text(document):
+    """
+    The part of a document that is actually its content
+    Renderer boilerplate (headers, dates, links) is dropped, and a retweet is
+    reduced to the retweeted text, since its own "RT @user: ..." line is a
+    truncated copy of it.
+    """
+    body = document.body
+    if RETWEET_SECTION in body:
+        body = body.split(RETWEET_SECTION, 1)[1]
+    body = METADATA_LINE_PATTERN.sub("", body)
+    return AUTHOR_PREFIX_PATTERN.sub("", body)
+
+
+def normalize_words(text):
+    """Lowercased words with URLs removed, so shortened links do not hide duplicates"""
+    return WORD_PATTERN.findall(URL_PATTERN.sub(" ", text).lower())
+
+
+def shingle_hashes(words, size=SHINGLE_SIZE):
+    """32-bit hashes of the distinct word shingles of a text"""
+    size = min(size, len(words))
+    if not size:
+        return np.empty(0, dtype=np.uint64)
+    shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles), dtype=np.uint64,
+                       count=len(shingles))
+
+
+class MinHasher:
+    """MinHash signatures from universal hashes (a * x + b) mod p, one per permutation"""
+    
+    def __init__(self, num_perm=DEFAULT_NUM_PERM, seed=1):
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, np.iinfo(np.uint32).max, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, np.iinfo(np.uint32).max, size=num_perm, dtype=np.uint64)
+    
+    def signature(self, hashes):
+        hashed = ((np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME) & MAX_HASH
+        return hashed.min(axis=0).astype(np.uint32)
+
+
+class Deduplicator:
+    """
+    Streaming exact and near-duplicate detection.
+    Each document is compared against the canonical documents seen so far:
+    first by a hash of its normalised words, then through MinHash LSH buckets.
+    Memory is O(n) in the number of canonical documents, independent of their
+    length: each keeps its word digest, its signature and one integer hash per
+    band, about 2 KB with the default 128 permutations and 16 bands.
+    """
+    
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM, bands=DEFAULT_BANDS):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self.digests = {}
+        # Band hash -> canonical number, or a list of numbers once several share it
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = np.empty((1024, num_perm), dtype=np.uint32)
+        self.count = 0
+    
+    def _store_signature(self, signature):
+        if self.count == len(self.signatures):
+            self.signatures = np.concatenate([self.signatures, np.empty_like(self.signatures)])
+        self.signatures[self.count] = signature
+    
+    def _band_keys(self, signature):
+        # Hashed to ints, which are smaller than the bytes; a collision only adds a candidate
+        return [hash(signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+    
+    def _add_to_bucket(self, band, key, number):
+        members = self.buckets[band].get(key)
+        if members is None:
+            self.buckets[band][key] = number
+        elif isinstance(members, list):
+            members.append(number)
+        else:
+            self.buckets[band][key] = [members, number]
+    
+    def add(self, text):
+        """
+        Check a text against the canonical texts seen so far
+        A text that is not a duplicate becomes canonical itself.
+        Returns: (canonical number, kind, similarity); kind is "canonical",
+        "exact" or "near", and the number refers to the matching canonical
+        """
+        words = normalize_words(text)
+        # Media-only posts have no words; they are never duplicates of each other
+        digest = hashlib.blake2b(" ".join(words).encode('utf-8'), digest_size=16).digest() if words else None
+        if digest in self.digests:
+            return self.digests[digest], "exact", 1.0
+        
+        signature = None
+        band_keys = []
+        if len(words) >= SHINGLE_SIZE:
+            signature = self.hasher.signature(shingle_hashes(words))
+            band_keys = self._band_keys(signature)
+            candidates = set()
+            for band, key in enumerate(band_keys):
+                members = self.buckets[band].get(key)
+                if isinstance(members, list):
+                    candidates.update(members)
+                elif members is not None:
+                    candidates.add(members)
+            if candidates:
+                candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+                similarities = (self.signatures[candidates] == signature).mean(axis=1)
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    return int(candidates[best]), "near", float(similarities[best])
+        
+        number = self.count
+        if digest is not None:
+            self.digests[digest] = number
+        if signature is not None:
+            self._store_signature(signature)
+            for band, key in enumerate(band_keys):
+                self._add_to_bucket(band, key, number)
+        else:
+            # Too short for shingles; only exact matches apply
+            self._store_signature(np.zeros(len(self.hasher.a), dtype=np.uint32))
+        self.count += 1
+        return number, "canonical", 1.0
+
+
+def dedupe_corpus(documents, output_dir=DEFAULT_OUTPUT_DIR, threshold=DEFAULT_THRESHOLD,
+                  num_perm=DEFAULT_NUM_PERM, bands=DEFAULT_BANDS):
+    """
+    Deduplicate a stream of Documents in a single pass
+    Writes to output_dir:
+      canonical.jsonl  - each first-seen document with its content text
+      duplicates.jsonl - each duplicate with the canonical path it matched
+      references.json  - canonical path -> duplicate paths, for canonicals with duplicates
+    Returns: Counter of documents by kind
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    deduplicator = Deduplicator(threshold, num_perm, bands)
+    canonical_paths = []
+    references = defaultdict(list)
+    counts = Counter()
+    
+    with open(os.path.join(output_dir, CANONICAL_FILENAME), 'w', encoding='utf-8') as canonical_file, \
+            open(os.path.join(output_dir, DUPLICATES_FILENAME), 'w', encoding='utf-8') as duplicates_file:
+        for document in documents:
+            text = content_text(document)
+            number, kind, similarity = deduplicator.add(text)
+            counts[kind] += 1
+            if kind == "canonical":
+                canonical_paths.append(document.path)
+                record = document.to_dict()
+                record["text"] = text.strip()
+                canonical_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            else:
+                canonical_path = canonical_paths[number]
+                references[canonical_path].append(document.path)
+                duplicates_file.write(json.dumps({
+                    "path": document.path,
+                    "id": document.id,
+                    "source": document.source,
+                    "canonical": canonical_path,
+                    "kind": kind,
+                    "similarity": round(similarity, 4),
+                }) + "\n")
+    
+    with open(os.path.join(output_dir, REFERENCES_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(references, f, indent=2)
+    
+    return counts
+
+
+def main():
+    """Find exact and near-duplicate documents across tweets and transcripts"""
+    parser = argparse.ArgumentParser(description='Deduplicate the corpus with exact hashes and MinHash LSH')
+    parser.add_argument('--data', type=str, help='Corpus directory', default=DATA_DIR)
+    parser.add_argument('--output', type=str, help='Output directory', default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument('--threshold', type=float, help='Similarity for near-duplicates',
+                        default=DEFAULT_THRESHOLD)
+    parser.add_argument('--num-perm', type=int, help='MinHash signature length', default=DEFAULT_NUM_PERM)
+    parser.add_argument('--bands', type=int, help='LSH bands (must divide --num-perm)', default=DEFAULT_BANDS)
+    args = parser.parse_args()
+    
+    counts = dedupe_corpus(iter_documents(args.data), args.output, args.threshold, args.num_perm, args.bands)
+    
+    total = sum(counts.values())
+    print(f"Scanned {total} documents")
+    print(f"  Canonical: {counts['canonical']}")
+    print(f"  Exact duplicates: {counts['exact']}")
+    print(f"  Near duplicates: {counts['near']}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
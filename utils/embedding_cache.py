@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import json
+import hashlib
+
+import numpy as np
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Default location of cached chunk embeddings
+DEFAULT_CACHE_DIR = os.path.join(REPO_ROOT, "data", "embedding_cache")
+
+# Files kept per model inside the cache directory
+KEYS_FILENAME = "keys.txt"
+VECTORS_FILENAME = "vectors.f16"
+INFO_FILENAME = "info.json"
+
+
+def chunk_key(text, model_name):
+    """Cache key for a chunk: hash of the model name and the chunk text"""
+    return hashlib.sha256(f"{model_name}\0{text}".encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Append-only store of chunk embeddings for one model.
+    Vectors are kept as float16 rows in a flat file that is memory-mapped for
+    reads; keys.txt lists the key of each row in order. Rows are written before
+    their keys, so an interrupted append only leaves unreferenced bytes behind.
+    """
+    
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, model_name=None):
+        self.model_dir = os.path.join(cache_dir, re.sub(r'[^a-zA-Z0-9_\-\.]', '_', model_name))
+        os.makedirs(self.model_dir, exist_ok=True)
+        self.keys_path = os.path.join(self.model_dir, KEYS_FILENAME)
+        self.vectors_path = os.path.join(self.model_dir, VECTORS_FILENAME)
+        self.info_path = os.path.join(self.model_dir, INFO_FILENAME)
+        self.model_name = model_name
+        self.dimension = None
+        self.rows = {}
+        self.vectors = None
+        
+        if os.path.exists(self.info_path):
+            with open(self.info_path) as f:
+                self.dimension = json.load(f)["dimension"]
+        
+        if self.dimension and os.path.exists(self.keys_path):
+            row_bytes = self.dimension * 2
+            stored_rows = os.path.getsize(self.vectors_path) // row_bytes if os.path.exists(self.vectors_path) else 0
+            key_count = 0
+            with open(self.keys_path) as f:
+                for line in f:
+                    if key_count < stored_rows:
+                        self.rows[line.strip()] = key_count
+                    key_count += 1
+            if key_count != len(self.rows) or stored_rows != len(self.rows):
+                self._truncate(len(self.rows))
+    
+    def __len__(self):
+        return len(self.rows)
+    
+    def __contains__(self, key):
+        return key in self.rows
+    
+    def _truncate(self, row_count):
+        """Drop any partially written rows past row_count"""
+        if os.path.exists(self.vectors_path):
+            with open(self.vectors_path, 'r+b') as f:
+                f.truncate(row_count * self.dimension * 2)
+        with open(self.keys_path, 'w') as f:
+            f.writelines(f"{key}\n" for key in sorted(self.rows, key=self.rows.get))
+    
+    def _open_vectors(self):
+        if self.vectors is None or len(self.vectors) != len(self.rows):
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float16, mode='r',
+                                     shape=(len(self.rows), self.dimension))
+        return self.vectors
+    
+    def add(self, keys, vectors):
+        """Append embeddings for keys that are not cached yet"""
+        vectors = np.asarray(vectors)
+        if self.dimension is None:
+            self.dimension = int(vectors.shape[1])
+            with open(self.info_path, 'w') as f:
+                json.dump({"model": self.model_name, "dimension": self.dimension}, f)
+        
+        new_rows = []
+        seen = set()
+        for key, vector in zip(keys, vectors):
+            if key not in self.rows and key not in seen:
+                seen.add(key)
+                new_rows.append((key, vector))
+        if not new_rows:
+            return
+        
+        with open(self.vectors_path, 'ab') as f:
+            f.write(np.asarray([vector for _, vector in new_rows], dtype=np.float16).tobytes())
+        with open(self.keys_path, 'a') as f:
+            for key, _ in new_rows:
+                self.rows[key] = len(self.rows)
+                f.write(f"{key}\n")
+    
+    def get(self, keys):
+        """Return the cached embeddings for keys as a float32 array, in order"""
+        if not keys:
+            return np.zeros((0, self.dimension or 0), dtype=np.float32)
+        vectors = self._open_vectors()
+        return np.asarray(vectors[[self.rows[key] for key in keys]], dtype=np.float32)
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import argparse
+import shutil
+
+import numpy as np
+import faiss
+from sentence_transformers import SentenceTransformer
+
+from ann_index import (DEFAULT_INDEX_PARAMS, DEFAULT_TRAIN_SAMPLE, INDEX_TYPES, create_index, print_report,
+                       read_index, recall_latency_report, sample_rows, set_search_params)
+from corpus import find_corpus_files
+from chunking import DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP, chunk_markdown, tokenizer_token_offsets
+from embedding_cache import DEFAULT_CACHE_DIR, EmbeddingCache, chunk_key
+from embedding_runner import DEFAULT_BATCH_SIZE, EmbeddingRunner
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Default corpus and index locations
+DATA_DIR = os.path.join(REPO_ROOT, "data")
+INDEX_DIR = os.path.join(REPO_ROOT, "data", "index")
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+
+# Files written to the index directory
+INDEX_FILENAME = "chunks.index"
+METADATA_FILENAME = "chunks.jsonl"
+OFFSETS_FILENAME = "chunks.offsets.npy"
+ROWS_FILENAME = "chunks.rows"
+INFO_FILENAME = "index_info.json"
+
+# Vectors added to the index at a time
+ADD_BATCH_SIZE = 8192
+
+
+def iter_chunks(data_dir=DATA_DIR, chunker=chunk_markdown):
+    """
+    Yield (path, chunk number, Chunk) for every chunk of every corpus document
+    Paths are relative to data_dir; chunker maps document text to (front matter, chunks)
+    """
+    for file_path in find_corpus_files(data_dir):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        rel_path = os.path.relpath(file_path, data_dir).replace(os.sep, "/")
+        _, chunks = chunker(text)
+        for chunk_number, chunk in enumerate(chunks):
+            yield rel_path, chunk_number, chunk
+
+
+class ChunkMetadata:
+    """
+    Read-only view of the chunk metadata sidecar.
+    Line offsets are memory-mapped, so a record is read from disk only when it is requested.
+    """
+    
+    def __init__(self, index_dir):
+        self.offsets = np.load(os.path.join(index_dir, OFFSETS_FILENAME), mmap_mode='r')
+        self.file = open(os.path.join(index_dir, METADATA_FILENAME), 'rb')
+    
+    def __len__(self):
+        return len(self.offsets)
+    
+    def __getitem__(self, position):
+        self.file.seek(int(self.offsets[position]))
+        return json.loads(self.file.readline())
+    
+    def close(self):
+        self.file.close()
+
+
+def row_id(key, rel_path, chunk_number):
+    """Identity of an index row: the chunk's cache key and where the chunk came from"""
+    return f"{key}\t{rel_path}\t{chunk_number}"
+
+
+def row_key(row):
+    """Cache key part of a row ID"""
+    return row.split("\t", 1)[0]
+
+
+def read_index_rows(index_dir, model_name, index_params=None):
+    """
+    Row identities of an existing index built with model_name and the same index parameters
+    Returns: list of row IDs in index order, or None if there is no compatible index
+    """
+    info_path = os.path.join(index_dir, INFO_FILENAME)
+    rows_path = os.path.join(index_dir, ROWS_FILENAME)
+    if not (os.path.exists(info_path) and os.path.exists(rows_path)):
+        return None
+    
+    with open(info_path) as f:
+        info = json.load(f)
+    if info.get("model") != model_name:
+        return None
+    if info.get("index", DEFAULT_INDEX_PARAMS) != (index_params or DEFAULT_INDEX_PARAMS):
+        return None
+    
+    with open(rows_path, encoding='utf-8') as f:
+        rows = [line.rstrip("\n") for line in f]
+    return rows if len(rows) == info.get("chunks") else None
+
+
+def embed_missing_chunks(data_dir, model_name, cache, chunker=chunk_markdown, runner=None):
+    """
+    Scan the corpus, embedding only chunks whose key is not in the cache
+    Chunks are streamed through the embedding runner block by block, so only
+    one block of texts is held in memory at a time
+    Returns: (row IDs in corpus order, number of chunks encoded)
+    """
+    runner = runner or EmbeddingRunner(model_name)
+    rows = []
+    # Keys handed to the runner but not in the cache yet, so identical texts are encoded once
+    pending = set()
+    
+    def missing_chunks():
+        for rel_path, chunk_number, chunk in iter_chunks(data_dir, chunker):
+            key = chunk_key(chunk.text, model_name)
+            rows.append(row_id(key, rel_path, chunk_number))
+            # Earlier blocks are already in the cache by the time later chunks are read
+            if key not in cache and key not in pending:
+                pending.add(key)
+                yield key, chunk.text
+    
+    encoded = 0
+    for keys, vectors in runner.encode_stream(missing_chunks()):
+        cache.add(keys, vectors)
+        pending.difference_update(keys)
+        encoded += len(keys)
+    
+    if encoded:
+        print(f"Embedding throughput: {runner.throughput():.1f} chunks/s")
+    
+    return rows, encoded
+
+
+def build_index(data_dir=DATA_DIR, index_dir=INDEX_DIR, model_name=DEFAULT_MODEL,
+                cache_dir=DEFAULT_CACHE_DIR, full_rebuild=False, index_params=None,
+                train_sample=DEFAULT_TRAIN_SAMPLE, chunker=chunk_markdown, runner=None):
+    """
+    Chunk and embed the corpus, then save a FAISS index and its metadata sidecar
+    Only chunks missing from the embedding cache are encoded. If every row of the
+    existing index is still present, new chunks are appended to it; otherwise the
+    index is rebuilt from cached vectors.
+    index_params selects the index type (see ann_index.DEFAULT_INDEX_PARAMS); IVF
+    and PQ indexes are trained on a random sample of train_sample chunks.
+    chunker maps document text to (front matter, chunks), see chunking.chunk_markdown.
+    runner is the EmbeddingRunner used for encoding (in-process by default).
+    Row i of the index corresponds to line i of chunks.jsonl and chunks.rows
+    Returns: number of chunks in the index
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    cache = EmbeddingCache(cache_dir, model_name)
+    index_params = dict(DEFAULT_INDEX_PARAMS, **(index_params or {}))
+    
+    # Pass 1: find every chunk and embed the ones the cache has not seen
+    rows, encoded = embed_missing_chunks(data_dir, model_name, cache, chunker, runner)
+    print(f"Found {len(rows)} chunks: {encoded} embedded, {len(rows) - encoded} reused from cache")
+    
+    if not rows:
+        print(f"No documents found under {data_dir}")
+        return 0
+    
+    index_path = os.path.join(index_dir, INDEX_FILENAME)
+    metadata_path = os.path.join(index_dir, METADATA_FILENAME)
+    offsets_path = os.path.join(index_dir, OFFSETS_FILENAME)
+    rows_path = os.path.join(index_dir, ROWS_FILENAME)
+    
+    # Append to the existing index when none of its rows went away
+    old_rows = None if full_rebuild else read_index_rows(index_dir, model_name, index_params)
+    if old_rows is not None and set(old_rows) <= set(rows):
+        old_row_set = set(old_rows)
+        added_rows = [row for row in rows if row not in old_row_set]
+        index = faiss.read_index(index_path)
+        offsets = list(np.load(offsets_path))
+        shutil.copyfile(metadata_path, metadata_path + ".tmp")
+        print(f"Appending {len(added_rows)} chunks to the existing index of {len(old_rows)}")
+    else:
+        old_rows = []
+        added_rows = rows
+        train_vectors = None
+        if index_params["type"] != "flat":
+            train_keys = list(dict.fromkeys(row_key(row) for row in sample_rows(rows, train_sample)))
+            print(f"Training {index_params['type']} index on {len(train_keys)} vectors")
+            train_vectors = cache.get(train_keys)
+        index = create_index(index_params, cache.dimension, train_vectors)
+        offsets = []
+        open(metadata_path + ".tmp", 'wb').close()
+        print(f"Building a new index of {len(rows)} chunks")
+    
+    for start in range(0, len(added_rows), ADD_BATCH_SIZE):
+        block = added_rows[start:start + ADD_BATCH_SIZE]
+        index.add(cache.get([row_key(row) for row in block]))
+    
+    # Pass 2: write metadata for the added rows, which come in corpus order
+    pending = set(added_rows)
+    with open(metadata_path + ".tmp", 'ab') as metadata_file:
+        for rel_path, chunk_number, chunk in iter_chunks(data_dir, chunker):
+            key = chunk_key(chunk.text, model_name)
+            if row_id(key, rel_path, chunk_number) not in pending:
+                continue
+            offsets.append(metadata_file.tell())
+            record = {"path": rel_path, "chunk": chunk_number, "heading": chunk.heading, "text": chunk.text}
+            metadata_file.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b"\n")
+    
+    # Write everything under temporary names, then swap the files into place
+    faiss.write_index(index, index_path + ".tmp")
+    np.save(offsets_path + ".tmp.npy", np.asarray(offsets, dtype=np.int64))
+    with open(rows_path + ".tmp", 'w', encoding='utf-8') as f:
+        f.writelines(f"{row}\n" for row in old_rows + added_rows)
+    os.replace(metadata_path + ".tmp", metadata_path)
+    os.replace(offsets_path + ".tmp.npy", offsets_path)
+    os.replace(rows_path + ".tmp", rows_path)
+    os.replace(index_path + ".tmp", index_path)
+    
+    chunk_count = len(old_rows) + len(added_rows)
+    with open(os.path.join(index_dir, INFO_FILENAME), 'w') as f:
+        json.dump({"model": model_name, "dimension": int(cache.dimension), "chunks": chunk_count,
+                   "index": index_params}, f, indent=2)
+    
+    print(f"Saved index with {chunk_count} chunks to {index_dir}")
+    return chunk_count
+
+
+class SearchIndex:
+    """
+    A saved index opened for querying.
+    The FAISS index is memory-mapped and the embedding model is only loaded
+    when a text query needs encoding, so opening it is cheap.
+    """
+    
+    def __init__(self, index_dir=INDEX_DIR):
+        with open(os.path.join(index_dir, INFO_FILENAME)) as f:
+            self.info = json.load(f)
+        self.index = read_index(os.path.join(index_dir, INDEX_FILENAME))
+        self.metadata = ChunkMetadata(index_dir)
+        self.model = None
+    
+    def encode(self, texts):
+        if self.model is None:
+            self.model = SentenceTransformer(self.info["model"])
+        return np.asarray(self.model.encode(texts, convert_to_numpy=True), dtype='float32')
+    
+    def search(self, query, k=5, nprobe=None, ef_search=None):
+        """
+        Find the k chunks closest to a query string
+        nprobe and ef_search tune IVF and HNSW indexes; they are ignored by other types
+        Returns: list of (distance, metadata record) pairs, closest first
+        """
+        set_search_params(self.index, nprobe, ef_search)
+        distances, positions = self.index.search(self.encode([query]), k)
+        return [
+            (float(distance), self.metadata[position])
+            for distance, position in zip(distances[0], positions[0])
+            if position >= 0
+        ]
+    
+    def close(self):
+        self.metadata.close()
+
+
+def load_index_vectors(index_dir=INDEX_DIR, cache_dir=DEFAULT_CACHE_DIR):
+    """Load the cached embedding of every row of a saved index, in index order"""
+    with open(os.path.join(index_dir, INFO_FILENAME)) as f:
+        info = json.load(f)
+    with open(os.path.join(index_dir, ROWS_FILENAME), encoding='utf-8') as f:
+        keys = [row_key(line.rstrip("\n")) for line in f]
+    return EmbeddingCache(cache_dir, info["model"]).get(keys)
+
+
+def main():
+    """Build the embedding index or query it"""
+    parser = argparse.ArgumentParser(description='Build and query a local FAISS index over the corpus')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    build_parser = subparsers.add_parser('build', help='Embed the corpus and save the index')
+    build_parser.add_argument('--data', type=str, help='Corpus directory', default=DATA_DIR)
+    build_parser.add_argument('--index', type=str, help='Index directory', default=INDEX_DIR)
+    build_parser.add_argument('--model', type=str, help='SentenceTransformer model name', default=DEFAULT_MODEL)
+    build_parser.add_argument('--cache', type=str, help='Embedding cache directory', default=DEFAULT_CACHE_DIR)
+    build_parser.add_argument('--full', action='store_true',
+                            help='Rebuild the index from scratch (cached embeddings are still reused)')
+    
+    build_parser.add_argument('--workers', type=int, help='Embedding worker processes', default=1)
+    build_parser.add_argument('--batch-size', type=int, help='Maximum chunks per model call',
+                            default=DEFAULT_BATCH_SIZE)
+    build_parser.add_argument('--max-tokens', type=int,
+                            help="Maximum tokens per chunk (default: the model's input limit, "
+                                 f"or {DEFAULT_MAX_TOKENS} with --whitespace-tokens)")
+    build_parser.add_argument('--overlap', type=int, help='Tokens shared by consecutive chunks of a section',
+                            default=DEFAULT_OVERLAP)
+    build_parser.add_argument('--whitespace-tokens', action='store_true',
+                            help="Count whitespace-separated words instead of the embedding model's tokens")
+    build_parser.add_argument('--index-type', choices=INDEX_TYPES, help='Index type',
+                            default=DEFAULT_INDEX_PARAMS["type"])
+    build_parser.add_argument('--nlist', type=int, help='Number of IVF lists',
+                            default=DEFAULT_INDEX_PARAMS["nlist"])
+    build_parser.add_argument('--hnsw-m', type=int, help='HNSW neighbours per node',
+                            default=DEFAULT_INDEX_PARAMS["hnsw_m"])
+    build_parser.add_argument('--pq-m', type=int, help='PQ sub-quantizers (must divide the dimension)',
+                            default=DEFAULT_INDEX_PARAMS["pq_m"])
+    build_parser.add_argument('--pq-bits', type=int, help='Bits per PQ code',
+                            default=DEFAULT_INDEX_PARAMS["pq_bits"])
+    build_parser.add_argument('--train-sample', type=int, help='Vectors sampled to train IVF/PQ indexes',
+                            default=DEFAULT_TRAIN_SAMPLE)
+    
+    query_parser = subparsers.add_parser('query', help='Search the saved index')
+    query_parser.add_argument('text', type=str, help='Query text')
+    query_parser.add_argument('--index', type=str, help='Index directory', default=INDEX_DIR)
+    query_parser.add_argument('-k', type=int, help='Number of results', default=5)
+    query_parser.add_argument('--nprobe', type=int, help='IVF lists to visit per query')
+    query_parser.add_argument('--ef-search', type=int, help='HNSW search breadth')
+    
+    report_parser = subparsers.add_parser('report', help='Compare ANN index types against the flat baseline')
+    report_parser.add_argument('--index', type=str, help='Index directory whose vectors are used', default=INDEX_DIR)
+    report_parser.add_argument('--cache', type=str, help='Embedding cache directory', default=DEFAULT_CACHE_DIR)
+    report_parser.add_argument('--types', nargs='+', choices=INDEX_TYPES[1:], help='Index types to compare',
+                             default=list(INDEX_TYPES[1:]))
+    report_parser.add_argument('--queries', type=int, help='Number of sampled queries', default=200)
+    report_parser.add_argument('-k', type=int, help='Neighbours compared for recall', default=10)
+    report_parser.add_argument('--nlist', type=int, help='Number of IVF lists', default=DEFAULT_INDEX_PARAMS["nlist"])
+    report_parser.add_argument('--hnsw-m', type=int, help='HNSW neighbours per node',
+                             default=DEFAULT_INDEX_PARAMS["hnsw_m"])
+    report_parser.add_argument('--pq-m', type=int, help='PQ sub-quantizers', default=DEFAULT_INDEX_PARAMS["pq_m"])
+    report_parser.add_argument('--pq-bits', type=int, help='Bits per PQ code', default=DEFAULT_INDEX_PARAMS["pq_bits"])
+    report_parser.add_argument('--json', type=str, help='Also write the results to this JSON file')
+    
+    args = parser.parse_args()
+    
+    if args.command in ('build', 'report'):
+        index_params = {"type": getattr(args, 'index_type', 'flat'), "nlist": args.nlist, "hnsw_m": args.hnsw_m,
+                        "pq_m": args.pq_m, "pq_bits": args.pq_bits}
+    
+    if args.command == 'build':
+        chunk_options = {"max_tokens": args.max_tokens or DEFAULT_MAX_TOKENS, "overlap": args.overlap}
+        if not args.whitespace_tokens:
+            # Count the model's own word pieces, so no chunk is truncated when it is embedded
+            model = SentenceTransformer(args.model)
+            chunk_options["token_offsets"] = tokenizer_token_offsets(model.tokenizer)
+            # Leave room for the [CLS]/[SEP] tokens the model adds
+            model_limit = model.max_seq_length - 2
+            chunk_options["max_tokens"] = min(args.max_tokens or model_limit, model_limit)
+        chunker = lambda text: chunk_markdown(text, **chunk_options)
+        runner = EmbeddingRunner(args.model, workers=args.workers, batch_size=args.batch_size)
+        try:
+            build_index(args.data, args.index, args.model, args.cache, args.full, index_params, args.train_sample,
+                        chunker, runner)
+        finally:
+            runner.close()
+    elif args.command == 'report':
+        vectors = load_index_vectors(args.index, args.cache)
+        print(f"Comparing index types on {len(vectors)} vectors with {args.queries} queries")
+        results = recall_latency_report(vectors, args.types, index_params, args.queries, args.k)
+        print_report(results, args.k)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump({"vectors": len(vectors), "k": args.k, "results": results}, f, indent=2)
+    else:
+        search_index = SearchIndex(args.index)
+        for distance, record in search_index.search(args.text, args.k, args.nprobe, args.ef_search):
+            print(f"{distance:.4f}  {record['path']} (chunk {record['chunk']})")
+            print(f"    {record['text'][:200]}")
+        search_index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+
+# Chunks pulled from the input stream and encoded together
+DEFAULT_BLOCK_SIZE = 4096
+
+# Upper bound on chunks per model call, and on characters per batch; batches of
+# long chunks shrink so each call pads to roughly the same amount of work
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_BATCH_CHARS = 64 * 1000
+
+# Model loaded once in each worker process
+_worker_model = None
+
+
+def _init_worker(model_name, threads):
+    """Load the model in a worker process and share the cores between workers"""
+    global _worker_model
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from sentence_transformers import SentenceTransformer
+    _worker_model = SentenceTransformer(model_name)
+
+
+def _encode_in_worker(texts):
+    return _worker_model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+
+
+def plan_batches(lengths, batch_size=DEFAULT_BATCH_SIZE, batch_chars=DEFAULT_BATCH_CHARS):
+    """
+    Group items into batches of similar length
+    Items are sorted by length, so each batch pads to a length close to its
+    own items; a batch holds at most batch_size items and about batch_chars characters
+    Returns: list of batches, each a list of item positions
+    """
+    order = sorted(range(len(lengths)), key=lambda position: lengths[position])
+    batches = []
+    batch = []
+    for position in order:
+        # Items are ascending, so the newest item is the batch's longest
+        longest = max(1, lengths[position])
+        if batch and (len(batch) >= batch_size or (len(batch) + 1) * longest > batch_chars):
+            batches.append(batch)
+            batch = []
+        batch.append(position)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class EmbeddingRunner:
+    """
+    Encodes a stream of (key, text) pairs in fixed-size blocks, so memory is
+    bounded by the block size rather than the corpus. Within a block, chunks
+    are sorted by length into adaptive batches and, with workers > 1, spread
+    over a pool of CPU processes that each hold a copy of the model.
+    """
+    
+    def __init__(self, model_name, workers=1, batch_size=DEFAULT_BATCH_SIZE, block_size=DEFAULT_BLOCK_SIZE,
+                 batch_chars=DEFAULT_BATCH_CHARS):
+        self.model_name = model_name
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.block_size = block_size
+        self.batch_chars = batch_chars
+        self.model = None
+        self.pool = None
+        self.encoded = 0
+        self.seconds = 0.0
+    
+    def _encode_batches(self, batches):
+        """Encode a list of text batches, returning one array per batch in order"""
+        if self.workers > 1:
+            if self.pool is None:
+                threads = max(1, (os.cpu_count() or 1) // self.workers)
+                print(f"Starting {self.workers} embedding workers with {threads} threads each...")
+                self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                initargs=(self.model_name, threads))
+            return list(self.pool.map(_encode_in_worker, batches))
+        
+        if self.model is None:
+            from sentence_transformers import SentenceTransformer
+            print(f"Loading embedding model {self.model_name}...")
+            self.model = SentenceTransformer(self.model_name)
+        return [self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True) for texts in batches]
+    
+    def encode_stream(self, items):
+        """
+        Encode (key, text) pairs from any iterable
+        Yields: (list of keys, float32 array of vectors) per block, in input order
+        """
+        items = iter(items)
+        while True:
+            block = list(islice(items, self.block_size))
+            if not block:
+                return
+            
+            start = time.perf_counter()
+            batches = plan_batches([len(text) for _, text in block], self.batch_size, self.batch_chars)
+            results = self._encode_batches([[block[position][1] for position in batch] for batch in batches])
+            
+            # Put the vectors back in input order
+            vectors = None
+            for batch, batch_vectors in zip(batches, results):
+                if vectors is None:
+                    vectors = np.empty((len(block), batch_vectors.shape[1]), dtype=np.float32)
+                vectors[batch] = batch_vectors
+            
+            self.seconds += time.perf_counter() - start
+            self.encoded += len(block)
+            print(f"  Embedded {self.encoded} chunks ({self.throughput():.1f} chunks/s)")
+            yield [key for key, _ in block], vectors
+    
+    def throughput(self):
+        """Chunks encoded per second of encoding time so far"""
+        return self.encoded / self.seconds if self.seconds else 0.0
+    
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+
+# inotify event bits, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+DEFAULT_POLL_INTERVAL = 2.0
+
+
+def scan_tree(root, accept=None):
+    """
+    Stat every file under root without reading it
+    Returns: dict of path -> (mtime_ns, size) for paths that accept(path) allows
+    """
+    snapshot = {}
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            if accept and not accept(path):
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+def changed_paths(old_snapshot, new_snapshot):
+    """Paths that are new or whose mtime or size changed"""
+    return [path for path, signature in new_snapshot.items() if old_snapshot.get(path) != signature]
+
+
+class PollingWatcher:
+    """Detects changes by re-stating the tree every interval seconds"""
+    
+    def __init__(self, root, accept=None, interval=DEFAULT_POLL_INTERVAL, snapshot=None):
+        self.root = root
+        self.accept = accept
+        self.interval = interval
+        self.snapshot = snapshot if snapshot is not None else scan_tree(root, accept)
+    
+    def poll(self, timeout=None):
+        """
+        Wait for the next scan
+        Returns: (changed paths, whether a full resync is needed)
+        """
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        snapshot = scan_tree(self.root, self.accept)
+        changed = changed_paths(self.snapshot, snapshot)
+        self.snapshot = snapshot
+        return changed, False
+    
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Recursive inotify watch through libc, via ctypes.
+    Files are reported when closed after writing or renamed into place, so
+    half-written files are not picked up. New directories are watched as they appear.
+    """
+    
+    def __init__(self, root, accept=None):
+        self.root = root
+        self.accept = accept
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_init1 failed: {os.strerror(error)}")
+        self.directories = {}
+        self.pending = []
+        for directory, dirnames, _ in os.walk(root):
+            dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+            self.add_watch(directory)
+    
+    def add_watch(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOENT:
+                return
+            raise OSError(error, f"inotify_add_watch failed for {directory}: {os.strerror(error)}")
+        self.directories[wd] = directory
+    
+    def watch_new_directory(self, directory):
+        """Watch a directory created after startup and report files that landed before the watch"""
+        for subdirectory, dirnames, filenames in os.walk(directory):
+            dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+            self.add_watch(subdirectory)
+            for filename in filenames:
+                path = os.path.join(subdirectory, filename)
+                if not self.accept or self.accept(path):
+                    self.pending.append(path)
+    
+    def poll(self, timeout=None):
+        """
+        Wait up to timeout seconds for events
+        Returns: (changed paths, whether a full resync is needed after a queue overflow)
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        changed, self.pending = self.pending, []
+        resync = False
+        if not readable:
+            return changed, resync
+        
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return changed, resync
+        
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            
+            if mask & IN_Q_OVERFLOW:
+                resync = True
+                continue
+            if mask & (IN_IGNORED | IN_DELETE_SELF):
+                self.directories.pop(wd, None)
+                continue
+            directory = self.directories.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not name.startswith("."):
+                    self.watch_new_directory(path)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                if not self.accept or self.accept(path):
+                    changed.append(path)
+        
+        changed.extend(self.pending)
+        self.pending = []
+        return changed, resync
+    
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def make_watcher(root, accept=None, force_polling=False, interval=DEFAULT_POLL_INTERVAL, snapshot=None):
+    """
+    Watch root with inotify where the platform has it, polling otherwise
+    snapshot seeds the polling watcher so changes since it was taken are reported
+    """
+    if not force_polling and hasattr(select, "select") and os.name == "posix":
+        try:
+            return InotifyWatcher(root, accept)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}); polling every {interval}s instead")
+    return PollingWatcher(root, accept, interval, snapshot)
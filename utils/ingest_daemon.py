@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import time
+import queue
+import sqlite3
+import argparse
+import threading
+
+from convert_tweets_to_markdown import (MANIFEST_FILENAME, convert_json_file, load_manifest, record_page_metrics,
+                                        save_manifest)
+from file_watcher import DEFAULT_POLL_INTERVAL, changed_paths, make_watcher, scan_tree
+from metrics import METRICS, add_metrics_arguments, configure_metrics, finish_metrics
+from openai_uploader import DEFAULT_REQUESTS_PER_SECOND, DEFAULT_WORKERS, OpenAIUploadClient, Uploader
+from upload_ledger import DEFAULT_LEDGER_PATH, REPO_ROOT, hash_file, open_ledger
+
+
+DATA_DIR = os.path.join(REPO_ROOT, "data")
+DEFAULT_STATE_PATH = os.path.join(DATA_DIR, "ingest_state.sqlite3")
+DEFAULT_STORE = "Policy Explorer"
+
+# Items each stage queue holds before the stage feeding it blocks
+DEFAULT_QUEUE_SIZE = 256
+
+# File IDs attached per file-batch request, and the longest an upload waits to be attached
+DEFAULT_ATTACH_BATCH = 100
+DEFAULT_ATTACH_INTERVAL = 10.0
+ATTACH_RETRY_DELAY = 30.0
+
+# Attach requests a file may fail before it is parked until the daemon restarts
+MAX_ATTACH_ATTEMPTS = 5
+
+# Seconds a stage waits on its queue before checking for shutdown
+QUEUE_TIMEOUT = 0.5
+
+TWEET_PAGE_PATTERN = re.compile(r"^tweets/[^/]+/json/\d+\.json$")
+TWEET_MARKDOWN_PATTERN = re.compile(r"^tweets/[^/]+/markdown/[^/.][^/]*\.md$")
+VIDEO_MARKDOWN_PATTERN = re.compile(r"^youtube/[^/]+/[^/.][^/]*\.md$")
+
+# Upload purposes used by the batch upload scripts
+TWEET_PURPOSE = "vector_store"
+VIDEO_PURPOSE = "assistants"
+
+STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    rel_path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pending_attach (
+    file_id TEXT PRIMARY KEY,
+    rel_path TEXT NOT NULL
+);
+"""
+
+
+class IngestState:
+    """
+    SQLite record of the daemon's progress, so a restart resumes where it stopped.
+    files holds the mtime and size of each data file as of its last successful
+    stage; pending_attach holds uploads not yet attached to the vector store.
+    """
+    
+    def __init__(self, state_path, data_dir):
+        os.makedirs(os.path.dirname(os.path.abspath(state_path)), exist_ok=True)
+        self.data_dir = data_dir
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(state_path, check_same_thread=False)
+        self.connection.executescript(STATE_SCHEMA)
+    
+    def rel_path(self, path):
+        return os.path.relpath(path, self.data_dir).replace(os.sep, "/")
+    
+    def snapshot(self):
+        """Returns: dict of absolute path -> (mtime_ns, size) for every processed file"""
+        with self.lock:
+            rows = self.connection.execute("SELECT rel_path, mtime_ns, size FROM files").fetchall()
+        return {os.path.join(self.data_dir, rel_path): (mtime_ns, size) for rel_path, mtime_ns, size in rows}
+    
+    def mark_done(self, path, signature):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO files (rel_path, mtime_ns, size) VALUES (?, ?, ?)",
+                (self.rel_path(path), signature[0], signature[1])
+            )
+    
+    def mark_all_done(self, snapshot):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO files (rel_path, mtime_ns, size) VALUES (?, ?, ?)",
+                [(self.rel_path(path), mtime_ns, size) for path, (mtime_ns, size) in snapshot.items()]
+            )
+    
+    def pending_attachments(self):
+        with self.lock:
+            return [row[0] for row in self.connection.execute("SELECT file_id FROM pending_attach")]
+    
+    def add_pending_attachment(self, file_id, path):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO pending_attach (file_id, rel_path) VALUES (?, ?)",
+                (file_id, self.rel_path(path))
+            )
+    
+    def remove_pending_attachments(self, file_ids):
+        with self.lock, self.connection:
+            self.connection.executemany("DELETE FROM pending_attach WHERE file_id = ?",
+                                        [(file_id,) for file_id in file_ids])
+    
+    def close(self):
+        self.connection.close()
+
+
+class WorkQueue:
+    """
+    Bounded queue that coalesces repeated submissions of the same item.
+    An item already waiting is not queued twice, and an item resubmitted while
+    a worker holds it is queued again only once that worker calls done, so two
+    workers never handle the same file at once.
+    put blocks while the queue is full, which is what pushes back on the
+    stage (or the watcher) feeding it.
+    """
+    
+    def __init__(self, maxsize=DEFAULT_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize)
+        self.waiting = set()
+        self.active = set()
+        self.resubmitted = set()
+        self.lock = threading.Lock()
+    
+    def put(self, item, stop_event=None):
+        with self.lock:
+            if item in self.active:
+                self.resubmitted.add(item)
+                return False
+            if item in self.waiting:
+                return False
+            self.waiting.add(item)
+        while True:
+            try:
+                self.queue.put(item, timeout=QUEUE_TIMEOUT)
+                return True
+            except queue.Full:
+                if stop_event is not None and stop_event.is_set():
+                    with self.lock:
+                        self.waiting.discard(item)
+                    return False
+    
+    def get(self, timeout=QUEUE_TIMEOUT):
+        """Returns: the next item, or None after timeout seconds"""
+        try:
+            item = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        with self.lock:
+            self.waiting.discard(item)
+            self.active.add(item)
+        return item
+    
+    def done(self, item, stop_event=None):
+        """Release an item taken with get, queueing it again if it was resubmitted meanwhile"""
+        with self.lock:
+            self.active.discard(item)
+            resubmitted = item in self.resubmitted
+            self.resubmitted.discard(item)
+        if resubmitted:
+            self.put(item, stop_event)
+    
+    def __len__(self):
+        return self.queue.qsize()
+
+
+class VectorStoreAttacher:
+    """Attaches uploaded files to a vector store, found by name on first use"""
+    
+    def __init__(self, client, store_name):
+        self.client = client
+        self.store_name = store_name
+        self.vector_store_id = None
+    
+    def batch_file_statuses(self, batch_id):
+        """Returns: dict mapping the file IDs of a file batch to their status ("completed", "failed", ...)"""
+        statuses = {}
+        # Iterating the page follows the pagination cursor through the whole listing
+        for vector_store_file in self.client.vector_stores.file_batches.list_files(
+                batch_id=batch_id, vector_store_id=self.vector_store_id, limit=100):
+            statuses[vector_store_file.id] = vector_store_file.status
+        return statuses
+    
+    def attach(self, file_ids):
+        """
+        Attach files in one file batch
+        Only the files the batch listing reports as completed count as attached,
+        whatever the status of the batch as a whole.
+        Returns: set of the file IDs that were attached
+        """
+        if self.vector_store_id is None:
+            store = next((vs for vs in self.client.vector_stores.list().data if vs.name == self.store_name), None)
+            if store is None:
+                raise RuntimeError(f"Vector store '{self.store_name}' not found")
+            self.vector_store_id = store.id
+        with METRICS.timer("attach"):
+            batch = self.client.vector_stores.file_batches.create_and_poll(
+                vector_store_id=self.vector_store_id,
+                file_ids=list(file_ids)
+            )
+        with METRICS.timer("fetch"):
+            statuses = self.batch_file_statuses(batch.id)
+        attached = {file_id for file_id in file_ids if statuses.get(file_id) == "completed"}
+        METRICS.count("items_total", len(attached), stage="attach", outcome="attached")
+        METRICS.count("items_total", len(file_ids) - len(attached), stage="attach", outcome="failed")
+        return attached
+
+
+class IngestPipeline:
+    """
+    Watches the data directory and pushes changed files through
+    convert -> upload -> attach, one thread (or pool) per stage, joined by
+    bounded queues.
+    
+    Raw tweet pages are converted to markdown; tweet and video markdown is
+    uploaded if its content is not already in the upload ledger; new uploads
+    are attached to the vector store in file batches. A file is recorded in the
+    state once its stage succeeds, so after a restart only files that changed
+    since (or never finished) are processed again.
+    """
+    
+    def __init__(self, data_dir, state, ledger, uploader, attacher=None, queue_size=DEFAULT_QUEUE_SIZE,
+                 upload_workers=DEFAULT_WORKERS, attach_batch=DEFAULT_ATTACH_BATCH,
+                 attach_interval=DEFAULT_ATTACH_INTERVAL):
+        self.data_dir = data_dir
+        self.tweets_dir = os.path.join(data_dir, "tweets")
+        self.state = state
+        self.ledger = ledger
+        self.uploader = uploader
+        self.attacher = attacher
+        self.upload_workers = max(1, upload_workers)
+        self.attach_batch = attach_batch
+        self.attach_interval = attach_interval
+        self.convert_queue = WorkQueue(queue_size)
+        self.upload_queue = WorkQueue(queue_size)
+        self.attach_queue = WorkQueue(queue_size)
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.stats_lock = threading.Lock()
+        self.stats = {"converted": 0, "uploaded": 0, "skipped": 0, "attached": 0, "errors": 0}
+        
+        self.manifest_path = os.path.join(self.tweets_dir, MANIFEST_FILENAME)
+        self.manifest = load_manifest(self.manifest_path)
+        self.known_by_user = {}
+        for key, entry in self.manifest.items():
+            username, tweet_id = key.split("/", 1)
+            self.known_by_user.setdefault(username, {})[tweet_id] = entry.get("hash")
+    
+    def accept(self, path):
+        return self.route(path) is not None
+    
+    def route(self, path):
+        """The queue a data file belongs in, or None for files the pipeline ignores"""
+        rel_path = os.path.relpath(path, self.data_dir).replace(os.sep, "/")
+        if TWEET_PAGE_PATTERN.match(rel_path):
+            return self.convert_queue
+        if TWEET_MARKDOWN_PATTERN.match(rel_path) or VIDEO_MARKDOWN_PATTERN.match(rel_path):
+            return self.upload_queue
+        return None
+    
+    def submit(self, paths):
+        for path in paths:
+            target = self.route(path)
+            if target is not None:
+                target.put(path, self.stop_event)
+    
+    def count(self, name, amount=1):
+        with self.stats_lock:
+            self.stats[name] += amount
+    
+    @staticmethod
+    def signature(path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    
+    def convert_stage(self):
+        while not self.stop_event.is_set():
+            path = self.convert_queue.get()
+            if path is None:
+                continue
+            try:
+                self.convert_page(path)
+            except Exception as e:
+                print(f"Error converting {path}: {e}")
+                self.count("errors")
+            finally:
+                self.convert_queue.done(path, self.stop_event)
+    
+    def convert_page(self, path):
+        """Convert a changed tweet page and queue the markdown files whose content changed"""
+        try:
+            signature = self.signature(path)
+        except FileNotFoundError:
+            return
+        
+        username = os.path.basename(os.path.dirname(os.path.dirname(path)))
+        known_hashes = self.known_by_user.setdefault(username, {})
+        result = convert_json_file(path, self.tweets_dir, known_hashes)
+        record_page_metrics(result)
+        if result["error"]:
+            self.count("errors")
+            return
+        
+        changed = [tweet_id for tweet_id, content_hash in result["entries"].items()
+                   if known_hashes.get(tweet_id) != content_hash]
+        source = os.path.relpath(path, self.tweets_dir)
+        for tweet_id, content_hash in result["entries"].items():
+            known_hashes[tweet_id] = content_hash
+            self.manifest[f"{username}/{tweet_id}"] = {"source": source, "hash": content_hash}
+        save_manifest(self.manifest_path, self.manifest)
+        self.state.mark_done(path, signature)
+        self.count("converted")
+        METRICS.progress(f"Converted {path}: {len(changed)} of {len(result['entries'])} tweets changed")
+        
+        self.submit(os.path.join(self.tweets_dir, username, "markdown", f"{tweet_id}.md") for tweet_id in changed)
+    
+    def upload_stage(self):
+        while not self.stop_event.is_set():
+            path = self.upload_queue.get()
+            if path is None:
+                continue
+            try:
+                self.upload_file(path)
+            except Exception as e:
+                print(f"Error uploading {path}: {e}")
+                self.count("errors")
+            finally:
+                self.upload_queue.done(path, self.stop_event)
+    
+    def upload_file(self, path):
+        """Upload a markdown file unless its content is already in the ledger, then queue it for attaching"""
+        try:
+            signature = self.signature(path)
+            content_hash = hash_file(path)
+        except FileNotFoundError:
+            return
+        
+        if self.ledger.is_uploaded(path, content_hash):
+            self.count("skipped")
+            METRICS.count("items_total", stage="upload", outcome="skipped")
+            self.state.mark_done(path, signature)
+            return
+        
+        rel_path = os.path.relpath(path, self.data_dir).replace(os.sep, "/")
+        purpose = TWEET_PURPOSE if rel_path.startswith("tweets/") else VIDEO_PURPOSE
+        file_id = self.uploader.upload_one(path, purpose)
+        if not file_id:
+            # Left out of the state, so the next start retries it
+            self.count("errors")
+            return
+        
+        self.ledger.record(path, file_id, content_hash)
+        self.state.mark_done(path, signature)
+        self.count("uploaded")
+        if self.attacher is not None:
+            self.state.add_pending_attachment(file_id, path)
+            self.attach_queue.put(file_id, self.stop_event)
+    
+    def attach_stage(self):
+        """
+        Attach uploaded files in batches, flushing when a batch fills or attach_interval passes
+        Files that fail go to the back of the queue; after MAX_ATTACH_ATTEMPTS failures a file
+        is parked, left in the state for the next start but no longer retried by this run.
+        """
+        pending = self.state.pending_attachments()
+        attempts = {}
+        first_pending = time.monotonic() if pending else None
+        retry_at = 0.0
+        while not self.stop_event.is_set():
+            file_id = self.attach_queue.get()
+            if file_id is not None:
+                self.attach_queue.done(file_id)
+                if file_id not in pending:
+                    pending.append(file_id)
+                first_pending = first_pending or time.monotonic()
+            
+            now = time.monotonic()
+            due = len(pending) >= self.attach_batch or (
+                pending and now - first_pending >= self.attach_interval)
+            if not due or now < retry_at:
+                continue
+            
+            batch = pending[:self.attach_batch]
+            try:
+                attached = self.attacher.attach(batch)
+            except Exception as e:
+                print(f"Error attaching {len(batch)} files: {e}")
+                attached = set()
+            
+            failed = [file_id for file_id in batch if file_id not in attached]
+            retry = []
+            for file_id in failed:
+                attempts[file_id] = attempts.get(file_id, 0) + 1
+                if attempts[file_id] < MAX_ATTACH_ATTEMPTS:
+                    retry.append(file_id)
+                else:
+                    print(f"Giving up on attaching {file_id} after {attempts[file_id]} attempts until restart")
+                    del attempts[file_id]
+            pending = pending[len(batch):] + retry
+            first_pending = time.monotonic() if pending else None
+            
+            if failed:
+                self.count("errors", len(failed))
+            if not attached:
+                retry_at = now + ATTACH_RETRY_DELAY
+                continue
+            
+            self.state.remove_pending_attachments(attached)
+            for file_id in attached:
+                attempts.pop(file_id, None)
+            self.count("attached", len(attached))
+            METRICS.progress(f"Attached {len(attached)} of {len(batch)} files to the vector store")
+    
+    def start(self):
+        stages = [self.convert_stage] + [self.upload_stage] * self.upload_workers
+        if self.attacher is not None:
+            stages.append(self.attach_stage)
+        for stage in stages:
+            thread = threading.Thread(target=stage, name=stage.__name__, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+    
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+    
+    def resync(self):
+        """Queue every file that changed since it was last processed"""
+        changed = changed_paths(self.state.snapshot(), scan_tree(self.data_dir, self.accept))
+        if changed:
+            print(f"Queueing {len(changed)} files changed since the last run")
+        self.submit(sorted(changed))
+    
+    def run(self, watcher, status_interval=60.0, metrics_path=None):
+        """
+        Process changes reported by watcher until interrupted
+        With metrics_path, the metrics are exported there every status_interval seconds
+        """
+        self.start()
+        self.resync()
+        last_status = time.monotonic()
+        try:
+            while True:
+                changed, resync = watcher.poll(timeout=1.0)
+                if resync:
+                    print("Watch queue overflowed; rescanning for changes")
+                    self.resync()
+                self.submit(changed)
+                if time.monotonic() - last_status >= status_interval:
+                    last_status = time.monotonic()
+                    with self.stats_lock:
+                        counts = ", ".join(f"{name} {count}" for name, count in self.stats.items())
+                    print(f"Status: {counts}; queued convert {len(self.convert_queue)}, "
+                          f"upload {len(self.upload_queue)}, attach {len(self.attach_queue)}")
+                    if metrics_path:
+                        METRICS.export(metrics_path)
+        except KeyboardInterrupt:
+            print("\nStopping...")
+        finally:
+            watcher.close()
+            self.stop()
+
+
+def main():
+    """Watch the data directory and ingest new files as they land"""
+    parser = argparse.ArgumentParser(description='Convert, upload and attach new data files as they appear')
+    parser.add_argument('--data', type=str, help='Data directory to watch', default=DATA_DIR)
+    parser.add_argument('--state', type=str, help='Daemon state database', default=DEFAULT_STATE_PATH)
+    parser.add_argument('--ledger', type=str, help='Upload ledger', default=DEFAULT_LEDGER_PATH)
+    parser.add_argument('--store', type=str, help='Vector store to attach uploads to', default=DEFAULT_STORE)
+    parser.add_argument('--no-attach', action='store_true', help='Upload without attaching to a vector store')
+    parser.add_argument('--poll', action='store_true', help='Poll for changes instead of using inotify')
+    parser.add_argument('--interval', type=float, help='Polling interval in seconds', default=DEFAULT_POLL_INTERVAL)
+    parser.add_argument('--queue-size', type=int, help='Items buffered between stages', default=DEFAULT_QUEUE_SIZE)
+    parser.add_argument('--upload-workers', type=int, help='Concurrent uploads', default=DEFAULT_WORKERS)
+    parser.add_argument('--rate', type=float, help='Maximum upload requests per second (0 disables)',
+                        default=DEFAULT_REQUESTS_PER_SECOND)
+    parser.add_argument('--attach-batch', type=int, help='Files per attach request', default=DEFAULT_ATTACH_BATCH)
+    parser.add_argument('--attach-interval', type=float, help='Longest wait before attaching a partial batch',
+                        default=DEFAULT_ATTACH_INTERVAL)
+    parser.add_argument('--baseline', action='store_true',
+                        help='Record the current files as already processed and exit')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    configure_metrics(args)
+    
+    state = IngestState(args.state, args.data)
+    
+    if args.baseline:
+        pipeline = IngestPipeline(args.data, state, None, None)
+        snapshot = scan_tree(args.data, pipeline.accept)
+        state.mark_all_done(snapshot)
+        print(f"Recorded {len(snapshot)} files as processed")
+        state.close()
+        return
+    
+    from openai import OpenAI
+    client = OpenAI()
+    ledger = open_ledger(args.ledger)
+    uploader = Uploader(OpenAIUploadClient(client), workers=args.upload_workers, requests_per_second=args.rate)
+    attacher = None if args.no_attach else VectorStoreAttacher(client, args.store)
+    
+    pipeline = IngestPipeline(args.data, state, ledger, uploader, attacher, args.queue_size, args.upload_workers,
+                              args.attach_batch, args.attach_interval)
+    watcher = make_watcher(args.data, pipeline.accept, args.poll, args.interval, state.snapshot())
+    print(f"Watching {args.data} with {type(watcher).__name__}")
+    try:
+        pipeline.run(watcher, metrics_path=args.metrics)
+    finally:
+        ledger.close()
+        state.close()
+        finish_metrics(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import langdetect
+from langdetect import DetectorFactory, detector_factory
+
+
+# Default location of the persisted language cache
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "language_cache.json")
+
+# Maximum number of texts kept in the LRU cache
+DEFAULT_CACHE_SIZE = 10000
+
+# langdetect is only deterministic between calls with a fixed seed
+DEFAULT_SEED = 0
+
+# Guards the one-time loading of langdetect's shared language profiles
+_FACTORY_LOCK = threading.Lock()
+
+FRENCH_ACCENTS = re.compile(r'[éèêëàâäôöûüçîï]', re.IGNORECASE)
+
+
+def guess_language_from_accents(text):
+    """Fallback guess: 'fr' if the text contains French accents, 'en' otherwise"""
+    return 'fr' if FRENCH_ACCENTS.search(text) else 'en'
+
+
+def detect_language_uncached(text):
+    """
+    Detect the language of a text without going through the cache
+    Returns a language code such as 'en' or 'fr'
+    """
+    # Skip detection for very short texts (less than 5 words)
+    word_count = len(text.split())
+    if word_count < 5:
+        # For very short texts, rely on accents as a stronger signal
+        return guess_language_from_accents(text)
+    
+    try:
+        return langdetect.detect(text)
+    except Exception:
+        # If language detection fails, check for French accents
+        return guess_language_from_accents(text)
+
+
+def init_langdetect():
+    """
+    Load langdetect's language profiles if no detection has loaded them yet
+    langdetect builds its global factory lazily on the first detect() call and
+    publishes it before the profiles are loaded, so threads racing through that
+    first call can classify against a partial profile set.
+    """
+    with _FACTORY_LOCK:
+        detector_factory.init_factory()
+
+
+class LanguageDetector:
+    """
+    Seeded langdetect wrapper with an LRU cache that can be saved to disk.
+    Safe to share between threads: langdetect's profiles are loaded up front,
+    before any thread calls detect().
+    """
+    
+    def __init__(self, cache_path=None, max_size=DEFAULT_CACHE_SIZE, seed=DEFAULT_SEED):
+        DetectorFactory.seed = seed
+        init_langdetect()
+        self.cache_path = cache_path
+        self.max_size = max_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.dirty = False
+        
+        if cache_path:
+            self.load(cache_path)
+    
+    def _get(self, text):
+        with self.lock:
+            language = self.cache.get(text)
+            if language is not None:
+                self.cache.move_to_end(text)
+            return language
+    
+    def _put(self, text, language):
+        with self.lock:
+            self.cache[text] = language
+            self.cache.move_to_end(text)
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+            self.dirty = True
+    
+    def detect(self, text):
+        """Detect the language of a single text, using the cache when possible"""
+        language = self._get(text)
+        if language is None:
+            language = detect_language_uncached(text)
+            self._put(text, language)
+        return language
+    
+    def detect_batch(self, texts):
+        """
+        Detect the language of many texts in one call
+        Each distinct uncached text is classified once
+        Returns: list of language codes in the same order as texts
+        """
+        results = {}
+        for text in texts:
+            if text not in results:
+                results[text] = self._get(text)
+        
+        for text, language in results.items():
+            if language is None:
+                results[text] = detect_language_uncached(text)
+                self._put(text, results[text])
+        
+        return [results[text] for text in texts]
+    
+    def load(self, cache_path):
+        """Load cached results from a JSON file, if it exists"""
+        if not os.path.exists(cache_path):
+            return
+        
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error reading language cache {cache_path}: {e}")
+            return
+        
+        with self.lock:
+            # Entries are stored oldest first, so the most recent end up last
+            for text, language in entries:
+                self.cache[text] = language
+                self.cache.move_to_end(text)
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+    
+    def save(self, cache_path=None):
+        """Write the cache to disk if it changed since it was loaded"""
+        cache_path = cache_path or self.cache_path
+        if not cache_path or not self.dirty:
+            return
+        
+        with self.lock:
+            entries = list(self.cache.items())
+            self.dirty = False
+        
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
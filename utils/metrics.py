@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import bisect
+import threading
+import contextlib
+from datetime import datetime
+
+
+# Prefix of every exported metric name
+METRIC_PREFIX = "pipeline_"
+
+# Upper bounds, in seconds, of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+                   60.0)
+
+# Pipeline stages the scripts report on
+STAGES = ("fetch", "parse", "render", "write", "upload", "attach")
+
+# Help text for the metrics the scripts record
+DESCRIPTIONS = {
+    "stage_seconds": "Seconds spent on one operation of a pipeline stage",
+    "items_total": "Items handled by a pipeline stage, by outcome",
+    "retries_total": "Requests retried by a pipeline stage",
+}
+
+
+class Histogram:
+    """Bucketed distribution of observed values, with count and sum"""
+    
+    __slots__ = ("bounds", "buckets", "count", "sum")
+    
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = bounds
+        # One bucket per bound, plus one for values above the largest bound
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+    
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+    
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket it falls in"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+def format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def finite(value):
+    return None if value is None or value == float("inf") else value
+
+
+def format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """
+    Thread-safe counters and latency histograms, labelled by pipeline stage.
+    Scripts record into the shared METRICS instance below and export it as
+    Prometheus text or JSON lines when they finish. In quiet mode, per-file
+    progress messages sent through progress() are dropped.
+    """
+    
+    def __init__(self, quiet=False, buckets=DEFAULT_BUCKETS):
+        self.quiet = quiet
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.time()
+    
+    @staticmethod
+    def key(name, labels):
+        return name, tuple(sorted(labels.items()))
+    
+    def count(self, name, amount=1, **labels):
+        """Add amount to a counter"""
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+    
+    def observe(self, name, value, **labels):
+        """Record one value in a histogram"""
+        key = self.key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+    
+    @contextlib.contextmanager
+    def timer(self, stage, **labels):
+        """Time the enclosed block as one operation of a stage, recorded in stage_seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, stage=stage, **labels)
+    
+    def value(self, name, **labels):
+        """Current value of a counter (0 if it was never incremented)"""
+        with self.lock:
+            return self.counters.get(self.key(name, labels), 0)
+    
+    def progress(self, message):
+        """Print a per-item progress message unless in quiet mode"""
+        if not self.quiet:
+            print(message)
+    
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+    
+    def prometheus_text(self):
+        """Returns: every metric in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, (list(h.buckets), h.count, h.sum)) for key, h in self.histograms.items())
+        
+        described = set()
+        
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in DESCRIPTIONS:
+                    lines.append(f"# HELP {METRIC_PREFIX}{name} {DESCRIPTIONS[name]}")
+                lines.append(f"# TYPE {METRIC_PREFIX}{name} {kind}")
+        
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{METRIC_PREFIX}{name}{format_labels(labels)} {format_number(value)}")
+        
+        for (name, labels), (buckets, count, total) in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),), buckets):
+                cumulative += bucket
+                lines.append(f"{METRIC_PREFIX}{name}_bucket{format_labels(labels, ('le', format_number(bound)))} "
+                             f"{cumulative}")
+            lines.append(f"{METRIC_PREFIX}{name}_sum{format_labels(labels)} {format_number(total)}")
+            lines.append(f"{METRIC_PREFIX}{name}_count{format_labels(labels)} {count}")
+        
+        return "\n".join(lines) + "\n"
+    
+    def records(self):
+        """Returns: one dict per metric, as written to a JSON lines file"""
+        now = datetime.now().isoformat(timespec="seconds")
+        script = os.path.basename(sys.argv[0])
+        records = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                records.append({"time": now, "script": script, "metric": METRIC_PREFIX + name, "type": "counter",
+                                "labels": dict(labels), "value": value})
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                records.append({
+                    "time": now,
+                    "script": script,
+                    "metric": METRIC_PREFIX + name,
+                    "type": "histogram",
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": round(histogram.sum, 6),
+                    "p50": finite(histogram.quantile(0.5)),
+                    "p99": finite(histogram.quantile(0.99)),
+                    "buckets": dict(zip([format_number(b) for b in self.buckets + (float("inf"),)],
+                                        histogram.buckets)),
+                })
+        return records
+    
+    def export(self, path):
+        """
+        Write the metrics to path: Prometheus text for .prom/.txt files (replaced
+        atomically, as the node exporter's textfile collector expects), otherwise
+        one JSON object per metric appended to a JSON lines file
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        if path.endswith((".prom", ".txt")):
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp_path, path)
+        else:
+            with open(path, 'a', encoding='utf-8') as f:
+                for record in self.records():
+                    f.write(json.dumps(record) + "\n")
+    
+    def report(self):
+        """Print operation counts, time and rates for each stage that recorded any"""
+        with self.lock:
+            timings = sorted(
+                (dict(labels).get("stage", name), histogram.count, histogram.sum, histogram.quantile(0.5),
+                 histogram.quantile(0.99))
+                for (name, labels), histogram in self.histograms.items() if name == "stage_seconds"
+            )
+        if not timings:
+            return
+        print("\nStage timings:")
+        for stage, count, total, p50, p99 in timings:
+            rate = count / total if total else 0.0
+            print(f"  - {stage}: {count} operations in {total:.2f}s ({rate:.1f}/s, "
+                  f"p50 {self.format_quantile(p50)}, p99 {self.format_quantile(p99)})")
+    
+    def format_quantile(self, value):
+        """'<= <bucket bound>ms', or '> <largest bound>ms' for values past the last bucket"""
+        if value == float("inf"):
+            return f"> {self.buckets[-1] * 1000:g}ms"
+        return f"<= {value * 1000:g}ms"
+
+
+METRICS = Metrics()
+
+
+def add_metrics_arguments(parser):
+    """Add the shared --quiet and --metrics options to a script's argument parser"""
+    parser.add_argument('--quiet', action='store_true',
+                        help='Drop per-file progress messages and only print summaries')
+    parser.add_argument('--metrics', type=str, default=None,
+                        help='Write stage timings and counters to this file '
+                             '(Prometheus text for .prom, otherwise JSON lines)')
+
+
+def configure_metrics(args):
+    METRICS.quiet = getattr(args, "quiet", False)
+
+
+def finish_metrics(args):
+    """Print the stage timings and export the metrics if --metrics was given"""
+    METRICS.report()
+    if getattr(args, "metrics", None):
+        METRICS.export(args.metrics)
+        print(f"Metrics written to {args.metrics}")
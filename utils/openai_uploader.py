@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import METRICS
+
+
+# Default number of uploads in flight
+DEFAULT_WORKERS = 4
+
+# Default sustained request rate and burst size of the token bucket
+DEFAULT_REQUESTS_PER_SECOND = 5.0
+DEFAULT_BURST = 5
+
+# Retry settings for rate-limited and server-side failures
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_BASE = 1.0
+DEFAULT_BACKOFF_MAX = 60.0
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class UploadError(Exception):
+    """
+    Failed upload, with the HTTP status code when there is one.
+    retryable marks failures that are worth retrying regardless of status
+    (e.g. connection errors); retry_after is the server's requested delay in seconds.
+    """
+    
+    def __init__(self, message, status_code=None, retryable=False, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable or status_code in RETRYABLE_STATUS_CODES
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter shared between threads.
+    Allows bursts of up to `capacity` requests, refilled at `rate` tokens per second.
+    A rate of 0 or less disables limiting.
+    """
+    
+    def __init__(self, rate=DEFAULT_REQUESTS_PER_SECOND, capacity=DEFAULT_BURST):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a token is available and take it"""
+        if not self.rate or self.rate <= 0:
+            return
+        
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class UploadClient(ABC):
+    """
+    Interface for the service files are uploaded to.
+    Implementations return the new file ID and raise UploadError on failure.
+    """
+    
+    @abstractmethod
+    def upload(self, file_path, purpose):
+        ...
+
+
+class OpenAIUploadClient(UploadClient):
+    """
+    Uploads through the OpenAI Files API.
+    Pass base_url (or set OPENAI_BASE_URL) to point it at a local fake server.
+    The SDK's own retries are turned off (also on a client passed in), so every
+    attempt goes through the Uploader's token bucket and backoff.
+    """
+    
+    def __init__(self, client=None, base_url=None):
+        import openai
+        
+        self.openai = openai
+        if client is None:
+            self.client = openai.OpenAI(base_url=base_url or os.getenv("OPENAI_BASE_URL"), max_retries=0)
+        else:
+            self.client = client.with_options(max_retries=0)
+    
+    def upload(self, file_path, purpose):
+        try:
+            with open(file_path, "rb") as file:
+                response = self.client.files.create(file=file, purpose=purpose)
+            return response.id
+        except self.openai.APIStatusError as e:
+            retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+            try:
+                retry_after = float(retry_after) if retry_after else None
+            except ValueError:
+                retry_after = None
+            raise UploadError(str(e), status_code=e.status_code, retry_after=retry_after) from e
+        except self.openai.APIConnectionError as e:
+            raise UploadError(str(e), retryable=True) from e
+
+
+class Uploader:
+    """
+    Uploads files with a bounded worker pool, a shared token-bucket rate
+    limit, and exponential backoff on 429 and 5xx responses.
+    """
+    
+    def __init__(self, client=None, workers=DEFAULT_WORKERS, requests_per_second=DEFAULT_REQUESTS_PER_SECOND,
+                 burst=DEFAULT_BURST, max_retries=DEFAULT_MAX_RETRIES, backoff_base=DEFAULT_BACKOFF_BASE,
+                 backoff_max=DEFAULT_BACKOFF_MAX):
+        self.client = client or OpenAIUploadClient()
+        self.workers = max(1, workers)
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+    
+    def backoff_delay(self, attempt, error=None):
+        """Delay before retry number `attempt` (starting at 0), with jitter"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        if error is not None and error.retry_after:
+            delay = max(delay, min(self.backoff_max, error.retry_after))
+        return delay
+    
+    def upload_one(self, file_path, purpose):
+        """
+        Upload a single file, retrying transient failures
+        Returns: the file ID, or None if the upload failed
+        """
+        METRICS.progress(f"Uploading {file_path}...")
+        
+        with METRICS.timer("upload"):
+            file_id = self._upload_with_retries(file_path, purpose)
+        METRICS.count("items_total", stage="upload", outcome="uploaded" if file_id else "failed")
+        return file_id
+    
+    def _upload_with_retries(self, file_path, purpose):
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                file_id = self.client.upload(file_path, purpose)
+                METRICS.progress(f"  > Uploaded {file_path} as {file_id}")
+                return file_id
+            except UploadError as e:
+                if not e.retryable or attempt == self.max_retries:
+                    print(f"  > Error uploading {file_path}: {e}")
+                    return None
+                delay = self.backoff_delay(attempt, e)
+                METRICS.count("retries_total", stage="upload")
+                print(f"  > Upload of {file_path} failed ({e.status_code or 'connection error'}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+            except Exception as e:
+                print(f"  > Error uploading {file_path}: {e}")
+                return None
+        
+        return None
+    
+    def upload_files(self, file_paths, purpose="assistants", on_uploaded=None):
+        """
+        Upload many files concurrently
+        on_uploaded(file_path, file_id) is called from the worker thread after each success
+        Returns: dict mapping each file path to its file ID (None for failures), in input order
+        """
+        # Iterated twice below, so a generator must not be consumed by the first pass
+        file_paths = list(file_paths)
+        
+        def upload(file_path):
+            file_id = self.upload_one(file_path, purpose)
+            if file_id and on_uploaded:
+                on_uploaded(file_path, file_id)
+            return file_id
+        
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            file_ids = list(executor.map(upload, file_paths))
+        
+        return dict(zip(file_paths, file_ids))
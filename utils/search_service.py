@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import json
+import math
+import time
+import argparse
+import threading
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from corpus import DEFAULT_CACHE_PATH, load_documents
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Default corpus and vector index locations
+DATA_DIR = os.path.join(REPO_ROOT, "data")
+INDEX_DIR = os.path.join(REPO_ROOT, "data", "index")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# BM25 term-frequency saturation and length normalisation
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Reciprocal-rank fusion constant; larger values flatten the weight of top ranks
+RRF_K = 60
+
+# Candidates fetched from each retriever before fusion, as a multiple of k
+FUSION_DEPTH = 5
+
+SEARCH_MODES = ("hybrid", "bm25", "vector")
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def normalize_candidate(name):
+    """Compare candidate names regardless of case, underscores or spacing"""
+    return " ".join(name.replace("_", " ").lower().split())
+
+
+class BM25Index:
+    """
+    In-memory inverted index scored with Okapi BM25.
+    Each term's postings are numpy arrays of document numbers and term
+    frequencies, so a query touches only the documents containing its terms.
+    """
+    
+    def __init__(self, documents, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        postings = defaultdict(lambda: ([], []))
+        lengths = []
+        for number, document in enumerate(documents):
+            counts = Counter(tokenize(document.title + "\n" + document.body))
+            lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                doc_numbers, frequencies = postings[term]
+                doc_numbers.append(number)
+                frequencies.append(count)
+        
+        self.lengths = np.asarray(lengths, dtype=np.float32)
+        self.average_length = float(self.lengths.mean()) if len(lengths) else 0.0
+        self.postings = {
+            term: (np.asarray(doc_numbers, dtype=np.int32), np.asarray(frequencies, dtype=np.float32))
+            for term, (doc_numbers, frequencies) in postings.items()
+        }
+    
+    def __len__(self):
+        return len(self.lengths)
+    
+    def scores(self, query):
+        """Score every document against a query; documents without a query term score 0"""
+        scores = np.zeros(len(self.lengths), dtype=np.float32)
+        if not self.average_length:
+            return scores
+        
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            doc_numbers, frequencies = self.postings[term]
+            idf = math.log(1 + (len(self.lengths) - len(doc_numbers) + 0.5) / (len(doc_numbers) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_numbers] / self.average_length)
+            scores[doc_numbers] += idf * frequencies * (self.k1 + 1) / (frequencies + norm)
+        return scores
+    
+    def search(self, query, k, mask=None):
+        """
+        Find the k best-scoring documents, optionally restricted to a boolean mask
+        Returns: list of (document number, score), best first
+        """
+        scores = self.scores(query)
+        if mask is not None:
+            scores[~mask] = 0
+        matches = np.flatnonzero(scores > 0)
+        if len(matches) > k:
+            matches = matches[np.argpartition(-scores[matches], k)[:k]]
+        matches = matches[np.argsort(-scores[matches], kind='stable')]
+        return [(int(number), float(scores[number])) for number in matches]
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Merge ranked lists of document numbers
+    Returns: list of (document number, fused score), best first
+    """
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, number in enumerate(ranking):
+            fused[number] += 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))
+
+
+class SearchService:
+    """
+    Local hybrid search over the markdown corpus.
+    BM25 always works; the FAISS index from embedding_index.py is added when
+    faiss, the embedding model and a built index are all available, and the
+    service falls back to BM25 alone otherwise.
+    """
+    
+    def __init__(self, data_dir=DATA_DIR, index_dir=INDEX_DIR, use_vectors=True, cache_path=DEFAULT_CACHE_PATH):
+        start = time.perf_counter()
+        self.documents = load_documents(data_dir, cache_path)
+        self.positions = {document.path: number for number, document in enumerate(self.documents)}
+        self.candidates = np.array([normalize_candidate(document.candidate) for document in self.documents])
+        self.dates = np.array([document.date for document in self.documents])
+        self.bm25 = BM25Index(self.documents)
+        print(f"Indexed {len(self.documents)} documents for BM25 in {time.perf_counter() - start:.2f}s")
+        
+        self.vector_index = None
+        self.vector_lock = threading.Lock()
+        if use_vectors:
+            self.vector_index = self._open_vector_index(index_dir)
+    
+    @staticmethod
+    def _open_vector_index(index_dir):
+        try:
+            from embedding_index import SearchIndex
+        except ImportError as e:
+            print(f"Vector search unavailable ({e}); using BM25 only")
+            return None
+        try:
+            vector_index = SearchIndex(index_dir)
+            # Load the model now so the first query is not slow
+            vector_index.encode(["warm up"])
+        except Exception as e:
+            print(f"Could not open the vector index in {index_dir} ({e}); using BM25 only")
+            return None
+        print(f"Opened vector index with {vector_index.info['chunks']} chunks")
+        return vector_index
+    
+    def filter_mask(self, candidate=None, since=None, until=None):
+        """
+        Documents matching the filters, or None when there are no filters
+        Dates are ISO strings, so they compare correctly as text
+        """
+        if not (candidate or since or until):
+            return None
+        mask = np.ones(len(self.documents), dtype=bool)
+        if candidate:
+            mask &= self.candidates == normalize_candidate(candidate)
+        if since:
+            mask &= self.dates >= since
+        if until:
+            mask &= self.dates <= until
+        return mask
+    
+    def vector_ranking(self, query, depth, mask):
+        """Rank documents by their closest chunk in the vector index"""
+        # Over-fetch chunks, since several may come from one document or be filtered out
+        fetch = depth * (4 if mask is None else 20)
+        with self.vector_lock:
+            hits = self.vector_index.search(query, fetch)
+        ranking = []
+        seen = set()
+        for _, record in hits:
+            number = self.positions.get(record["path"])
+            if number is None or number in seen or (mask is not None and not mask[number]):
+                continue
+            seen.add(number)
+            ranking.append(number)
+            if len(ranking) == depth:
+                break
+        return ranking
+    
+    def search(self, query, k=10, candidate=None, since=None, until=None, mode="hybrid"):
+        """
+        Search the corpus
+        mode is "hybrid" (BM25 and vectors fused by reciprocal rank), "bm25" or "vector";
+        hybrid and vector searches use BM25 alone when vectors are unavailable.
+        Returns: dict with the mode actually used, the time taken and the ranked results
+        """
+        start = time.perf_counter()
+        mask = self.filter_mask(candidate, since, until)
+        depth = k * FUSION_DEPTH
+        
+        rankings = []
+        used = []
+        if mode in ("hybrid", "vector") and self.vector_index is not None:
+            try:
+                rankings.append(self.vector_ranking(query, depth, mask))
+                used.append("vector")
+            except Exception as e:
+                print(f"Vector search failed ({e}); using BM25 only")
+        if mode == "bm25" or not used or mode == "hybrid":
+            rankings.append([number for number, _ in self.bm25.search(query, depth, mask)])
+            used.append("bm25")
+        
+        results = []
+        for number, score in reciprocal_rank_fusion(rankings)[:k]:
+            document = self.documents[number]
+            results.append({
+                "score": round(score, 6),
+                "path": document.path,
+                "candidate": document.candidate,
+                "source": document.source,
+                "date": document.date,
+                "url": document.url,
+                "title": document.title,
+                "snippet": " ".join(document.body.split())[:300],
+            })
+        
+        return {
+            "query": query,
+            "mode": "+".join(used),
+            "milliseconds": round((time.perf_counter() - start) * 1000, 2),
+            "results": results,
+        }
+
+
+def make_handler(service):
+    """Build a request handler answering GET /search?q=...&k=&candidate=&since=&until=&mode="""
+    
+    class SearchHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != "/search":
+                self.send_json(404, {"error": "Not found"})
+                return
+            
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            query = params.get("q", "").strip()
+            mode = params.get("mode", "hybrid")
+            if not query:
+                self.send_json(400, {"error": "Missing query parameter q"})
+                return
+            if mode not in SEARCH_MODES:
+                self.send_json(400, {"error": f"mode must be one of {', '.join(SEARCH_MODES)}"})
+                return
+            try:
+                k = max(1, min(int(params.get("k", 10)), 100))
+            except ValueError:
+                self.send_json(400, {"error": "k must be an integer"})
+                return
+            
+            self.send_json(200, service.search(query, k, params.get("candidate"), params.get("since"),
+                                               params.get("until"), mode))
+        
+        def send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            pass
+    
+    return SearchHandler
+
+
+def print_results(response):
+    print(f"{len(response['results'])} results ({response['mode']}, {response['milliseconds']} ms)")
+    for result in response["results"]:
+        print(f"{result['score']:.4f}  {result['date']}  {result['candidate']}  {result['path']}")
+        print(f"    {result['snippet'][:200]}")
+
+
+def main():
+    """Query the local corpus or serve queries over HTTP"""
+    parser = argparse.ArgumentParser(description='Hybrid BM25 + vector search over the local corpus')
+    parser.add_argument('--data', type=str, help='Corpus directory', default=DATA_DIR)
+    parser.add_argument('--index', type=str, help='Vector index directory', default=INDEX_DIR)
+    parser.add_argument('--cache', type=str, help='Corpus cache file (.parquet or .json.gz)',
+                        default=DEFAULT_CACHE_PATH)
+    parser.add_argument('--no-vectors', action='store_true', help='Use BM25 only')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    query_parser = subparsers.add_parser('query', help='Run a single query')
+    query_parser.add_argument('text', type=str, help='Query text')
+    query_parser.add_argument('-k', type=int, help='Number of results', default=10)
+    query_parser.add_argument('--candidate', type=str, help='Only documents by this candidate')
+    query_parser.add_argument('--since', type=str, help='Only documents on or after this date (YYYY-MM-DD)')
+    query_parser.add_argument('--until', type=str, help='Only documents on or before this date (YYYY-MM-DD)')
+    query_parser.add_argument('--mode', choices=SEARCH_MODES, help='Retrievers to use', default='hybrid')
+    query_parser.add_argument('--json', action='store_true', help='Print the response as JSON')
+    
+    serve_parser = subparsers.add_parser('serve', help='Answer GET /search requests over HTTP')
+    serve_parser.add_argument('--host', type=str, help='Address to listen on', default=DEFAULT_HOST)
+    serve_parser.add_argument('--port', type=int, help='Port to listen on', default=DEFAULT_PORT)
+    
+    args = parser.parse_args()
+    
+    service = SearchService(args.data, args.index, not args.no_vectors, args.cache)
+    
+    if args.command == 'query':
+        response = service.search(args.text, args.k, args.candidate, args.since, args.until, args.mode)
+        if args.json:
+            print(json.dumps(response, ensure_ascii=False, indent=2))
+        else:
+            print_results(response)
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+        print(f"Serving search on http://{args.host}:{args.port}/search?q=...")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nStopping search service")
+        finally:
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
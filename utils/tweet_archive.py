@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import shutil
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+
+from convert_tweets_to_markdown import find_json_files, iter_tweets
+
+
+ARCHIVE_DIRNAME = "archive"
+META_FILENAME = "meta.json"
+ARCHIVE_VERSION = 1
+
+# Twitter's createdAt format, e.g. "Thu Mar 27 03:17:10 +0000 2025"
+CREATED_AT_FORMAT = "%a %b %d %H:%M:%S %z %Y"
+
+# created value for tweets whose date could not be parsed
+NO_DATE = np.iinfo(np.int64).min
+
+# Numeric columns, one .npy file each; row references are -1 when absent
+NUMERIC_COLUMNS = {
+    "id": np.int64,
+    "created": np.int64,
+    "owner": np.int32,
+    "author": np.int32,
+    "quoted": np.int32,
+    "retweeted": np.int32,
+}
+TWEET_STRING_COLUMNS = ("text", "url")
+AUTHOR_STRING_COLUMNS = ("name", "username")
+
+
+def parse_created_at(created_at):
+    """Seconds since the epoch for a createdAt string, or NO_DATE"""
+    try:
+        return int(datetime.strptime(created_at, CREATED_AT_FORMAT).timestamp())
+    except (TypeError, ValueError):
+        return NO_DATE
+
+
+def format_created_at(created):
+    if created == NO_DATE:
+        return ""
+    return datetime.fromtimestamp(created, timezone.utc).strftime(CREATED_AT_FORMAT)
+
+
+def date_to_timestamp(date, end_of_day=False):
+    """Seconds since the epoch for a YYYY-MM-DD date (UTC)"""
+    timestamp = int(datetime.strptime(date, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+    return timestamp + 86399 if end_of_day else timestamp
+
+
+def completeness(tweet):
+    """How many of the fields used for rendering a tweet carries"""
+    return sum(bool(tweet.get(key)) for key in ("text", "url", "createdAt", "author"))
+
+
+class StringColumnWriter:
+    """Appends UTF-8 strings to a blob file, remembering the (start, end) span of each"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path + ".bin", 'wb')
+        self.spans = []
+        self.position = 0
+    
+    def append(self, value):
+        data = (value or "").encode('utf-8')
+        self.file.write(data)
+        self.spans.append((self.position, self.position + len(data)))
+        self.position += len(data)
+        return len(self.spans) - 1
+    
+    def replace(self, index, value):
+        """Point an existing entry at a new value; the old bytes stay in the blob unused"""
+        span = self.spans[self.append(value)]
+        self.spans.pop()
+        self.spans[index] = span
+    
+    def close(self, order=None):
+        """Finish the blob and save the spans, permuted into row order if given"""
+        self.file.close()
+        spans = np.asarray(self.spans, dtype=np.int64).reshape(-1, 2)
+        if order is not None:
+            spans = spans[order]
+        np.save(self.path + ".spans.npy", spans)
+
+
+class StringColumn:
+    """Memory-mapped read access to a column written by StringColumnWriter"""
+    
+    def __init__(self, path):
+        self.spans = np.load(path + ".spans.npy", mmap_mode='r')
+        if os.path.getsize(path + ".bin"):
+            self.blob = np.memmap(path + ".bin", dtype=np.uint8, mode='r')
+        else:
+            self.blob = np.empty(0, dtype=np.uint8)
+    
+    def __len__(self):
+        return len(self.spans)
+    
+    def __getitem__(self, row):
+        start, end = self.spans[row]
+        return self.blob[start:end].tobytes().decode('utf-8')
+
+
+class ArchiveBuilder:
+    """
+    Normalises tweets into archive rows.
+    Every tweet is stored once, whether it came from a timeline or was quoted
+    or retweeted, and authors are stored once in their own table. Strings are
+    written out as they arrive; only the numeric columns are held in memory.
+    """
+    
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+        os.makedirs(archive_dir, exist_ok=True)
+        self.columns = {name: [] for name in NUMERIC_COLUMNS}
+        self.strings = {name: StringColumnWriter(os.path.join(archive_dir, name)) for name in TWEET_STRING_COLUMNS}
+        self.author_strings = {
+            name: StringColumnWriter(os.path.join(archive_dir, f"author_{name}")) for name in AUTHOR_STRING_COLUMNS
+        }
+        self.rows_by_id = {}
+        self.completeness = []
+        self.authors = {}
+        self.users = []
+        self.next_synthetic_id = -1
+    
+    def author_number(self, author):
+        if not author or not isinstance(author, dict):
+            return -1
+        key = (author.get("userName", "unknown"), author.get("name", "Unknown"))
+        if key not in self.authors:
+            self.authors[key] = len(self.authors)
+            self.author_strings["username"].append(key[0])
+            self.author_strings["name"].append(key[1])
+        return self.authors[key]
+    
+    def user_number(self, username):
+        if username not in self.users:
+            self.users.append(username)
+        return self.users.index(username)
+    
+    def add(self, tweet, owner=-1):
+        """
+        Add a tweet and the tweets it references
+        owner is the timeline user number, or -1 for a tweet only seen as a reference
+        Returns: the tweet's build row
+        """
+        tweet_id = str(tweet.get("id") or "")
+        if tweet_id.isdigit():
+            tweet_id = int(tweet_id)
+        else:
+            # Referenced tweets without an ID still need a row of their own
+            tweet_id = self.next_synthetic_id
+            self.next_synthetic_id -= 1
+        
+        row = self.rows_by_id.get(tweet_id)
+        if row is not None:
+            if owner >= 0 and self.columns["owner"][row] < 0:
+                self.columns["owner"][row] = owner
+            # The API sometimes embeds a referenced tweet as an empty stub; keep the fullest copy
+            if completeness(tweet) < self.completeness[row]:
+                return row
+        
+        quoted = tweet.get("quoted_tweet")
+        retweeted = tweet.get("retweeted_tweet")
+        values = {
+            "id": tweet_id,
+            "created": parse_created_at(tweet.get("createdAt", "")),
+            "owner": owner,
+            "author": self.author_number(tweet.get("author")),
+            "quoted": self.add(quoted) if quoted and isinstance(quoted, dict) else -1,
+            "retweeted": self.add(retweeted) if retweeted and isinstance(retweeted, dict) else -1,
+        }
+        
+        if row is None:
+            row = len(self.columns["id"])
+            self.rows_by_id[tweet_id] = row
+            self.completeness.append(completeness(tweet))
+            for name, value in values.items():
+                self.columns[name].append(value)
+            for name in TWEET_STRING_COLUMNS:
+                self.strings[name].append(tweet.get(name, ""))
+        else:
+            values["owner"] = max(owner, self.columns["owner"][row])
+            self.completeness[row] = completeness(tweet)
+            for name, value in values.items():
+                self.columns[name][row] = value
+            for name in TWEET_STRING_COLUMNS:
+                self.strings[name].replace(row, tweet.get(name, ""))
+        return row
+    
+    def add_page_file(self, json_file_path, username):
+        """Add the timeline tweets of one JSON page; tweets without an ID are placeholders and skipped"""
+        owner = self.user_number(username)
+        added = 0
+        for tweet in iter_tweets(json_file_path):
+            if isinstance(tweet, dict) and str(tweet.get("id") or "").isdigit():
+                self.add(tweet, owner)
+                added += 1
+        return added
+    
+    def finish(self):
+        """
+        Sort rows by timeline user and date and write the archive
+        Referenced-only tweets go after every timeline.
+        Returns: the archive metadata
+        """
+        columns = {name: np.asarray(values, dtype=NUMERIC_COLUMNS[name]) for name, values in self.columns.items()}
+        owner_key = np.where(columns["owner"] >= 0, columns["owner"], len(self.users))
+        order = np.lexsort((columns["id"], columns["created"], owner_key))
+        
+        # Map build rows to final rows in the reference columns
+        final_row = np.empty(len(order), dtype=np.int32)
+        final_row[order] = np.arange(len(order), dtype=np.int32)
+        for name in ("quoted", "retweeted"):
+            references = columns[name]
+            columns[name] = np.where(references >= 0, final_row[np.maximum(references, 0)], -1).astype(np.int32)
+        
+        for name, values in columns.items():
+            np.save(os.path.join(self.archive_dir, f"{name}.npy"), values[order])
+        np.save(os.path.join(self.archive_dir, "id_order.npy"), np.argsort(columns["id"][order], kind='stable'))
+        for writer in self.strings.values():
+            writer.close(order)
+        for writer in self.author_strings.values():
+            writer.close()
+        
+        sorted_owner_key = owner_key[order]
+        users = []
+        for number, username in enumerate(self.users):
+            start, end = np.searchsorted(sorted_owner_key, [number, number + 1])
+            users.append({"username": username, "start": int(start), "end": int(end)})
+        
+        meta = {
+            "version": ARCHIVE_VERSION,
+            "tweets": len(order),
+            "timeline_tweets": int((columns["owner"] >= 0).sum()),
+            "authors": len(self.authors),
+            "users": users,
+        }
+        with open(os.path.join(self.archive_dir, META_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        return meta
+
+
+def build_archive(tweets_dir, archive_dir=None):
+    """
+    Compact every JSON page under tweets_dir into a columnar archive
+    The archive is built next to the old one and swapped in when complete.
+    Returns: the archive metadata
+    """
+    archive_dir = archive_dir or os.path.join(tweets_dir, ARCHIVE_DIRNAME)
+    tmp_dir = archive_dir.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    
+    builder = ArchiveBuilder(tmp_dir)
+    for json_file in find_json_files(tweets_dir):
+        username = os.path.basename(os.path.dirname(os.path.dirname(json_file)))
+        try:
+            builder.add_page_file(json_file, username)
+        except ValueError as e:
+            print(f"Skipping {json_file}: {e}")
+    meta = builder.finish()
+    
+    shutil.rmtree(archive_dir, ignore_errors=True)
+    os.replace(tmp_dir, archive_dir)
+    return meta
+
+
+class TweetArchive:
+    """
+    A tweet archive opened for reading.
+    Every column is memory-mapped, so opening is immediate and only the rows
+    that are read are paged in. Timeline rows are sorted by user and date, so
+    candidate and date filters are binary searches.
+    """
+    
+    def __init__(self, archive_dir):
+        with open(os.path.join(archive_dir, META_FILENAME), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != ARCHIVE_VERSION:
+            raise ValueError(f"Unsupported tweet archive version {self.meta.get('version')} in {archive_dir}")
+        self.columns = {
+            name: np.load(os.path.join(archive_dir, f"{name}.npy"), mmap_mode='r') for name in NUMERIC_COLUMNS
+        }
+        self.id_order = np.load(os.path.join(archive_dir, "id_order.npy"), mmap_mode='r')
+        self.sorted_ids = None
+        self.strings = {name: StringColumn(os.path.join(archive_dir, name)) for name in TWEET_STRING_COLUMNS}
+        self.author_strings = {
+            name: StringColumn(os.path.join(archive_dir, f"author_{name}")) for name in AUTHOR_STRING_COLUMNS
+        }
+        self.users = {user["username"]: user for user in self.meta["users"]}
+    
+    def __len__(self):
+        return self.meta["tweets"]
+    
+    def find_user(self, candidate):
+        """Timeline user matching a handle, ignoring case"""
+        for username, user in self.users.items():
+            if username.lower() == candidate.lstrip("@").lower():
+                return user
+        raise KeyError(f"No timeline for {candidate} in the archive")
+    
+    def rows(self, candidate=None, since=None, until=None):
+        """
+        Timeline rows, optionally for one candidate handle and an inclusive YYYY-MM-DD date range
+        Returns: array of row numbers in (user, date) order
+        """
+        users = [self.find_user(candidate)] if candidate else list(self.users.values())
+        created = self.columns["created"]
+        selected = []
+        for user in users:
+            start, end = user["start"], user["end"]
+            if since:
+                start += int(np.searchsorted(created[start:end], date_to_timestamp(since), side='left'))
+            if until:
+                end = user["start"] + int(np.searchsorted(created[user["start"]:end],
+                                                          date_to_timestamp(until, end_of_day=True), side='right'))
+            selected.append(np.arange(start, max(start, end)))
+        return np.concatenate(selected) if selected else np.empty(0, dtype=np.int64)
+    
+    def row_of(self, tweet_id):
+        """Row holding a tweet ID, or None"""
+        if self.sorted_ids is None:
+            self.sorted_ids = self.columns["id"][self.id_order]
+        position = int(np.searchsorted(self.sorted_ids, int(tweet_id)))
+        if position < len(self.sorted_ids) and self.sorted_ids[position] == int(tweet_id):
+            return int(self.id_order[position])
+        return None
+    
+    def author(self, row):
+        number = int(self.columns["author"][row])
+        if number < 0:
+            return {}
+        return {"name": self.author_strings["name"][number], "userName": self.author_strings["username"][number]}
+    
+    def tweet(self, row):
+        """Rebuild a row as a tweet dict in the API's shape, with its quoted and retweeted tweets"""
+        tweet_id = int(self.columns["id"][row])
+        tweet = {
+            "id": str(tweet_id) if tweet_id >= 0 else "",
+            "text": self.strings["text"][row],
+            "createdAt": format_created_at(int(self.columns["created"][row])),
+            "url": self.strings["url"][row],
+            "author": self.author(row),
+        }
+        for name, key in (("quoted", "quoted_tweet"), ("retweeted", "retweeted_tweet")):
+            reference = int(self.columns[name][row])
+            if reference >= 0:
+                tweet[key] = self.tweet(reference)
+        return tweet
+    
+    def iter_tweets(self, candidate=None, since=None, until=None):
+        """Yield (username, tweet dict) for timeline tweets matching the filters"""
+        owners = {number: username for number, username in enumerate(self.users)}
+        for row in self.rows(candidate, since, until):
+            yield owners[int(self.columns["owner"][row])], self.tweet(row)
+
+
+def main():
+    """Build or query the compact tweet archive"""
+    parser = argparse.ArgumentParser(description='Compact tweet JSON pages into a columnar archive')
+    parser.add_argument('--tweets-dir', default='tweets', help='Directory containing the <username>/json page folders')
+    parser.add_argument('--archive', help='Archive directory (default: <tweets-dir>/archive)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    subparsers.add_parser('build', help='Rebuild the archive from the JSON pages')
+    
+    query_parser = subparsers.add_parser('query', help='List archived tweets')
+    query_parser.add_argument('--candidate', help='Timeline handle, e.g. MarkJCarney')
+    query_parser.add_argument('--since', help='First date (YYYY-MM-DD)')
+    query_parser.add_argument('--until', help='Last date (YYYY-MM-DD)')
+    query_parser.add_argument('--limit', type=int, default=20, help='Maximum tweets to print')
+    
+    args = parser.parse_args()
+    archive_dir = args.archive or os.path.join(args.tweets_dir, ARCHIVE_DIRNAME)
+    
+    if args.command == 'build':
+        meta = build_archive(args.tweets_dir, archive_dir)
+        size = sum(os.path.getsize(os.path.join(archive_dir, name)) for name in os.listdir(archive_dir))
+        print(f"Archived {meta['timeline_tweets']} timeline tweets ({meta['tweets']} including referenced "
+              f"tweets, {meta['authors']} authors) in {size / 1024:.0f} KiB at {archive_dir}")
+        for user in meta["users"]:
+            print(f"  - {user['username']}: {user['end'] - user['start']} tweets")
+    else:
+        archive = TweetArchive(archive_dir)
+        rows = archive.rows(args.candidate, args.since, args.until)
+        print(f"{len(rows)} tweets")
+        for username, tweet in archive.iter_tweets(args.candidate, args.since, args.until):
+            if args.limit <= 0:
+                break
+            args.limit -= 1
+            text = " ".join(tweet["text"].split())
+            print(f"{tweet['createdAt']}  @{username}  {tweet['id']}  {text[:100]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import json
+
+from corpus import parse_document
+
+
+# Upper bound on a bundle's size; a candidate's month is split into parts above it
+DEFAULT_BUNDLE_BYTES = 1024 * 1024
+
+BUNDLE_INDEX_FILENAME = "bundle_index.json"
+
+TWEET_HEADER_PATTERN = re.compile(r"^# Tweet by .*\n+")
+SUBHEADING_PATTERN = re.compile(r"^## ", re.MULTILINE)
+
+
+def iter_user_tweets(tweets_dir):
+    """
+    Yield (handle, tweet file path) for every tweet, oldest first within each user
+    Tweet IDs grow with time, so numeric ID order is date order.
+    """
+    for handle in sorted(os.listdir(tweets_dir)):
+        markdown_dir = os.path.join(tweets_dir, handle, "markdown")
+        if not os.path.isdir(markdown_dir):
+            continue
+        tweet_ids = [
+            name[:-3] for name in os.listdir(markdown_dir)
+            if name.endswith(".md") and name[:-3].isdigit()
+        ]
+        for tweet_id in sorted(tweet_ids, key=int):
+            yield handle, os.path.join(markdown_dir, f"{tweet_id}.md")
+
+
+def render_bundle_entry(document):
+    """
+    Render one tweet as a section of a bundle
+    The anchor and source link let answers cite the individual tweet; the
+    tweet's own header is replaced and its subheadings nested one level down.
+    """
+    body = TWEET_HEADER_PATTERN.sub("", document.body, count=1)
+    body = SUBHEADING_PATTERN.sub("### ", body).strip()
+    return (
+        f'<a id="tweet-{document.id}"></a>\n'
+        f"## Tweet {document.id}\n\n"
+        f"Source: {document.url}\n\n"
+        f"{body}\n\n"
+    )
+
+
+class BundleWriter:
+    """
+    Accumulates tweet sections and writes them out as size-bounded bundle files
+    Part numbers are counted per (handle, month), so a month that recurs after
+    another one (e.g. undated tweets between dated ones) continues in a new part.
+    """
+    
+    def __init__(self, bundle_dir, max_bytes=DEFAULT_BUNDLE_BYTES):
+        self.bundle_dir = bundle_dir
+        self.max_bytes = max_bytes
+        self.index = {}
+        self.key = None
+        self.part = 0
+        # Last part number written for each (handle, month)
+        self.parts = {}
+        self.sections = []
+        self.tweet_ids = []
+        self.size = 0
+        self.candidate = None
+    
+    def add(self, handle, month, document):
+        section = render_bundle_entry(document)
+        section_size = len(section.encode('utf-8'))
+        if (handle, month) != self.key:
+            self.flush()
+            self.key = (handle, month)
+            self.candidate = document.candidate
+            self.part = self.parts.get(self.key, 0) + 1
+        elif self.size + section_size > self.max_bytes and self.sections:
+            self.flush()
+            self.part += 1
+        self.parts[self.key] = self.part
+        self.sections.append(section)
+        self.tweet_ids.append(document.id)
+        self.size += section_size
+    
+    def flush(self):
+        """Write the current bundle, returning its path (None if it was empty)"""
+        if not self.sections:
+            return None
+        handle, month = self.key
+        filename = f"{handle}_{month}_{self.part:02d}.md"
+        header = f"# Tweets by {self.candidate} (@{handle}), {month}, part {self.part}\n\n"
+        path = os.path.join(self.bundle_dir, filename)
+        content = header + "".join(self.sections)
+        
+        # Leave unchanged bundles untouched so their content hash still matches the ledger
+        existing = None
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                existing = f.read()
+        if existing != content:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+        
+        self.index[filename] = {
+            "candidate": self.candidate,
+            "handle": handle,
+            "month": month,
+            "part": self.part,
+            "tweet_ids": self.tweet_ids,
+        }
+        self.sections = []
+        self.tweet_ids = []
+        self.size = 0
+        return path
+
+
+def build_bundles(tweets_dir, bundle_dir, max_bytes=DEFAULT_BUNDLE_BYTES):
+    """
+    Pack every tweet under tweets_dir into bundles grouped by user and month
+    Tweets are streamed in date order, so only one bundle is held in memory.
+    Bundles that no longer exist are removed and the bundle -> tweet ID
+    mapping is saved as bundle_index.json in bundle_dir.
+    Returns: dict of bundle filename -> bundle info (candidate, handle, month, part, tweet_ids)
+    """
+    os.makedirs(bundle_dir, exist_ok=True)
+    tweets_root = os.path.dirname(os.path.abspath(tweets_dir))
+    writer = BundleWriter(bundle_dir, max_bytes)
+    
+    for handle, file_path in iter_user_tweets(tweets_dir):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        rel_path = os.path.relpath(file_path, tweets_root).replace(os.sep, "/")
+        document = parse_document(text, rel_path, "tweet")
+        month = document.date[:7] or "undated"
+        writer.add(handle, month, document)
+    writer.flush()
+    
+    for filename in os.listdir(bundle_dir):
+        if filename.endswith(".md") and filename not in writer.index:
+            os.remove(os.path.join(bundle_dir, filename))
+    
+    with open(os.path.join(bundle_dir, BUNDLE_INDEX_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(writer.index, f, indent=2)
+    
+    return writer.index
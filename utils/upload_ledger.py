@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import argparse
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Default ledger location and the JSONL log it replaces
+DEFAULT_LEDGER_PATH = os.path.join(REPO_ROOT, "data", "upload_ledger.sqlite3")
+LEGACY_LOG_PATH = os.path.join(REPO_ROOT, "data", "youtube_uploads.jsonl")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    rel_path TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    uploaded_at TEXT NOT NULL,
+    PRIMARY KEY (rel_path, content_hash)
+);
+CREATE INDEX IF NOT EXISTS uploads_content_hash ON uploads (content_hash);
+CREATE INDEX IF NOT EXISTS uploads_file_id ON uploads (file_id);
+"""
+
+
+def repo_relative_path(file_path):
+    """Return a file's path relative to the repository root, with '/' separators"""
+    rel_path = os.path.relpath(os.path.abspath(file_path), REPO_ROOT)
+    return rel_path.replace(os.sep, "/")
+
+
+def legacy_relative_path(file_path):
+    """
+    Map an absolute path from another checkout (e.g. /Users/.../PolicyExplorer/data/...)
+    to a repo-relative path by keeping everything from the first 'data' directory on
+    Returns None if the path has no 'data' component
+    """
+    parts = file_path.replace("\\", "/").split("/")
+    if "data" not in parts:
+        return None
+    return "/".join(parts[parts.index("data"):])
+
+
+def hash_file(file_path):
+    """Return the SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class UploadLedger:
+    """
+    SQLite record of files uploaded to OpenAI, keyed on repo-relative path
+    plus content hash, so lookups survive a checkout moving and a changed
+    file is uploaded again. Safe to share between threads.
+    """
+    
+    def __init__(self, ledger_path=DEFAULT_LEDGER_PATH):
+        os.makedirs(os.path.dirname(ledger_path) or ".", exist_ok=True)
+        self.ledger_path = ledger_path
+        self.created = not os.path.exists(ledger_path)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(ledger_path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+    
+    def close(self):
+        self.connection.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM uploads").fetchone()[0]
+    
+    def lookup(self, file_path, content_hash=None):
+        """
+        Check whether this version of a file was already uploaded
+        Returns: the OpenAI file ID, or None
+        """
+        if content_hash is None:
+            content_hash = hash_file(file_path)
+        
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT file_id FROM uploads WHERE rel_path = ? AND content_hash = ?",
+                (repo_relative_path(file_path), content_hash)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def is_uploaded(self, file_path, content_hash=None):
+        return self.lookup(file_path, content_hash) is not None
+    
+    def record(self, file_path, file_id, content_hash=None, uploaded_at=None):
+        """Record a successful upload of a file"""
+        if content_hash is None:
+            content_hash = hash_file(file_path)
+        
+        self._insert(repo_relative_path(file_path), content_hash, file_id,
+                     uploaded_at or datetime.now().isoformat())
+    
+    def _insert(self, rel_path, content_hash, file_id, uploaded_at, replace=True):
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        with self.lock:
+            cursor = self.connection.execute(
+                f"{verb} INTO uploads (rel_path, content_hash, file_id, uploaded_at) VALUES (?, ?, ?, ?)",
+                (rel_path, content_hash, file_id, uploaded_at)
+            )
+            self.connection.commit()
+        return cursor.rowcount
+    
+    def import_jsonl(self, jsonl_path=LEGACY_LOG_PATH):
+        """
+        Import entries from the old JSONL upload log
+        The log has no hashes, so each entry is keyed on the current content of
+        the file at its repo-relative path; entries whose file no longer exists are skipped
+        Returns: (imported, skipped) counts
+        """
+        imported = skipped = 0
+        
+        with open(jsonl_path, "r") as log_file:
+            for line in log_file:
+                try:
+                    entry = json.loads(line.strip())
+                    file_path = entry["file_path"]
+                    file_id = entry["file_id"]
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    skipped += 1
+                    continue
+                
+                rel_path = legacy_relative_path(file_path)
+                local_path = os.path.join(REPO_ROOT, rel_path) if rel_path else None
+                if not local_path or not os.path.exists(local_path):
+                    skipped += 1
+                    continue
+                
+                inserted = self._insert(rel_path, hash_file(local_path), file_id,
+                                        entry.get("timestamp") or datetime.now().isoformat(),
+                                        replace=False)
+                if inserted:
+                    imported += 1
+                else:
+                    skipped += 1
+        
+        return imported, skipped
+
+
+def open_ledger(ledger_path=DEFAULT_LEDGER_PATH, legacy_log_path=LEGACY_LOG_PATH):
+    """
+    Open the upload ledger, importing the legacy JSONL log the first time it is created
+    """
+    ledger = UploadLedger(ledger_path)
+    if ledger.created and legacy_log_path and os.path.exists(legacy_log_path):
+        imported, skipped = ledger.import_jsonl(legacy_log_path)
+        print(f"Imported {imported} entries from {legacy_log_path} into the upload ledger ({skipped} skipped)")
+    return ledger
+
+
+def main():
+    """Import the legacy upload log or show ledger statistics"""
+    parser = argparse.ArgumentParser(description='Manage the OpenAI upload ledger')
+    parser.add_argument('command', choices=['import', 'stats'],
+                      help='"import" loads a JSONL upload log, "stats" prints the number of entries')
+    parser.add_argument('--ledger', type=str, help='Ledger database path',
+                      default=DEFAULT_LEDGER_PATH)
+    parser.add_argument('--jsonl', type=str, help='JSONL upload log to import',
+                      default=LEGACY_LOG_PATH)
+    
+    args = parser.parse_args()
+    
+    with UploadLedger(args.ledger) as ledger:
+        if args.command == 'import':
+            imported, skipped = ledger.import_jsonl(args.jsonl)
+            print(f"Imported {imported} entries ({skipped} skipped)")
+        print(f"Ledger {args.ledger} has {len(ledger)} entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,64 +1,136 @@
-from openai import OpenAI
 import os
-import time
 import json
+import argparse
 
-client = OpenAI()
+from metrics import METRICS, add_metrics_arguments, configure_metrics, finish_metrics
+from openai_uploader import DEFAULT_REQUESTS_PER_SECOND, DEFAULT_WORKERS, OpenAIUploadClient, Uploader
+from tweet_bundles import DEFAULT_BUNDLE_BYTES, build_bundles
+from upload_ledger import DEFAULT_LEDGER_PATH, hash_file, open_ledger
 
 # Define the directory containing the tweets relative to this file
 tweets_directory = os.path.join(os.path.dirname(__file__), "..", "tweets")
 
-# Recursively gather all markdown file paths from tweets_directory
-markdown_file_paths = []
-for root, dirs, files in os.walk(tweets_directory):
-    # Only look in directories named 'markdown'
-    if os.path.basename(root) == 'markdown':
-        for file in files:
-            if file.lower().endswith(".md"):
-                markdown_file_paths.append(os.path.join(root, file))
 
-if not markdown_file_paths:
-    print(f"No markdown files found in tweets directories")
-    exit(0)
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Upload tweet markdown files to OpenAI')
+    parser.add_argument('--tweets-dir', default=tweets_directory,
+                      help='Directory containing the <username>/markdown folders')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                      help='Number of concurrent uploads')
+    parser.add_argument('--rate', type=float, default=DEFAULT_REQUESTS_PER_SECOND,
+                      help='Maximum upload requests per second (0 disables)')
+    parser.add_argument('--output', default='uploaded_tweet_files.json',
+                      help='Where to save the uploaded file IDs')
+    parser.add_argument('--bundle', action='store_true',
+                      help='Pack tweets into per-candidate, per-month bundles and upload those instead')
+    parser.add_argument('--bundle-dir', default=None,
+                      help='Where to write bundles (default: <tweets-dir>/bundles)')
+    parser.add_argument('--bundle-size', type=int, default=DEFAULT_BUNDLE_BYTES,
+                      help='Maximum bundle size in bytes')
+    parser.add_argument('--ledger', default=DEFAULT_LEDGER_PATH,
+                      help='Upload ledger used to skip unchanged bundles')
+    add_metrics_arguments(parser)
+    return parser.parse_args()
 
-print(f"Found {len(markdown_file_paths)} markdown files to upload")
 
-# Create a dictionary to store file information
-file_info = {}
+def find_markdown_files(tweets_dir):
+    """Recursively gather all markdown file paths from the tweets directory"""
+    markdown_file_paths = []
+    for root, dirs, files in os.walk(tweets_dir):
+        # Only look in directories named 'markdown'
+        if os.path.basename(root) == 'markdown':
+            for file in files:
+                if file.lower().endswith(".md"):
+                    markdown_file_paths.append(os.path.join(root, file))
+    return markdown_file_paths
 
-# Upload each file to OpenAI
-for file_path in markdown_file_paths:
-    file_name = os.path.basename(file_path)
-    print(f"Uploading {file_path}...")
+
+def upload_bundles(args, uploader):
+    """
+    Rebuild the tweet bundles and upload the ones that changed since their last upload
+    Returns: file info for every uploaded bundle, keyed by bundle filename
+    """
+    bundle_dir = args.bundle_dir or os.path.join(args.tweets_dir, "bundles")
+    bundles = build_bundles(args.tweets_dir, bundle_dir, args.bundle_size)
+    tweet_count = sum(len(info["tweet_ids"]) for info in bundles.values())
+    print(f"Packed {tweet_count} tweets into {len(bundles)} bundles in {bundle_dir}")
+    
+    ledger = open_ledger(args.ledger)
+    results = {}
+    pending_files = []
+    content_hashes = {}
+    for filename in sorted(bundles):
+        file_path = os.path.join(bundle_dir, filename)
+        content_hash = hash_file(file_path)
+        # Unchanged bundles keep the file ID of their earlier upload
+        results[file_path] = ledger.lookup(file_path, content_hash)
+        if results[file_path] is None:
+            content_hashes[file_path] = content_hash
+            pending_files.append(file_path)
+    print(f"{len(pending_files)} bundles are new or changed")
+    METRICS.count("items_total", len(bundles) - len(pending_files), stage="upload", outcome="skipped")
     
-    try:
-        with open(file_path, "rb") as file:
-            response = client.files.create(
-                file=file,
-                purpose="vector_store"  # Using vector_store purpose
-            )
-            file_id = response.id
-            
-            # Store file information
-            file_info[file_name] = {
+    results.update(uploader.upload_files(
+        pending_files,
+        purpose="vector_store",
+        on_uploaded=lambda file_path, file_id: ledger.record(file_path, file_id, content_hashes[file_path])
+    ))
+    ledger.close()
+    
+    file_info = {}
+    for file_path, file_id in results.items():
+        if file_id:
+            filename = os.path.basename(file_path)
+            file_info[filename] = {
                 "file_id": file_id,
-                "original_path": file_path
+                "original_path": file_path,
+                "tweet_ids": bundles[filename]["tweet_ids"]
             }
-            
-            print(f"Uploaded {file_name} as {file_id}")
-        
-        # Small delay to avoid rate limiting
-        time.sleep(0.5)
     
-    except Exception as e:
-        print(f"Error uploading {file_path}: {e}")
+    uploaded = sum(1 for file_path in pending_files if results.get(file_path))
+    print(f"Uploaded {uploaded} bundles; {len(bundles) - len(pending_files)} were unchanged")
+    return file_info
 
-print(f"Successfully uploaded {len(file_info)} files to OpenAI")
 
-# Save the file information to a JSON file for reference
-output_file = "uploaded_tweet_files.json"
-with open(output_file, "w") as f:
-    json.dump(file_info, f, indent=2)
+def main():
+    args = parse_arguments()
+    configure_metrics(args)
+    
+    uploader = Uploader(OpenAIUploadClient(), workers=args.workers, requests_per_second=args.rate)
+    
+    if args.bundle:
+        file_info = upload_bundles(args, uploader)
+    else:
+        markdown_file_paths = find_markdown_files(args.tweets_dir)
+        
+        if not markdown_file_paths:
+            print(f"No markdown files found in tweets directories")
+            exit(0)
+        
+        print(f"Found {len(markdown_file_paths)} markdown files to upload")
+        
+        # Upload each file to OpenAI (using vector_store purpose)
+        results = uploader.upload_files(markdown_file_paths, purpose="vector_store")
+        
+        # Create a dictionary to store file information
+        file_info = {}
+        for file_path, file_id in results.items():
+            if file_id:
+                file_info[os.path.basename(file_path)] = {
+                    "file_id": file_id,
+                    "original_path": file_path
+                }
+        
+        print(f"Successfully uploaded {len(file_info)} files to OpenAI")
+    
+    # Save the file information to a JSON file for reference
+    with open(args.output, "w") as f:
+        json.dump(file_info, f, indent=2)
+    
+    print(f"File information saved to {args.output}")
+    print("You can now use add_files_to_vector_store.py to associate these files with a vector store.")
+    finish_metrics(args)
+
 
-print(f"File information saved to {output_file}")
-print("You can now use add_files_to_vector_store.py to associate these files with a vector store.") 
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,16 @@
 import os
 import argparse
 import glob
-import json
 import sys
 from pathlib import Path
 import openai
-from datetime import datetime
-import time
 from dotenv import load_dotenv
 
 # Import the YouTube processing functionality
 from convert_youtube_to_markdown import process_videos
+from upload_ledger import DEFAULT_LEDGER_PATH, hash_file, open_ledger
+from openai_uploader import DEFAULT_REQUESTS_PER_SECOND, DEFAULT_WORKERS, OpenAIUploadClient, Uploader
+from metrics import METRICS, add_metrics_arguments, configure_metrics, finish_metrics
 
 # Try to import the vector store function, with fallback if not available
 try:
@@ -32,65 +32,23 @@ openai.api_key = os.getenv("OPENAI_API_KEY")
 
 # Default paths
 DEFAULT_YOUTUBE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "youtube")
+# Legacy JSONL upload log, imported into the ledger the first time it is created
 UPLOAD_LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "youtube_uploads.jsonl")
 
 
-def upload_file_to_openai(file_path, purpose="assistants"):
+def upload_file_to_openai(file_path, purpose="assistants", uploader=None):
     """
     Upload a file to OpenAI and return the file ID
     """
-    print(f"Uploading file: {file_path}")
-    
-    try:
-        with open(file_path, "rb") as file:
-            response = openai.files.create(
-                file=file,
-                purpose=purpose
-            )
-        file_id = response.id
-        print(f"  > Uploaded successfully, file ID: {file_id}")
-        return file_id
-    
-    except Exception as e:
-        print(f"  > Error uploading file {file_path}: {e}")
-        return None
+    uploader = uploader or Uploader(OpenAIUploadClient(), workers=1)
+    return uploader.upload_one(file_path, purpose)
 
 
-def log_uploaded_file(file_path, file_id):
+def log_uploaded_file(ledger, file_path, file_id, content_hash=None):
     """
-    Log the uploaded file details to the log file
+    Record the uploaded file in the upload ledger
     """
-    log_entry = {
-        "file_path": file_path,
-        "file_id": file_id,
-        "timestamp": datetime.now().isoformat()
-    }
-    
-    # Ensure log directory exists
-    os.makedirs(os.path.dirname(UPLOAD_LOG_PATH), exist_ok=True)
-    
-    # Append to log file
-    with open(UPLOAD_LOG_PATH, "a") as log_file:
-        log_file.write(json.dumps(log_entry) + "\n")
-
-
-def get_uploaded_files():
-    """
-    Get list of files that have already been uploaded
-    """
-    if not os.path.exists(UPLOAD_LOG_PATH):
-        return set()
-    
-    uploaded_files = set()
-    with open(UPLOAD_LOG_PATH, "r") as log_file:
-        for line in log_file:
-            try:
-                entry = json.loads(line.strip())
-                uploaded_files.add(entry["file_path"])
-            except:
-                pass
-    
-    return uploaded_files
+    ledger.record(file_path, file_id, content_hash)
 
 
 def add_files_to_vector_store(file_paths):
@@ -107,10 +65,13 @@ def add_files_to_vector_store(file_paths):
         count = 0
         for file_path in file_paths:
             try:
-                add_to_vector_store(file_path)
+                with METRICS.timer("attach"):
+                    add_to_vector_store(file_path)
                 count += 1
-                print(f"  > Added {file_path} to vector store")
+                METRICS.count("items_total", stage="attach", outcome="attached")
+                METRICS.progress(f"  > Added {file_path} to vector store")
             except Exception as e:
+                METRICS.count("items_total", stage="attach", outcome="failed")
                 print(f"  > Error adding {file_path} to vector store: {e}")
         
         print(f"Successfully added {count} files to vector store")
@@ -120,7 +81,8 @@ def add_files_to_vector_store(file_paths):
         return 0
 
 
-def process_and_upload_youtube(cutoff_date=None, max_videos=50, input_dir=None, process_new=True):
+def process_and_upload_youtube(cutoff_date=None, max_videos=50, input_dir=None, process_new=True,
+                               ledger_path=DEFAULT_LEDGER_PATH, uploader=None):
     """
     Process YouTube videos and upload generated markdown files to OpenAI
     
@@ -129,22 +91,15 @@ def process_and_upload_youtube(cutoff_date=None, max_videos=50, input_dir=None,
         max_videos: Maximum number of videos to process
         input_dir: Directory containing markdown files (if not processing new videos)
         process_new: Whether to process new videos from YouTube
+        ledger_path: Upload ledger used to skip files that were already uploaded
+        uploader: Uploader used for the OpenAI uploads (defaults to a pooled, rate-limited one)
         
     Returns:
         List of OpenAI file IDs for uploaded files
     """
-    # Track statistics
-    stats = {
-        "processed": 0,
-        "uploaded": 0,
-        "already_uploaded": 0,
-        "errors": 0,
-        "vector_store_added": 0
-    }
-    
-    # Get list of already uploaded files
-    uploaded_files = get_uploaded_files()
-    print(f"Found {len(uploaded_files)} already uploaded files")
+    # Open the ledger of already uploaded files
+    ledger = open_ledger(ledger_path, UPLOAD_LOG_PATH)
+    print(f"Found {len(ledger)} already uploaded files")
     
     # List to store new file IDs
     file_ids = []
@@ -159,59 +114,65 @@ def process_and_upload_youtube(cutoff_date=None, max_videos=50, input_dir=None,
         try:
             new_files = process_videos(cutoff_date, max_videos)
             markdown_files.extend(new_files)
-            stats["processed"] = len(new_files)
         except Exception as e:
             print(f"Error processing videos: {e}")
     
     # Step 2: Find existing markdown files if input directory provided
     if input_dir:
         print(f"Looking for existing markdown files in {input_dir}...")
+        known_files = set(markdown_files)
         for candidate in os.listdir(input_dir):
             candidate_dir = os.path.join(input_dir, candidate)
             if os.path.isdir(candidate_dir):
                 for md_file in glob.glob(os.path.join(candidate_dir, "*.md")):
-                    if md_file not in markdown_files:
+                    if md_file not in known_files:
+                        known_files.add(md_file)
                         markdown_files.append(md_file)
     
     print(f"Found {len(markdown_files)} total markdown files")
     
     # Step 3: Upload files that haven't been uploaded yet
+    pending_files = []
+    content_hashes = {}
     for file_path in markdown_files:
-        # Skip if already uploaded
-        if file_path in uploaded_files:
-            print(f"Skipping {file_path} - already uploaded")
-            stats["already_uploaded"] += 1
+        # Skip if this version of the file was already uploaded
+        content_hash = hash_file(file_path)
+        if ledger.is_uploaded(file_path, content_hash):
+            METRICS.progress(f"Skipping {file_path} - already uploaded")
+            METRICS.count("items_total", stage="upload", outcome="skipped")
             continue
-        
-        # Upload to OpenAI
-        file_id = upload_file_to_openai(file_path)
-        
+        content_hashes[file_path] = content_hash
+        pending_files.append(file_path)
+    
+    # Upload to OpenAI, logging each upload as soon as it succeeds
+    uploader = uploader or Uploader(OpenAIUploadClient())
+    results = uploader.upload_files(
+        pending_files,
+        purpose="assistants",
+        on_uploaded=lambda file_path, file_id: log_uploaded_file(ledger, file_path, file_id, content_hashes[file_path])
+    )
+    
+    for file_path, file_id in results.items():
         if file_id:
-            # Log the upload
-            log_uploaded_file(file_path, file_id)
             file_ids.append(file_id)
-            stats["uploaded"] += 1
             
             # Add to list for vector store integration
             vector_store_files.append(file_path)
-            
-            # Sleep briefly to avoid rate limits
-            time.sleep(0.2)
-        else:
-            stats["errors"] += 1
+    
+    ledger.close()
     
     # Step 4: Add files to vector store
     if vector_store_files:
-        stats["vector_store_added"] = add_files_to_vector_store(vector_store_files)
+        add_files_to_vector_store(vector_store_files)
     
-    # Print summary
+    # Print summary from the counters recorded by each step
     print("\nUpload summary:")
     print(f"  - Total markdown files: {len(markdown_files)}")
-    print(f"  - New videos processed: {stats['processed']}")
-    print(f"  - Files uploaded to OpenAI: {stats['uploaded']}")
-    print(f"  - Files added to vector store: {stats['vector_store_added']}")
-    print(f"  - Files already uploaded: {stats['already_uploaded']}")
-    print(f"  - Errors: {stats['errors']}")
+    print(f"  - New videos processed: {METRICS.value('items_total', stage='fetch', outcome='processed')}")
+    print(f"  - Files uploaded to OpenAI: {METRICS.value('items_total', stage='upload', outcome='uploaded')}")
+    print(f"  - Files added to vector store: {METRICS.value('items_total', stage='attach', outcome='attached')}")
+    print(f"  - Files already uploaded: {METRICS.value('items_total', stage='upload', outcome='skipped')}")
+    print(f"  - Errors: {METRICS.value('items_total', stage='upload', outcome='failed')}")
     
     return file_ids
 
@@ -228,8 +189,16 @@ def main():
                       help='Skip processing new videos, only upload existing files')
     parser.add_argument('--skip-vector-store', action='store_true',
                       help='Skip adding files to vector store')
+    parser.add_argument('--ledger', type=str, help='Upload ledger database path',
+                      default=DEFAULT_LEDGER_PATH)
+    parser.add_argument('--workers', type=int, help='Number of concurrent uploads',
+                      default=DEFAULT_WORKERS)
+    parser.add_argument('--rate', type=float, help='Maximum upload requests per second (0 disables)',
+                      default=DEFAULT_REQUESTS_PER_SECOND)
+    add_metrics_arguments(parser)
     
     args = parser.parse_args()
+    configure_metrics(args)
     
     # If --skip-vector-store is provided, temporarily disable vector store functionality
     if args.skip_vector_store:
@@ -240,8 +209,11 @@ def main():
         cutoff_date=args.cutoff,
         max_videos=args.max,
         input_dir=args.input,
-        process_new=not args.skip_processing
+        process_new=not args.skip_processing,
+        ledger_path=args.ledger,
+        uploader=Uploader(OpenAIUploadClient(), workers=args.workers, requests_per_second=args.rate)
     )
+    finish_metrics(args)
 
 
 if __name__ == "__main__":